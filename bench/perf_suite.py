@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""
+Performance suite for the benchmarks app.
+
+Seeds synthetic universes of benchmarks with daily price data in a SQLite
+database, then times the model hot paths on a sample of benchmarks from each
+universe. For every case the suite records the median wall time, the number of
+queries and the peak resident memory of the process running the case. Results
+are written as JSON, so that runs of different versions can be compared.
+
+Usage:
+    python bench/perf_suite.py [--sizes 10,100,1000] [--years 20]
+        [--output perf.json] [--compare baseline.json] [--threshold 1.25]
+
+The universes are seeded cumulatively into one database (the 100 benchmark
+universe contains the 10 benchmark one). Each case runs in a forked process,
+so that its peak memory is not hidden by earlier cases (POSIX only).
+
+With --compare, the suite exits with status 1 if any case is slower than the
+baseline by more than the threshold, or issues more queries.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+
+import benchmarks.settings.test_settings as test_settings
+
+
+def configure(database_name):
+    config = dict((key, value) for key, value in test_settings.__dict__.items() if key.isupper())
+    config['DATABASES'] = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': database_name,
+        }
+    }
+    config['DEBUG'] = False
+    settings.configure(**config)
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(first, last, years, seed_value):
+    """
+    Create benchmarks number first to last - 1, each with a synthetic history
+    of daily prices over the given number of years.
+    """
+    from benchmarks.synthetic import generate_synthetic_benchmarks
+    generate_synthetic_benchmarks(last - first, years=years, seed=seed_value + first,
+                                  prefix='PERF', first_number=first)
+
+
+# Cases. Each takes the sampled benchmarks and returns the number of units of work done.
+
+def case_benchmarkdata_save(benchmarks, rows=20):
+    from benchmarks.models import BenchmarkData
+    saved = 0
+    for benchmark in benchmarks:
+        points = list(BenchmarkData.objects.filter(benchmark=benchmark).order_by('-date')[:rows])
+        BenchmarkData.objects.filter(id__in=[point.id for point in points]).delete()
+        for point in reversed(points):
+            BenchmarkData(benchmark=benchmark, date=point.date, price=point.price).save()
+            saved += 1
+    return saved
+
+
+def case_generate_dataframe_fill(benchmarks):
+    for benchmark in benchmarks:
+        benchmark.generate_dataframe(fill=True)
+    return len(benchmarks)
+
+
+def case_generate_dataframe_no_fill(benchmarks):
+    for benchmark in benchmarks:
+        benchmark.generate_dataframe(fill=False)
+    return len(benchmarks)
+
+
+def case_find_missing_values(benchmarks):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')  # find_missing_values prints a summary
+    try:
+        for benchmark in benchmarks:
+            benchmark.find_missing_values()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return len(benchmarks)
+
+
+def case_generate_cached_data(benchmarks):
+    for benchmark in benchmarks:
+        benchmark.generate_cached_data()
+    return len(benchmarks)
+
+
+def case_calculate_return(benchmarks):
+    end_date = date.today() - timedelta(days=30)
+    for benchmark in benchmarks:
+        benchmark.calculate_return(end_date - timedelta(days=365), end_date)
+    return len(benchmarks)
+
+
+CASES = [
+    ('benchmarkdata_save', case_benchmarkdata_save),
+    ('generate_dataframe_fill', case_generate_dataframe_fill),
+    ('generate_dataframe_no_fill', case_generate_dataframe_no_fill),
+    ('find_missing_values', case_find_missing_values),
+    ('generate_cached_data', case_generate_cached_data),
+    ('calculate_return', case_calculate_return),
+]
+
+
+def run_case(case, benchmarks, repeat):
+    """
+    Run a case repeat times in this process and return its measurements
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for i in range(repeat):
+            start = time.time()
+            units = case(benchmarks)
+            timings.append(time.time() - start)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    return {
+        'seconds': median,
+        'seconds_min': timings[0],
+        'seconds_per_unit': median / units if units else None,
+        'units': units,
+        'queries': len(queries) // repeat,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_case_forked(case, benchmarks, repeat):
+    """
+    Run a case in a child process, so that its peak memory is its own
+    """
+    from django.db import connection
+    connection.close()  # The child opens its own connection
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 1
+        try:
+            os.write(write_fd, json.dumps(run_case(case, benchmarks, repeat)).encode('utf-8'))
+            status = 0
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    chunks = []
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+    pid, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise RuntimeError("Case %s failed" % (case.__name__,))
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def run(sizes, years, sample, repeat, seed_value):
+    from benchmarks.models import Benchmark
+
+    rng = random.Random(seed_value)
+    results = {}
+    seeded = 0
+    for size in sizes:
+        start = time.time()
+        seed(seeded, size, years, seed_value)
+        seeded = size
+        print('Seeded %s benchmarks in %.1fs' % (size, time.time() - start))
+
+        benchmark_ids = sorted(Benchmark.objects.values_list('id', flat=True))
+        benchmarks = list(Benchmark.objects.filter(id__in=rng.sample(benchmark_ids, min(sample, len(benchmark_ids)))))
+        results[str(size)] = {}
+        for name, case in CASES:
+            if hasattr(os, 'fork'):
+                measurement = run_case_forked(case, benchmarks, repeat)
+            else:
+                measurement = run_case(case, benchmarks, repeat)
+            results[str(size)][name] = measurement
+            print('  %-28s %9.4fs %6s queries %8s KB' % (name, measurement['seconds'],
+                                                         measurement['queries'], measurement['peak_rss_kb']))
+    return results
+
+
+def metadata(args):
+    import django
+    import numpy
+    import pandas
+    import sqlite3
+    import benchmarks
+    return {
+        'version': benchmarks.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'years': args.years,
+        'sample': args.sample,
+        'repeat': args.repeat,
+        'seed': args.seed,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the change of every case against a baseline and return the
+    regressions
+    """
+    regressions = []
+    for size, cases in sorted(results.items(), key=lambda item: int(item[0])):
+        for name, measurement in sorted(cases.items()):
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = measurement['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+            flag = ''
+            if ratio > threshold or measurement['queries'] > before['queries']:
+                flag = '  REGRESSION'
+                regressions.append((size, name))
+            print('%6s %-28s %6.2fx time %5s -> %-5s queries%s' % (size, name, ratio, before['queries'],
+                                                                   measurement['queries'], flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000', help="Comma separated universe sizes")
+    parser.add_argument('--years', type=int, default=20, help="Years of daily data per benchmark")
+    parser.add_argument('--sample', type=int, default=5, help="Benchmarks per case")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed of the synthetic data")
+    parser.add_argument('--database', help="SQLite file to use, a temporary file by default")
+    parser.add_argument('--output', default='perf.json', help="JSON file to write the results to")
+    parser.add_argument('--compare', help="JSON results of a previous run")
+    parser.add_argument('--threshold', type=float, default=1.25, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    if args.database:
+        database = args.database
+    else:
+        handle, database = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+    configure(database)
+    try:
+        results = run([int(size) for size in args.sizes.split(',')], args.years, args.sample, args.repeat, args.seed)
+    finally:
+        if not args.database and os.path.exists(database):
+            os.remove(database)
+
+    with open(args.output, 'w') as output:
+        json.dump({'meta': metadata(args), 'results': results}, output, indent=2, sort_keys=True)
+    print('Results written to %s' % (args.output,))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
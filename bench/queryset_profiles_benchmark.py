@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Measures the QuerySet field profiles of benchmarks.managers.
+
+Seeds an in-memory SQLite database with synthetic benchmarks and price data,
+then loads every row through each profile and reports rows per second and the
+approximate Python heap size of a loaded row (the row object plus the values
+it holds).
+
+Usage:
+    python bench/queryset_profiles_benchmark.py [benchmarks] [days]
+"""
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+
+import benchmarks.settings.test_settings as test_settings
+
+
+if not settings.configured:
+    settings.configure(**test_settings.__dict__)
+
+
+def row_size(row):
+    """
+    Approximate heap size of a loaded row in bytes
+    """
+    if isinstance(row, dict):
+        values = list(row.values())
+    elif isinstance(row, tuple):
+        values = list(row)
+    else:
+        values = list(row.__dict__.values())
+        row = row.__dict__
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+
+
+def seed(num_benchmarks, num_days):
+    from forex.models import Currency
+    from benchmarks.models import BenchmarkGroup, Benchmark, BenchmarkData
+
+    currency = Currency.objects.create(name='US Dollar', symbol='USD')
+    group = BenchmarkGroup.objects.create(name='Profiles', description='')
+    start_date = date.today() - timedelta(days=num_days)
+    for i in range(num_benchmarks):
+        benchmark = Benchmark.objects.create(group=group, name='Benchmark %s' % i, symbol='B%s' % i,
+                                             description='', currency=currency,
+                                             benchmark_type='I', benchmark_asset_class='C')
+        BenchmarkData.objects.bulk_create([
+            BenchmarkData(benchmark=benchmark, date=start_date + timedelta(days=day),
+                          price=Decimal(1000 + day), change=Decimal('0.10'),
+                          growth_of_10_k=Decimal(10000 + day), change_52_week=Decimal('5.00'))
+            for day in range(num_days)])
+        benchmark.save()
+
+
+def measure(name, queryset, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        rows = list(queryset.all())
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    sizes = [row_size(row) for row in rows[:1000]]
+    print('%-32s %10.0f rows/s %8.0f bytes/row' % (name, len(rows) / best, float(sum(sizes)) / len(sizes)))
+
+
+def main(num_benchmarks=50, num_days=2000):
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+    from benchmarks.models import Benchmark, BenchmarkData
+    seed(int(num_benchmarks), int(num_days))
+
+    benchmarks = Benchmark.objects.all()
+    measure('Benchmark (all fields)', benchmarks)
+    measure('Benchmark.listing()', benchmarks.listing())
+
+    data = BenchmarkData.objects.all()
+    measure('BenchmarkData (all fields)', data)
+    measure('BenchmarkData.listing()', data.listing())
+    measure('BenchmarkData.snapshot()', data.snapshot())
+    measure('BenchmarkData.prices_only()', data.prices_only())
+    measure('BenchmarkData.price_points()', data.price_points())
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Measures the cost of loading the benchmarks app.
+
+Each measurement runs in a fresh interpreter, so that nothing is cached
+between runs. The script reports the median time taken by django.setup() with
+the test settings, the time taken to import numpy and pandas on their own,
+and which module first imported each of them during setup.
+
+Usage:
+    python bench/startup_benchmark.py [runs]
+
+Note that the forex app imports numpy and pandas at module level itself, so
+a project using it still pays for both libraries at startup.
+"""
+import json
+import subprocess
+import sys
+
+
+# Records which module first imports numpy and pandas, then times django.setup()
+SETUP_SCRIPT = r"""
+import json, sys, time
+
+importers = {}
+
+class ImportSpy(object):
+    def find_module(self, fullname, path=None):
+        if fullname in ('numpy', 'pandas') and fullname not in importers:
+            frame = sys._getframe(1)
+            while frame is not None and frame.f_globals.get('__name__', '').startswith(('importlib', '_frozen_importlib')):
+                frame = frame.f_back
+            importers[fullname] = frame.f_globals.get('__name__') if frame is not None else None
+        return None
+
+sys.meta_path.insert(0, ImportSpy())
+
+from django.conf import settings
+import benchmarks.settings.test_settings as test_settings
+settings.configure(**test_settings.__dict__)
+
+import django
+start = time.time()
+django.setup()
+setup_time = time.time() - start
+
+print(json.dumps({
+    'setup': setup_time,
+    'importers': importers,
+    'analytics_loaded': 'benchmarks.analytics' in sys.modules,
+}))
+"""
+
+# Times the import of the analytics stack on its own
+ANALYTICS_SCRIPT = r"""
+import json, time
+start = time.time()
+import numpy, pandas
+print(json.dumps({'analytics': time.time() - start}))
+"""
+
+
+def measure(script):
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(runs=5):
+    setup_results = [measure(SETUP_SCRIPT) for i in range(runs)]
+    analytics_results = [measure(ANALYTICS_SCRIPT) for i in range(runs)]
+
+    print('django.setup()        %8.1f ms (median of %s)' % (median([r['setup'] for r in setup_results]) * 1000, runs))
+    print('import numpy, pandas  %8.1f ms (median of %s)' % (median([r['analytics'] for r in analytics_results]) * 1000, runs))
+    for name in ('numpy', 'pandas'):
+        print('%-21s %s' % (name + ' imported by', setup_results[0]['importers'].get(name) or 'nothing'))
+    print('benchmarks.analytics loaded at setup: %s' % (setup_results[0]['analytics_loaded'],))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
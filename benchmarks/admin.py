@@ -1,14 +1,103 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
 from benchmarks.models import Benchmark, BenchmarkData, BenchmarkGroup
+from benchmarks.snapshots import snapshot_batch
+from benchmarks.telemetry import refresh_run
 
 
-class BenchmarkAdmin(admin.ModelAdmin): 
+class CappedCountPaginator(Paginator):
+    """
+    Paginator that counts at most COUNT_LIMIT rows, so that the changelist of
+    a table with millions of rows does not run a full COUNT(*).
+    """
+    COUNT_LIMIT = 10000
+
+    def _get_count(self):
+        if self._count is None:
+            self._count = self.object_list.values('pk')[:self.COUNT_LIMIT].count()
+        return self._count
+    count = property(_get_count)
+
+
+class BenchmarkIdFilter(admin.SimpleListFilter):
+    """
+    Filters by benchmark id (eg. ?benchmark=12) without listing every
+    benchmark in the sidebar.
+    """
+    title = 'benchmark'
+    parameter_name = 'benchmark'
+
+    def lookups(self, request, model_admin):
+        if self.value() and self.value().isdigit():
+            return Benchmark.objects.filter(pk=self.value()).listing().values_list('pk', 'name')
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(benchmark_id=self.value())
+        return queryset
+
+
+def rebuild_statistics(modeladmin, request, benchmarks):
+    updated = 0
+    with snapshot_batch(), refresh_run('rebuild') as run:
+        for benchmark in benchmarks:
+            with run.record(benchmark) as timing:
+                timing.points = benchmark.rebuild_statistics()
+                benchmark.save()
+            updated += timing.points
+    modeladmin.message_user(request, "Rebuilt statistics of %s benchmark(s), %s data point(s) updated." % (len(benchmarks), updated))
+
+
+def refresh_cached_data(modeladmin, request, benchmarks):
+    with snapshot_batch(), refresh_run('refresh') as run:
+        for benchmark in benchmarks:
+            with run.record(benchmark):
+                benchmark.save()
+    modeladmin.message_user(request, "Refreshed cached data of %s benchmark(s)." % (len(benchmarks),))
+
+
+class BenchmarkAdmin(admin.ModelAdmin):
     search_fields=["name",]
     list_filter=['benchmark_type', 'benchmark_asset_class']
+    actions = ['rebuild_statistics', 'refresh_cached_data']
+
+    def rebuild_statistics(self, request, queryset):
+        rebuild_statistics(self, request, list(queryset))
+    rebuild_statistics.short_description = "Rebuild data point statistics and cached data"
+
+    def refresh_cached_data(self, request, queryset):
+        refresh_cached_data(self, request, list(queryset))
+    refresh_cached_data.short_description = "Refresh cached data"
 admin.site.register(Benchmark, BenchmarkAdmin)
 
-admin.site.register(BenchmarkData)
 
-class BenchmarkGroupAdmin(admin.ModelAdmin): 
+class BenchmarkDataAdmin(admin.ModelAdmin):
+    list_display = ['benchmark', 'date', 'price', 'change', 'price_type', 'is_monthly']
+    list_select_related = ['benchmark']
+    list_filter = [BenchmarkIdFilter, 'price_type', 'is_monthly']
+    raw_id_fields = ['benchmark']
+    date_hierarchy = 'date'
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    actions = ['rebuild_statistics', 'refresh_cached_data']
+
+    def selected_benchmarks(self, queryset):
+        """
+        The benchmarks of the selected data points
+        """
+        benchmark_ids = queryset.order_by().values_list('benchmark_id', flat=True).distinct()
+        return list(Benchmark.objects.filter(pk__in=list(benchmark_ids)))
+
+    def rebuild_statistics(self, request, queryset):
+        rebuild_statistics(self, request, self.selected_benchmarks(queryset))
+    rebuild_statistics.short_description = "Rebuild statistics of the selected benchmarks"
+
+    def refresh_cached_data(self, request, queryset):
+        refresh_cached_data(self, request, self.selected_benchmarks(queryset))
+    refresh_cached_data.short_description = "Refresh cached data of the selected benchmarks"
+admin.site.register(BenchmarkData, BenchmarkDataAdmin)
+
+class BenchmarkGroupAdmin(admin.ModelAdmin):
     prepopulated_fields = { 'slug': ['name'] }
 admin.site.register(BenchmarkGroup, BenchmarkGroupAdmin)
@@ -0,0 +1,195 @@
+"""
+Pandas-based analytics for benchmarks.
+
+This module imports numpy and pandas, so it is only loaded when one of the
+analytics methods of Benchmark is first called. Importing benchmarks.models
+does not pull in either library.
+"""
+import numpy as np
+from datetime import date, timedelta
+from pandas import DataFrame, Timestamp, date_range
+
+from holidays.models import Holiday
+from benchmarks.models import BenchmarkData
+from benchmarks.routers import read_database
+
+
+def find_missing_values(benchmark, direction=0, return_data=True, verbose=True):
+    """
+    This is a helper method that searches the benchmark value data and tries to find missing
+    value points, excluding weekends and holidays.
+
+    If direction == 0, find all value dates that SHOULD be in the db but are not. 
+    eg. a regular non-holiday Thursday that is not in our db
+
+    If direction ==1, find all value dates that SHOULD NOT be in the db but are.
+    eg. a weekend that is in our db
+
+    This is inefficient but works for now.
+
+    There is an equivalent function for stocks.
+    """
+
+    start_date = benchmark.effective_series_start_date()
+    end_date = date.today() - timedelta(days=3)
+
+    # Get benchmark dates from database
+    value_points_db = BenchmarkData.objects.filter(benchmark=benchmark, 
+                                            date__gte=start_date).values_list('date', flat=True)
+
+    # Get required dates (exclude weekends)
+    required_dates = date_range(start_date, end_date, freq="B")
+    required_dates_list = required_dates.tolist()
+    required_dates_list_asdates = [i.date() for i in required_dates_list]
+
+    # Remove holidays
+    if benchmark.associated_country != None:
+        holidays = Holiday.objects.filter(country=benchmark.associated_country,
+                                          date__gte=start_date,
+                                          date__lte=end_date).values_list('date', flat=True)
+        for holiday in holidays:
+            if holiday in required_dates_list_asdates:
+                required_dates_list_asdates.remove(holiday)
+
+    assert direction in [0,1]
+
+
+    missing_values = []
+    # Find missing values
+    if direction == 0:
+        for required_value in required_dates_list_asdates:
+            if required_value not in value_points_db:
+                missing_values.append(required_value)
+
+        print "Missing %s value points" % (str(len(missing_values)))
+
+    if direction == 1:
+        for value in value_points_db:
+            if value not in required_dates_list_asdates:
+                missing_values.append(value)
+
+        print "Unrequired %s value  points" % (str(len(missing_values)))
+
+    if verbose == True:
+        new_list = []
+        for i in missing_values:
+            new_list.append((i, "      " + str(i.strftime("%A"))))
+        missing_values = new_list
+
+    if return_data == True:
+        missing_values.sort()
+        return missing_values
+
+
+# How far before the start date to look for the previous period end
+PERIOD_LOOKBACK = {'W': 7, 'M': 31, 'Q': 92, 'A': 366}
+
+
+def generate_dataframe(benchmark, start_date=None, end_date=None, with_change=False, fill=True, freq=None, using=None,
+                       as_of=None):
+    """
+    Generate a Pandas dataframe using Benchmark data
+
+    With freq set to W, M, Q or A, the dataframe holds the last price of each
+    week, month, quarter or year, indexed by the date of that price, and the
+    CHANGE column holds the period returns. fill and with_change are ignored.
+
+    The data is read from using, or as routed by benchmarks.routers. With
+    as_of (a datetime or date), the daily data is as it was known then, see
+    benchmarks.revisions.
+    """
+
+    benchmark_symbol = benchmark.symbol
+
+    if freq not in (None, 'D'):
+        if as_of != None:
+            raise ValueError("as_of is only supported for daily data")
+        return generate_period_dataframe(benchmark, freq, start_date=start_date, end_date=end_date, using=using)
+
+    # Set start and end dates if unspecified
+    if start_date == None:
+        start_date = benchmark.effective_series_start_date()
+    if end_date == None:
+        end_date = date.today()
+    start_date_with_timelag = start_date - timedelta(days=90)
+
+    # Get Benchmark Data, in a single query per database (and the archive, if the range reaches into it)
+    benchmark_data = []
+    for queryset in benchmark.read_querysets(start_date_with_timelag, end_date, using):
+        benchmark_data.extend(queryset.price_points())
+    if benchmark.reads_archive(start_date_with_timelag):
+        from benchmarks.archive import archived_price_points
+        live_dates = set(point[0] for point in benchmark_data)
+        benchmark_data = [point for point in archived_price_points(benchmark, start_date_with_timelag, end_date,
+                                                                   using=read_database(using))
+                          if point[0] not in live_dates] + benchmark_data
+        benchmark_data.sort()
+    if as_of != None:
+        from benchmarks.revisions import revisions_after, revise_points
+        benchmark_data = revise_points(benchmark_data, revisions_after(benchmark, as_of, start_date_with_timelag,
+                                                                       end_date), as_of)
+
+    # Get earliest and latest actual data dates
+    if benchmark_data:
+        latest_actual_date = benchmark_data[-1][0]
+        earliest_actual_date = benchmark_data[0][0]
+    else:
+        latest_actual_date = end_date   
+        earliest_actual_date = start_date
+
+    # Create dataframe
+    price_column_name = "PRICE:" + benchmark_symbol
+    if len(benchmark_data) > 5:  # Otherwise we get lower bound errors
+        # Generate numpy array form queryset data
+        benchmark_data_array = np.core.records.fromrecords(benchmark_data, names=['DATE', price_column_name])
+        df = DataFrame.from_records(benchmark_data_array, index='DATE')
+        end_date = df.index[-1]  # Set end date from today to the actual last recorded date           
+    else:
+        # If there is no data, generate an empty queryset
+        benchmark_data_array = np.core.records.fromrecords([(date(1900,1,1) ,0)], names=['DATE', price_column_name])            
+        df = DataFrame.from_records(benchmark_data_array, index='DATE')
+        return df        
+
+    # Convert to float
+    df = df.astype(float)
+
+    # Reindex dataframe to create a datapoint for each day
+    if fill == True:
+        if len(benchmark_data_array) > 1:  # Use >1 and not >0, since we may have single junk data
+            date_index = date_range(start_date_with_timelag, end_date)
+            df = df.reindex(date_index)
+        else:
+            date_index = []
+            df = df.reindex(date_index)
+            return df
+
+        # Forward Fill
+        df[price_column_name] = df[price_column_name].fillna(method="pad")
+
+        # Reindex to required range
+        date_index = date_range(max(earliest_actual_date,start_date), end_date)
+        df = df.reindex(date_index)
+    else:
+        date_index = [i[0] for i in benchmark_data if i[0] >= max(earliest_actual_date,start_date) and i[0] <=end_date]
+        df = df.reindex(date_index)
+
+    if with_change == True:
+        df["CHANGE"] = df["PRICE:"+benchmark.symbol].pct_change()          
+
+    return df
+
+
+def generate_period_dataframe(benchmark, freq, start_date=None, end_date=None, using=None):
+    """
+    Generate a Pandas dataframe of the period-end prices and period returns of
+    a benchmark. See generate_dataframe.
+    """
+    if freq not in PERIOD_LOOKBACK:
+        raise ValueError("Unknown frequency %s, use D, W, M, Q or A" % freq)
+    if start_date == None:
+        start_date = benchmark.effective_series_start_date()
+
+    # Include the period before start_date, so that the first period has a return
+    series = benchmark.period_series(freq, start_date - timedelta(days=PERIOD_LOOKBACK[freq]), end_date, using=using)
+    df = series.to_dataframe(with_change=True)
+    return df[df.index >= Timestamp(start_date)]
@@ -0,0 +1,274 @@
+"""
+Compressed archive tier for closed benchmark history.
+
+Each BenchmarkArchive row holds one calendar year of one benchmark's data
+points as a compressed set of NumPy arrays, one array per BenchmarkData column
+(np.savez_compressed, ie. zlib per column). Archived points are removed from
+the BenchmarkData table, which keeps it and its indexes small, and
+Benchmark.archived_until records the last archived date.
+
+Benchmark.series(), period_series() and generate_dataframe() merge archived
+points into their results when the requested range reaches back into the
+archive. Live points win over archived points of the same date.
+
+Columns are stored by type: dates as days since the epoch, decimals as scaled
+integers, and nullable columns with a separate null mask, so that archives
+restore exactly.
+
+Usage:
+    archive_benchmark(benchmark, before=date(2009, 1, 1))
+    restore_benchmark(benchmark)
+"""
+import io
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Min, Max
+
+import benchmarks.settings as benchmarksettings
+from benchmarks.locks import benchmark_lock
+from benchmarks.models import Benchmark, BenchmarkArchive, BenchmarkData
+
+
+# Archives only hold plain arrays. numpy 1.10 and later can be told to refuse
+# pickled object arrays; older versions do not take the argument.
+LOAD_OPTIONS = {'allow_pickle': False} if tuple(int(part) for part in np.__version__.split('.')[:2]) >= (1, 10) else {}
+
+
+def archive_fields():
+    """
+    The archived BenchmarkData fields, as (name, kind, decimal places) tuples
+    """
+    kinds = {
+        'DateField': 'date',
+        'CharField': 'text',
+        'DecimalField': 'decimal',
+        'IntegerField': 'int',
+        'BigIntegerField': 'int',
+        'FloatField': 'float',
+        'BooleanField': 'bool',
+    }
+    fields = []
+    for field in BenchmarkData._meta.concrete_fields:
+        if field.primary_key or field.name == 'benchmark':
+            continue
+        fields.append((field.name, kinds[field.get_internal_type()], getattr(field, 'decimal_places', None)))
+    return fields
+
+
+def pack(points):
+    """
+    Compress a list of BenchmarkData value dicts (sorted by date) into a blob
+    """
+    arrays = {}
+    for name, kind, decimal_places in archive_fields():
+        values = [point[name] for point in points]
+        nulls = np.array([value is None for value in values], dtype=bool)
+        if kind == 'date':
+            arrays[name] = np.array(values, dtype='datetime64[D]').astype(np.int32)
+        elif kind == 'text':
+            arrays[name] = np.array([(value or u'').encode('utf-8') for value in values], dtype=np.bytes_)
+        elif kind == 'decimal':
+            arrays[name] = np.array([int(value.scaleb(decimal_places)) if value is not None else 0
+                                     for value in values], dtype=np.int64)
+        elif kind == 'int':
+            arrays[name] = np.array([value if value is not None else 0 for value in values], dtype=np.int64)
+        elif kind == 'float':
+            arrays[name] = np.array([value if value is not None else np.nan for value in values], dtype=np.float64)
+        else:
+            arrays[name] = np.array([bool(value) for value in values], dtype=bool)
+        if nulls.any():
+            arrays[name + '__null'] = nulls
+    return pack_arrays(arrays)
+
+
+def pack_arrays(arrays):
+    """
+    Compress a dict of named arrays into a blob, one zlib stream per array
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def load(blob, names=None):
+    """
+    Return the arrays of a blob as a dict, only the columns in names (with
+    their null masks) if given; the other columns are not decompressed.
+    """
+    archive = np.load(io.BytesIO(bytes(blob)), **LOAD_OPTIONS)
+    try:
+        names = names or [name for name in archive.files if not name.endswith('__null')]
+        arrays = {}
+        for name in names:
+            arrays[name] = archive[name]
+            if name + '__null' in archive.files:
+                arrays[name + '__null'] = archive[name + '__null']
+        return arrays
+    finally:
+        archive.close()
+
+
+def unpack(blob):
+    """
+    Return the BenchmarkData value dicts stored in an archive blob
+    """
+    arrays = load(blob)
+    columns = {}
+    for name, kind, decimal_places in archive_fields():
+        array = arrays[name]
+        if kind == 'date':
+            values = array.astype('datetime64[D]').tolist()
+        elif kind == 'text':
+            values = [value.decode('utf-8') for value in array.tolist()]
+        elif kind == 'decimal':
+            values = [Decimal(value).scaleb(-decimal_places) for value in array.tolist()]
+        else:
+            values = array.tolist()
+        nulls = arrays.get(name + '__null')
+        if nulls is not None:
+            values = [None if null else value for value, null in zip(values, nulls.tolist())]
+        columns[name] = values
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def overlapping(benchmark, start_date=None, end_date=None, using=None):
+    """
+    The archives of benchmark with points between start_date and end_date
+    """
+    archives = BenchmarkArchive.objects.using(using).filter(benchmark=benchmark)
+    if start_date != None:
+        archives = archives.filter(end_date__gte=start_date)
+    if end_date != None:
+        archives = archives.filter(start_date__lte=end_date)
+    return archives.order_by('year')
+
+
+def archived_prices(benchmark, start_date=None, end_date=None, using=None):
+    """
+    Return the archived (dates, prices) of benchmark between two dates
+    (inclusive) as a datetime64[D] array and a float64 array
+    """
+    price_field = BenchmarkData._meta.get_field('price')
+    dates, prices = [], []
+    for blob in overlapping(benchmark, start_date, end_date, using).values_list('data', flat=True):
+        arrays = load(blob, ['date', 'price'])
+        dates.append(arrays['date'].astype('datetime64[D]'))
+        prices.append(arrays['price'] / 10.0 ** price_field.decimal_places)
+    if not dates:
+        return np.zeros(0, dtype='datetime64[D]'), np.zeros(0)
+    dates, prices = np.concatenate(dates), np.concatenate(prices)
+    keep = np.ones(len(dates), dtype=bool)
+    if start_date != None:
+        keep &= dates >= np.datetime64(start_date, 'D')
+    if end_date != None:
+        keep &= dates <= np.datetime64(end_date, 'D')
+    return dates[keep], prices[keep]
+
+
+def archived_price_points(benchmark, start_date=None, end_date=None, using=None):
+    """
+    Return the archived (date, price) tuples of benchmark between two dates
+    (inclusive), like BenchmarkDataQuerySet.price_points()
+    """
+    decimal_places = BenchmarkData._meta.get_field('price').decimal_places
+    points = []
+    for blob in overlapping(benchmark, start_date, end_date, using).values_list('data', flat=True):
+        arrays = load(blob, ['date', 'price'])
+        points.extend((point_date, Decimal(price).scaleb(-decimal_places)) for point_date, price
+                      in zip(arrays['date'].astype('datetime64[D]').tolist(), arrays['price'].tolist())
+                      if (start_date == None or point_date >= start_date) and
+                      (end_date == None or point_date <= end_date))
+    return points
+
+
+def archived_points(benchmark, start_date=None, end_date=None):
+    """
+    Return the archived BenchmarkData value dicts of benchmark between two
+    dates (inclusive), sorted by date
+    """
+    points = []
+    for blob in overlapping(benchmark, start_date, end_date).values_list('data', flat=True):
+        points.extend(point for point in unpack(blob)
+                      if (start_date == None or point['date'] >= start_date) and
+                      (end_date == None or point['date'] <= end_date))
+    return points
+
+
+def archive_benchmark(benchmark, before=None):
+    """
+    Move the data points of the calendar years before the year of before
+    (BENCHMARK_VALUE_DATA_START_DATE by default) into the archive, one row per
+    year. Years already archived are merged with the new points.
+
+    Returns the number of points archived.
+    """
+    if before == None:
+        before = benchmarksettings.BENCHMARK_VALUE_DATA_START_DATE
+    cutoff = date(before.year, 1, 1)
+    names = [name for name, kind, decimal_places in archive_fields()]
+
+    archived = 0
+    with benchmark_lock(benchmark.pk):
+        live = BenchmarkData.objects.filter(benchmark=benchmark, date__lt=cutoff)
+        years = sorted(set(point_date.year for point_date in live.dates('date', 'year')))
+        for year in years:
+            points = list(live.filter(date__year=year).order_by('date').values(*names))
+            archived += len(points)
+            try:
+                archive = BenchmarkArchive.objects.get(benchmark=benchmark, year=year)
+                live_dates = set(point['date'] for point in points)
+                points = sorted([point for point in unpack(archive.data) if point['date'] not in live_dates] + points,
+                                key=lambda point: point['date'])
+            except BenchmarkArchive.DoesNotExist:
+                archive = BenchmarkArchive(benchmark=benchmark, year=year)
+            archive.start_date = points[0]['date']
+            archive.end_date = points[-1]['date']
+            archive.points = len(points)
+            archive.data = pack(points)
+            archive.save()
+            live.filter(date__year=year).delete()
+        update_archived_until(benchmark)
+    return archived
+
+
+def restore_benchmark(benchmark, years=None):
+    """
+    Move the archived points of benchmark (only of years, if given) back into
+    the BenchmarkData table. Dates that have a live point keep it.
+
+    Returns the number of points restored.
+    """
+    restored = 0
+    with benchmark_lock(benchmark.pk):
+        archives = BenchmarkArchive.objects.filter(benchmark=benchmark)
+        if years is not None:
+            archives = archives.filter(year__in=list(years))
+        for archive in archives.order_by('year'):
+            points = unpack(archive.data)
+            live_dates = set(BenchmarkData.objects.filter(benchmark=benchmark, date__gte=archive.start_date,
+                                                          date__lte=archive.end_date).values_list('date', flat=True))
+            new_points = [BenchmarkData(benchmark=benchmark, **point) for point in points
+                          if point['date'] not in live_dates]
+            BenchmarkData.objects.bulk_create(new_points, batch_size=500)
+            restored += len(new_points)
+            archive.delete()
+        update_archived_until(benchmark)
+    return restored
+
+
+def update_archived_until(benchmark):
+    """
+    Store the last archived date of benchmark, without the other cached data
+    """
+    benchmark.archived_until = BenchmarkArchive.objects.filter(benchmark=benchmark).aggregate(
+        end_date=Max('end_date'))['end_date']
+    Benchmark.objects.filter(pk=benchmark.pk).update(archived_until=benchmark.archived_until)
+
+
+def archive_start_date(benchmark):
+    """
+    The first archived date of benchmark, or None
+    """
+    return BenchmarkArchive.objects.filter(benchmark=benchmark).aggregate(start_date=Min('start_date'))['start_date']
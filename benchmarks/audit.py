@@ -0,0 +1,198 @@
+"""
+Fleet-wide data-gap audit.
+
+Finds the missing and unexpected value dates of every active benchmark in two
+set-based queries, instead of scanning each benchmark in Python as
+Benchmark.find_missing_values() does.
+
+Expected dates are weekdays that are not a holiday of the benchmark's
+associated country. The audit builds a temporary calendar table holding, for
+every day of the audited period, whether it is a weekday and the running count
+of weekdays up to that day. Consecutive data points are paired with LAG(), so
+the number of weekdays between two points is a difference of two calendar
+lookups, and holidays only need to be counted for the few pairs that have a
+gap. Forward-filled (FIL) rows do not close a gap unless include_filled is set.
+
+Usage:
+    for summary in audit_gaps():
+        print summary.symbol, summary.gap_count, summary.longest_gap
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils.dateparse import parse_date
+
+import benchmarks.settings as benchmarksettings
+from holidays.models import Holiday
+from benchmarks.models import Benchmark, BenchmarkData
+
+
+CALENDAR_TABLE = 'benchmarks_audit_calendar'
+
+# A run of missing expected dates, between two data points (or between the
+# last data point and the end of the audit)
+Gap = namedtuple('Gap', ['after', 'before', 'missing'])
+
+GapSummary = namedtuple('GapSummary', ['benchmark_id', 'symbol', 'first_date', 'last_good_date', 'points',
+                                       'unexpected', 'gap_count', 'missing', 'longest_gap', 'gaps'])
+
+
+def _to_date(value):
+    """
+    Dates computed in SQL (eg. by LAG) come back as text from some backends
+    """
+    if value is None or isinstance(value, date):
+        return value
+    return parse_date(value[:10])
+
+
+def _create_calendar(cursor, connection, start_date, end_date):
+    """
+    Create the temporary calendar table from start_date to end_date
+    """
+    qn = connection.ops.quote_name
+    cursor.execute('CREATE TEMPORARY TABLE %s (%s DATE PRIMARY KEY, is_weekday INTEGER NOT NULL, '
+                   'weekdays INTEGER NOT NULL)' % (qn(CALENDAR_TABLE), qn('date')))
+    rows = []
+    weekdays = 0
+    day = start_date
+    while day <= end_date:
+        is_weekday = 1 if day.weekday() < 5 else 0
+        weekdays += is_weekday
+        rows.append((day, is_weekday, weekdays))
+        day += timedelta(days=1)
+    cursor.executemany('INSERT INTO %s (%s, is_weekday, weekdays) VALUES (%%s, %%s, %%s)' % (
+        qn(CALENDAR_TABLE), qn('date')), rows)
+
+
+def _tables(connection):
+    qn = connection.ops.quote_name
+    return {
+        'calendar': qn(CALENDAR_TABLE),
+        'benchmark': qn(Benchmark._meta.db_table),
+        'data': qn(BenchmarkData._meta.db_table),
+        'holiday': qn(Holiday._meta.db_table),
+        'date': qn('date'),
+    }
+
+
+def _benchmark_filter(benchmark_ids):
+    """
+    The predicate selecting the audited benchmarks: the active ones, or
+    benchmark_ids whatever their state
+    """
+    if benchmark_ids is None:
+        return 'b.benchmark_state = %s', ['AC']
+    return 'b.id IN (%s)' % ', '.join(['%s'] * len(benchmark_ids)), list(benchmark_ids)
+
+
+# Consecutive data points of every audited benchmark, plus a final pair from the
+# last point to the day after the audit end, and the expected dates between them.
+GAPS_SQL = """
+WITH points AS (
+    SELECT d.benchmark_id, d.%(date)s AS point_date,
+           LAG(d.%(date)s) OVER (PARTITION BY d.benchmark_id ORDER BY d.%(date)s) AS previous_date
+    FROM %(data)s d INNER JOIN %(benchmark)s b ON b.id = d.benchmark_id
+    WHERE %(filter)s%(price_type)s AND d.%(date)s >= %%s AND d.%(date)s <= %%s
+),
+spans AS (
+    SELECT benchmark_id, previous_date, point_date AS next_date FROM points WHERE previous_date IS NOT NULL
+    UNION ALL
+    SELECT benchmark_id, MAX(point_date), %%s FROM points GROUP BY benchmark_id
+),
+weekday_gaps AS (
+    SELECT s.benchmark_id, s.previous_date, s.next_date,
+           n.weekdays - p.weekdays - n.is_weekday AS missing_weekdays
+    FROM spans s
+    INNER JOIN %(calendar)s p ON p.%(date)s = s.previous_date
+    INNER JOIN %(calendar)s n ON n.%(date)s = s.next_date
+)
+SELECT g.benchmark_id, g.previous_date, g.next_date,
+       g.missing_weekdays - (
+           SELECT COUNT(DISTINCT h.%(date)s)
+           FROM %(holiday)s h
+           INNER JOIN %(benchmark)s b ON b.associated_country_id = h.country_id
+           INNER JOIN %(calendar)s c ON c.%(date)s = h.%(date)s
+           WHERE b.id = g.benchmark_id AND c.is_weekday = 1
+             AND h.%(date)s > g.previous_date AND h.%(date)s < g.next_date
+       ) AS missing
+FROM weekday_gaps g
+WHERE g.missing_weekdays > 0
+"""
+
+# Data points and unexpected (weekend or holiday) dates per audited benchmark
+SUMMARY_SQL = """
+SELECT b.id, b.symbol, MIN(d.%(date)s), MAX(d.%(date)s), COUNT(d.id),
+       SUM(CASE WHEN c.is_weekday = 0 OR EXISTS (
+               SELECT 1 FROM %(holiday)s h
+               WHERE h.country_id = b.associated_country_id AND h.%(date)s = d.%(date)s
+           ) THEN 1 ELSE 0 END)
+FROM %(benchmark)s b
+LEFT OUTER JOIN %(data)s d ON d.benchmark_id = b.id%(price_type)s
+    AND d.%(date)s >= %%s AND d.%(date)s <= %%s
+LEFT OUTER JOIN %(calendar)s c ON c.%(date)s = d.%(date)s
+WHERE %(filter)s
+GROUP BY b.id, b.symbol
+ORDER BY b.symbol
+"""
+
+
+def audit_gaps(start_date=None, end_date=None, benchmark_ids=None, include_filled=False, using=None):
+    """
+    Audit the value dates of the active benchmarks (or of benchmark_ids,
+    whatever their state) from start_date (BENCHMARK_VALUE_DATA_START_DATE by
+    default) to end_date (three days ago by default, like find_missing_values).
+
+    Returns a GapSummary per benchmark, ordered by symbol. A benchmark's audit
+    starts at its first data point in the period; a gap running up to end_date
+    means the series is stale. With include_filled, forward-filled rows count
+    as data points.
+    """
+    if start_date == None:
+        start_date = benchmarksettings.BENCHMARK_VALUE_DATA_START_DATE
+    if end_date == None:
+        end_date = date.today() - timedelta(days=3)
+    if benchmark_ids is not None:
+        benchmark_ids = list(benchmark_ids)
+        if not benchmark_ids:
+            return []
+    after_end = end_date + timedelta(days=1)
+
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    tables = _tables(connection)
+    benchmark_filter, filter_params = _benchmark_filter(benchmark_ids)
+    tables['filter'] = benchmark_filter
+    tables['price_type'] = '' if include_filled else ' AND d.price_type <> %s'
+    price_type_params = [] if include_filled else ['FIL']
+
+    with transaction.atomic(using=connection.alias):
+        cursor = connection.cursor()
+        # If a query fails, the rollback drops the calendar table along with the transaction
+        _create_calendar(cursor, connection, start_date, after_end)
+        cursor.execute(GAPS_SQL % tables, filter_params + price_type_params + [start_date, end_date, after_end])
+        gaps = {}
+        for benchmark_id, after, before, missing in cursor.fetchall():
+            if missing > 0:
+                gaps.setdefault(benchmark_id, []).append(Gap(_to_date(after), _to_date(before), missing))
+
+        cursor.execute(SUMMARY_SQL % tables, price_type_params + [start_date, end_date] + filter_params)
+        rows = cursor.fetchall()
+        cursor.execute('DROP TABLE %s' % (tables['calendar'],))
+
+    summaries = []
+    for benchmark_id, symbol, first_date, last_date, points, unexpected in rows:
+        benchmark_gaps = sorted(gaps.get(benchmark_id, []))
+        summaries.append(GapSummary(
+            benchmark_id=benchmark_id,
+            symbol=symbol,
+            first_date=_to_date(first_date),
+            last_good_date=_to_date(last_date),
+            points=points,
+            unexpected=unexpected or 0,
+            gap_count=len(benchmark_gaps),
+            missing=sum(gap.missing for gap in benchmark_gaps),
+            longest_gap=max([gap.missing for gap in benchmark_gaps] or [0]),
+            gaps=benchmark_gaps,
+        ))
+    return summaries
@@ -0,0 +1,29 @@
+"""
+Business day calendars as numpy date arrays, shared by the synthetic data
+generator and the forward fill.
+"""
+import numpy as np
+
+from holidays.models import Holiday
+
+
+def business_days(start_date, end_date, country=None):
+    """
+    Return the business days from start_date to end_date (inclusive) as a
+    datetime64[D] array, excluding the holidays of country if given.
+    """
+    holidays = []
+    if country is not None:
+        holidays = list(Holiday.objects.filter(country=country, date__gte=start_date,
+                                               date__lte=end_date).values_list('date', flat=True))
+    calendar = np.busdaycalendar(holidays=np.array(holidays, dtype='datetime64[D]'))
+    days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1, dtype='datetime64[D]')
+    return days[np.is_busday(days, busdaycal=calendar)]
+
+
+def month_end_flags(dates):
+    """
+    True for the last date of each month
+    """
+    months = dates.astype('datetime64[M]')
+    return np.append(months[1:] != months[:-1], [True]) if len(dates) else np.zeros(0, dtype=bool)
@@ -0,0 +1,177 @@
+"""
+Forward-filled (FIL) data points for missing trading days.
+
+The gaps of each benchmark are found by the fleet-wide audit (benchmarks.audit).
+Every missing business day of a gap between two quoted points gets a FIL row
+carrying the price (or rate) of the last point before the gap, with
+is_trading_day set to False. Gaps running up to the end of the period are left
+alone, so that a stale series still shows up as stale.
+
+The filled days are merged into the benchmark's dates with numpy, which gives
+the month-end flags and 52 week windows of the new rows, and of the existing
+rows whose flag or 52 week base moved because of them. Only the prices of
+those rows are read, the new rows are written with a bulk insert, and only the
+existing rows that change are updated (one UPDATE per batch), so the result is what
+Benchmark.rebuild_statistics() would compute without rereading the history.
+The new rows are logged as insertions in the revision log, so that as-of reads
+from before the fill leave them out (see benchmarks.revisions).
+
+Usage:
+    filled = fill_missing_days()  # {benchmark id: number of FIL rows}
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.utils import timezone
+
+from benchmarks.audit import audit_gaps
+from benchmarks.calendars import business_days, month_end_flags
+from benchmarks.locks import benchmark_lock
+from benchmarks.managers import update_rows
+from benchmarks.models import Benchmark, BenchmarkData, BenchmarkRevision
+from benchmarks.snapshots import snapshot_batch
+
+
+def missing_days(gaps, country=None):
+    """
+    Return the business days missing in gaps as a sorted datetime64[D] array
+    """
+    if not gaps:
+        return np.zeros(0, dtype='datetime64[D]')
+    days = business_days(gaps[0].after + timedelta(days=1), gaps[-1].before - timedelta(days=1), country)
+    inside = np.zeros(len(days), dtype=bool)
+    for gap in gaps:
+        inside |= (days > np.datetime64(gap.after, 'D')) & (days < np.datetime64(gap.before, 'D'))
+    return days[inside]
+
+
+def window_starts(dates):
+    """
+    Index of the first point of each point's 52 week window, as in rebuild_statistics
+    """
+    return np.searchsorted(dates, dates - np.timedelta64(52 * 7, 'D'), side='left')
+
+
+def point_values(benchmark, point_dates):
+    """
+    Return {date: (price, rate, growth_of_10_k, change_52_week)} for point_dates
+    """
+    point_dates = sorted(point_dates)
+    values = {}
+    for i in range(0, len(point_dates), 500):
+        for row in BenchmarkData.objects.filter(benchmark=benchmark, date__in=point_dates[i:i + 500]).values_list(
+                'date', 'price', 'rate', 'growth_of_10_k', 'change_52_week'):
+            values[row[0]] = row[1:]
+    return values
+
+
+def change_52_week(price, base_price, is_own_base):
+    if is_own_base or base_price == 0:
+        return None
+    return (((price - base_price) / base_price) * 100).quantize(Decimal('0.01'))
+
+
+def fill_benchmark(benchmark, gaps):
+    """
+    Insert the FIL rows for the gaps of one benchmark, update the neighbouring
+    rows and return the number of rows inserted
+    """
+    fill_dates = missing_days(gaps, benchmark.associated_country)
+    with benchmark_lock(benchmark.pk):
+        history = list(BenchmarkData.objects.filter(benchmark=benchmark).order_by('date').values_list(
+            'id', 'date', 'is_monthly'))
+        dates = np.array([point[1] for point in history], dtype='datetime64[D]')
+
+        # The point each filled day carries forward
+        source = np.searchsorted(dates, fill_dates, side='right') - 1
+        keep = source >= 0
+        fill_dates, source = fill_dates[keep], source[keep]
+        if not len(fill_dates):
+            return 0
+
+        # Merge the filled days in. price_dates holds the date of the row whose price each point has.
+        order = np.argsort(np.concatenate([dates, fill_dates]), kind='mergesort')
+        all_dates = np.concatenate([dates, fill_dates])[order]
+        price_dates = np.concatenate([dates, dates[source]])[order]
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        month_ends = month_end_flags(all_dates)
+        starts = window_starts(all_dates)
+
+        # Existing rows whose 52 week base is now a different day
+        existing = position[:len(dates)]
+        moved = np.nonzero(all_dates[starts[existing]] != dates[window_starts(dates)])[0]
+
+        fill_positions = position[len(dates):]
+        needed = set(dates[source].tolist())
+        needed.update(price_dates[starts[fill_positions]].tolist())
+        needed.update(dates[moved].tolist())
+        needed.update(price_dates[starts[existing[moved]]].tolist())
+        values = point_values(benchmark, needed)
+
+        new_points = []
+        for fill_date, source_date, fill_position in zip(fill_dates.tolist(), dates[source].tolist(),
+                                                         fill_positions.tolist()):
+            price, rate, growth_of_10_k = values[source_date][:3]
+            base_price = values[price_dates[starts[fill_position]].item()][0]
+            new_points.append(BenchmarkData(benchmark=benchmark, date=fill_date, price_type='FIL',
+                                            price=price, rate=rate,
+                                            change=Decimal('0.00') if price != 0 else None,
+                                            change_52_week=change_52_week(price, base_price,
+                                                                          starts[fill_position] == fill_position),
+                                            growth_of_10_k=growth_of_10_k,
+                                            is_monthly=bool(month_ends[fill_position]), is_trading_day=False))
+        BenchmarkData.objects.bulk_create(new_points, batch_size=500)
+        now = timezone.now()
+        BenchmarkRevision.objects.bulk_create([
+            BenchmarkRevision(benchmark_id=benchmark.pk, date=point.date, previous_price=None, price=point.price,
+                              valid_from=now)
+            for point in new_points if benchmark.benchmark_type != "R"], batch_size=500)
+        benchmark.data_changed()
+
+        # Month-end flags of the existing rows
+        not_monthly_ids = [history[index][0] for index in np.nonzero(~month_ends[existing])[0].tolist()
+                           if history[index][2]]
+        for i in range(0, len(not_monthly_ids), 500):
+            BenchmarkData.objects.filter(id__in=not_monthly_ids[i:i + 500]).update(is_monthly=False)
+
+        # 52 week change of the existing rows whose base moved
+        updates = {}
+        for index in moved.tolist():
+            point_date = history[index][1]
+            price, old_change_52_week = values[point_date][0], values[point_date][3]
+            merged = existing[index]
+            base_price = values[price_dates[starts[merged]].item()][0]
+            new_change_52_week = change_52_week(price, base_price, starts[merged] == merged)
+            if new_change_52_week != old_change_52_week:
+                updates[history[index][0]] = (new_change_52_week,)
+        update_rows(BenchmarkData.objects.all(), updates, ('change_52_week',))
+    return len(new_points)
+
+
+def fill_missing_days(start_date=None, end_date=None, benchmark_ids=None, refresh=True):
+    """
+    Forward-fill the missing trading days of the active benchmarks (or of
+    benchmark_ids) between start_date and end_date, as reported by audit_gaps().
+    Days that already have a row (including FIL rows) are skipped, so running
+    it again only fills new gaps. With refresh, the cached data of the filled
+    benchmarks is regenerated.
+
+    Returns a dict of the number of rows inserted per benchmark id.
+    """
+    if end_date == None:
+        end_date = date.today() - timedelta(days=3)
+    summaries = audit_gaps(start_date, end_date, benchmark_ids=benchmark_ids, include_filled=True)
+    filled = {}
+    with snapshot_batch():
+        for summary in summaries:
+            # The trailing gap ends after end_date
+            gaps = [gap for gap in summary.gaps if gap.before <= end_date]
+            if not gaps:
+                continue
+            benchmark = Benchmark.objects.get(pk=summary.benchmark_id)
+            filled[benchmark.pk] = fill_benchmark(benchmark, gaps)
+            if refresh and filled[benchmark.pk]:
+                benchmark.save()
+    return filled
@@ -0,0 +1,273 @@
+"""
+Group statistics: member rankings, group averages and composite series.
+
+refresh_group_statistics() computes, for every group, in one pass over the
+active (non-rate) benchmarks:
+
+    rankings    the rank and percentile of each member by YTD return, 52 week
+                change (highest first) and volatility (lowest first), stored
+                in BenchmarkRanking
+    averages    the median and mean of each metric, stored on BenchmarkGroup
+    composite   an equal-weighted composite of the members' daily returns,
+                rebalanced daily and starting at 1000, stored compressed in
+                BenchmarkGroupComposite
+
+The prices of all members are read with a single query, as floats, and every
+statistic is computed on numpy arrays grouped by benchmark and by group. Run
+it after the daily refresh of the cached benchmark data, since the YTD return
+and 52 week change are read from the Benchmark rows.
+
+A group page then needs one indexed query:
+    BenchmarkRanking.objects.filter(group=group).select_related('group', 'benchmark')
+"""
+import warnings
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, transaction
+
+import benchmarks.settings as benchmarksettings
+from benchmarks.archive import load, pack_arrays
+from benchmarks.managers import float_sql, update_rows
+from benchmarks.models import Benchmark, BenchmarkData, BenchmarkGroup, BenchmarkRanking, BenchmarkGroupComposite
+
+
+# (BenchmarkRanking field, whether the highest value ranks first)
+METRICS = (
+    ('ytd_return', True),
+    ('change_52_week', True),
+    ('volatility', False),
+)
+
+# The BenchmarkGroup fields written by refresh_group_statistics, in order
+GROUP_FIELDS = ('statistics_date', 'num_ranked', 'median_ytd_return', 'mean_ytd_return', 'median_52_week_change',
+                'mean_52_week_change', 'median_volatility', 'mean_volatility')
+
+COMPOSITE_BASE = 1000.0
+
+# Fewer daily returns than this in the last 52 weeks give no volatility
+MIN_VOLATILITY_RETURNS = 20
+
+PRICES_SQL = """
+SELECT d.benchmark_id, d.%(date)s, %(price)s
+FROM %(data)s d INNER JOIN %(benchmark)s b ON b.id = d.benchmark_id
+WHERE b.benchmark_state = %%s AND b.benchmark_type <> %%s AND d.%(date)s >= %%s
+ORDER BY d.benchmark_id, d.%(date)s
+"""
+
+
+def rank_within(groups, values, descending=True):
+    """
+    Rank values within their groups, ties sharing the best rank (1 is first).
+    Returns (ranks, percentiles) as float arrays, NaN where the value is NaN.
+    The percentile is the share of the other members of the group ranked
+    below, from 0 to 100.
+    """
+    ranks = np.full(len(values), np.nan)
+    percentiles = np.full(len(values), np.nan)
+    index = np.nonzero(~np.isnan(values))[0]
+    if not len(index):
+        return ranks, percentiles
+
+    member_groups, member_values = groups[index], values[index]
+    order = np.lexsort((-member_values if descending else member_values, member_groups))
+    member_groups, member_values, index = member_groups[order], member_values[order], index[order]
+
+    positions = np.arange(len(index))
+    group_starts = np.concatenate([[True], member_groups[1:] != member_groups[:-1]])
+    tie_starts = group_starts | np.concatenate([[True], member_values[1:] != member_values[:-1]])
+    first_in_group = np.maximum.accumulate(np.where(group_starts, positions, 0))
+    first_in_tie = np.maximum.accumulate(np.where(tie_starts, positions, 0))
+    member_ranks = first_in_tie - first_in_group + 1
+
+    group_ids, sizes = np.unique(member_groups, return_counts=True)
+    member_sizes = sizes[np.searchsorted(group_ids, member_groups)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        member_percentiles = np.where(member_sizes > 1,
+                                      100.0 * (member_sizes - member_ranks) / (member_sizes - 1), 100.0)
+    ranks[index] = member_ranks
+    percentiles[index] = member_percentiles
+    return ranks, percentiles
+
+
+def load_prices(start_date):
+    """
+    Return the (benchmark ids, dates, prices) arrays of every active non-rate
+    benchmark from start_date on, ordered by benchmark and date
+    """
+    qn = connection.ops.quote_name
+    tables = {'data': qn(BenchmarkData._meta.db_table), 'benchmark': qn(Benchmark._meta.db_table), 'date': qn('date'),
+              'price': float_sql('d.price', connection)}
+    cursor = connection.cursor()
+    cursor.execute(PRICES_SQL % tables, ['AC', 'R', start_date])
+    rows = cursor.fetchall()
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype='datetime64[D]'), np.zeros(0)
+    benchmark_ids, dates, prices = zip(*rows)
+    return (np.array(benchmark_ids, dtype=np.int64), np.array(dates, dtype='datetime64[D]'),
+            np.array(prices, dtype=float))
+
+
+def daily_returns(benchmark_ids, prices):
+    """
+    The return into each row from the previous row of the same benchmark, NaN
+    for the first row of a benchmark and around non-positive prices
+    """
+    returns = np.full(len(prices), np.nan)
+    if len(prices) > 1:
+        valid = (benchmark_ids[1:] == benchmark_ids[:-1]) & (prices[:-1] > 0) & (prices[1:] > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[1:] = np.where(valid, prices[1:] / prices[:-1] - 1, np.nan)
+    return returns
+
+
+def volatilities(member_ids, benchmark_ids, dates, returns, since):
+    """
+    The annualized volatility (in percent) of the daily returns since a date,
+    for each of member_ids
+    """
+    recent = ~np.isnan(returns) & (dates >= np.datetime64(since, 'D'))
+    member_index = np.searchsorted(member_ids, benchmark_ids[recent])
+    counts = np.bincount(member_index, minlength=len(member_ids)).astype(float)
+    sums = np.bincount(member_index, weights=returns[recent], minlength=len(member_ids))
+    squares = np.bincount(member_index, weights=returns[recent] ** 2, minlength=len(member_ids))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - sums ** 2 / counts) / (counts - 1)
+    result = np.sqrt(np.maximum(variance, 0.0) * 252) * 100
+    result[counts < MIN_VOLATILITY_RETURNS] = np.nan
+    return result
+
+
+def composites(member_groups, benchmark_ids, member_ids, dates, returns):
+    """
+    Return {group id: (dates, levels)} of the equal-weighted composites
+    """
+    row_groups = member_groups[np.searchsorted(member_ids, benchmark_ids)]
+    result = {}
+    if not len(dates):
+        return result
+    valid = ~np.isnan(returns)
+    days = dates.astype(np.int64)
+    first_day = days.min()
+    span = days.max() - first_day + 1
+    keys = row_groups[valid] * span + (days[valid] - first_day)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    mean_returns = np.bincount(inverse, weights=returns[valid]) / np.bincount(inverse)
+    key_groups = unique_keys // span
+    key_dates = (unique_keys % span + first_day).astype('datetime64[D]')
+
+    for group_id in np.unique(row_groups).tolist():
+        group_start = dates[row_groups == group_id].min()
+        in_group = key_groups == group_id
+        group_dates = np.concatenate([[group_start], key_dates[in_group]])
+        levels = COMPOSITE_BASE * np.concatenate([[1.0], np.cumprod(1 + mean_returns[in_group])])
+        result[group_id] = (group_dates, levels)
+    return result
+
+
+def pack_series(dates, values):
+    return pack_arrays({'date': dates.astype(np.int32), 'value': values})
+
+
+def unpack_series(blob):
+    arrays = load(blob)
+    return arrays['date'].astype('datetime64[D]'), arrays['value']
+
+
+def composite_series(group, start_date=None, end_date=None):
+    """
+    Return the stored composite of a group as a BenchmarkSeries (empty if
+    there is none)
+    """
+    from benchmarks.series import BenchmarkSeries
+
+    try:
+        composite = BenchmarkGroupComposite.objects.get(group=group)
+    except BenchmarkGroupComposite.DoesNotExist:
+        return BenchmarkSeries([], [], symbol=group.slug)
+    dates, values = unpack_series(composite.data)
+    return BenchmarkSeries(dates, values, symbol=group.slug).between(start_date, end_date)
+
+
+def to_decimal(value):
+    return Decimal('%.2f' % value) if not np.isnan(value) else None
+
+
+def to_float(value):
+    return float(value) if not np.isnan(value) else None
+
+
+def refresh_group_statistics(start_date=None, as_of=None):
+    """
+    Recompute the rankings, averages and composites of every group, from the
+    data points since start_date (BENCHMARK_VALUE_DATA_START_DATE by default).
+    Volatility covers the 52 weeks up to as_of (today by default).
+
+    Returns the number of rankings stored.
+    """
+    if start_date == None:
+        start_date = benchmarksettings.BENCHMARK_VALUE_DATA_START_DATE
+    if as_of == None:
+        as_of = date.today()
+
+    members = list(Benchmark.objects.active().exclude(benchmark_type="R").order_by('pk').values_list(
+        'pk', 'group_id', 'ytd_return', 'latest_52_week_change'))
+    member_ids = np.array([member[0] for member in members], dtype=np.int64)
+    member_groups = np.array([member[1] for member in members], dtype=np.int64)
+
+    benchmark_ids, dates, prices = load_prices(start_date)
+    returns = daily_returns(benchmark_ids, prices)
+
+    values = {
+        'ytd_return': np.array([float(member[2]) if member[2] != None else np.nan for member in members]),
+        'change_52_week': np.array([float(member[3]) if member[3] != None else np.nan for member in members]),
+        'volatility': volatilities(member_ids, benchmark_ids, dates, returns, as_of - timedelta(weeks=52)),
+    }
+    ranks = {}
+    for metric, descending in METRICS:
+        ranks[metric] = rank_within(member_groups, values[metric], descending)
+
+    rankings = []
+    for index, (benchmark_id, group_id, ytd_return, change_52_week) in enumerate(members):
+        ranking = BenchmarkRanking(group_id=group_id, benchmark_id=benchmark_id, ytd_return=ytd_return,
+                                   change_52_week=change_52_week, volatility=to_float(values['volatility'][index]))
+        for metric, descending in METRICS:
+            rank, percentile = ranks[metric][0][index], ranks[metric][1][index]
+            setattr(ranking, metric + '_rank', int(rank) if not np.isnan(rank) else None)
+            setattr(ranking, metric + '_percentile', to_float(percentile))
+        rankings.append(ranking)
+
+    group_composites = []
+    for group_id, (composite_dates, levels) in sorted(composites(member_groups, benchmark_ids, member_ids,
+                                                                 dates, returns).items()):
+        group_composites.append(BenchmarkGroupComposite(group_id=group_id, start_date=composite_dates[0].tolist(),
+                                                        end_date=composite_dates[-1].tolist(),
+                                                        points=len(composite_dates),
+                                                        data=pack_series(composite_dates, levels)))
+
+    with transaction.atomic():
+        BenchmarkRanking.objects.all().delete()
+        BenchmarkRanking.objects.bulk_create(rankings, batch_size=500)
+        BenchmarkGroupComposite.objects.all().delete()
+        BenchmarkGroupComposite.objects.bulk_create(group_composites, batch_size=50)
+
+        group_ids = np.unique(member_groups).tolist()
+        BenchmarkGroup.objects.exclude(pk__in=group_ids).update(
+            statistics_date=as_of, num_ranked=0, median_ytd_return=None, mean_ytd_return=None,
+            median_52_week_change=None, mean_52_week_change=None, median_volatility=None, mean_volatility=None)
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            # nanmedian warns about groups where a metric is missing for every member
+            warnings.simplefilter('ignore', RuntimeWarning)
+            group_values = {}
+            for group_id in group_ids:
+                in_group = member_groups == group_id
+                averages = dict((metric, (np.nanmedian(values[metric][in_group]), np.nanmean(values[metric][in_group])))
+                                for metric, descending in METRICS)
+                group_values[group_id] = (
+                    as_of, int(in_group.sum()),
+                    to_decimal(averages['ytd_return'][0]), to_decimal(averages['ytd_return'][1]),
+                    to_decimal(averages['change_52_week'][0]), to_decimal(averages['change_52_week'][1]),
+                    to_float(averages['volatility'][0]), to_float(averages['volatility'][1]))
+        update_rows(BenchmarkGroup.objects.all(), group_values, GROUP_FIELDS)
+    return len(rankings)
@@ -0,0 +1,154 @@
+"""
+Growth of 10K, rebased at any start date, and the backfill of the stored chain.
+
+growth_matrix() computes the growth of an amount invested at a start date for
+many benchmarks at once. The prices of all of them are read with one query per
+database of the read plan (as floats, plus the archived years they reach) and
+aligned on the union of their dates, each benchmark carrying its last price
+forward over the days it did not trade. The growth on each date is then
+
+    amount * cumprod(1 + r) = amount * price / base price
+
+for the whole (dates x benchmarks) matrix, where the base price is the
+benchmark's price as of the start date. A benchmark with no price in the
+BASE_LOOKBACK_DAYS up to the start date is based at its first price after it.
+
+BenchmarkData.growth_of_10_k is a different thing: a chain from the first data
+point of a benchmark, extended by BenchmarkData.save(). It stays null when the
+first point was never seeded. backfill_growth_of_10k() seeds the first point
+of each benchmark and recomputes the chain over the whole history with
+Benchmark.rebuild_statistics(seed=...), writing only the points whose values
+change.
+
+Usage:
+    df = growth_dataframe(benchmarks, date(2015, 1, 1))  # one column per symbol
+    backfill_growth_of_10k(Benchmark.objects.active())
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import connections
+
+from benchmarks.managers import float_sql
+from benchmarks.models import BenchmarkData
+from benchmarks.routers import read_database, read_plan
+
+
+GROWTH_AMOUNT = 10000
+
+# Days before the start date searched for the base price
+BASE_LOOKBACK_DAYS = 31
+
+PRICES_SQL = """
+SELECT benchmark_id, %(date)s, %(price)s
+FROM %(data)s
+WHERE benchmark_id IN (%(ids)s) AND %(date)s >= %%s%(end)s
+ORDER BY benchmark_id, %(date)s
+"""
+
+
+def load_prices(benchmarks, start_date, end_date=None, using=None):
+    """
+    Return the (column, dates, prices) arrays of the price points of
+    benchmarks between two dates (inclusive), the column being the index of
+    the benchmark in benchmarks. Archived points come first, so that live
+    points of the same date override them when the arrays are applied in order.
+    """
+    columns = dict((benchmark.pk, index) for index, benchmark in enumerate(benchmarks))
+    rows = []
+    for index, benchmark in enumerate(benchmarks):
+        if benchmark.reads_archive(start_date):
+            from benchmarks.archive import archived_price_points
+
+            archived_end_date = min(end_date, benchmark.archived_until) if end_date != None else benchmark.archived_until
+            rows.extend((index, point_date, float(price)) for point_date, price
+                        in archived_price_points(benchmark, start_date, archived_end_date, using=read_database(using)))
+
+    modified = [benchmark.data_modified_at for benchmark in benchmarks if benchmark.data_modified_at != None]
+    modified_at = max(modified) if modified else None
+    for alias, part_start_date, part_end_date in read_plan(start_date, end_date, using, modified_at=modified_at):
+        connection = connections[alias]
+        qn = connection.ops.quote_name
+        sql = PRICES_SQL % {'data': qn(BenchmarkData._meta.db_table), 'date': qn('date'),
+                            'price': float_sql('price', connection),
+                            'ids': ', '.join(['%s'] * len(columns)),
+                            'end': ' AND %s <= %%s' % qn('date') if part_end_date != None else ''}
+        params = list(columns) + [part_start_date] + ([part_end_date] if part_end_date != None else [])
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        rows.extend((columns[benchmark_id], point_date, price) for benchmark_id, point_date, price in cursor.fetchall())
+
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype='datetime64[D]'), np.zeros(0)
+    column_index, dates, prices = zip(*rows)
+    return np.array(column_index, dtype=np.int64), np.array(dates, dtype='datetime64[D]'), np.array(prices, dtype=float)
+
+
+def aligned_prices(columns, dates, prices, width):
+    """
+    Align price points on the union of their dates: returns the dates and a
+    (dates x width) matrix, each column carrying its last price forward and
+    NaN before its first price
+    """
+    grid = np.unique(dates)
+    matrix = np.full((len(grid), width), np.nan)
+    matrix[np.searchsorted(grid, dates), columns] = prices
+    rows = np.arange(len(grid))[:, None]
+    last = np.maximum.accumulate(np.where(np.isnan(matrix), 0, rows), axis=0)
+    return grid, matrix[last, np.arange(width)]
+
+
+def growth_matrix(benchmarks, start_date, end_date=None, amount=GROWTH_AMOUNT, using=None):
+    """
+    The growth of amount invested at start_date in each of benchmarks, up to
+    end_date (inclusive, the latest data by default).
+
+    Returns (dates, values): the start date followed by every later date any
+    of the benchmarks has a price on, as datetime64[D], and a (dates x
+    benchmarks) float array, NaN where a benchmark has no growth (before its
+    base price, or without a positive base price).
+    """
+    benchmarks = list(benchmarks)
+    start = np.datetime64(start_date, 'D')
+    if not benchmarks:
+        return np.array([start]), np.zeros((1, 0))
+
+    columns, dates, prices = load_prices(benchmarks, start_date - timedelta(days=BASE_LOOKBACK_DAYS), end_date, using)
+    grid, matrix = aligned_prices(columns, dates, prices, len(benchmarks))
+
+    # The base price is the price as of the start date, or else the first price after it
+    base_row = np.searchsorted(grid, start, 'right') - 1
+    base = matrix[base_row] if base_row >= 0 else np.full(len(benchmarks), np.nan)
+    later = matrix[base_row + 1:]
+    first_row = np.argmax(~np.isnan(later), axis=0)
+    unbased = np.isnan(base) & ~np.isnan(later).all(axis=0)
+    base[unbased] = later[first_row[unbased], np.nonzero(unbased)[0]]
+    base[~(base > 0)] = np.nan
+
+    with np.errstate(invalid='ignore'):
+        values = amount * later / base
+    start_values = np.where(np.isnan(base) | unbased, np.nan, float(amount))
+    return np.concatenate([[start], grid[base_row + 1:]]), np.vstack([start_values, values])
+
+
+def growth_dataframe(benchmarks, start_date, end_date=None, amount=GROWTH_AMOUNT, using=None):
+    """
+    growth_matrix() as a pandas DataFrame indexed by date, one column per
+    benchmark symbol
+    """
+    from pandas import DataFrame, DatetimeIndex
+
+    benchmarks = list(benchmarks)
+    dates, values = growth_matrix(benchmarks, start_date, end_date, amount, using)
+    return DataFrame(values, index=DatetimeIndex(dates, name='date'),
+                     columns=[benchmark.symbol for benchmark in benchmarks])
+
+
+def backfill_growth_of_10k(benchmarks, seed=GROWTH_AMOUNT):
+    """
+    Seed and rechain the growth of 10K of every (non-rate) benchmark of a
+    queryset, with Benchmark.rebuild_statistics(seed=seed).
+    Returns {symbol: number of data points updated}.
+    """
+    return dict((benchmark.symbol, benchmark.rebuild_statistics(seed=seed))
+                for benchmark in benchmarks.exclude(benchmark_type="R").order_by('symbol'))
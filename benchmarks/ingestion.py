@@ -0,0 +1,111 @@
+"""
+Parallel ingestion of benchmark price data.
+
+Rows are partitioned by benchmark and each partition is written by one worker
+process under the benchmark lock (see benchmarks.locks), in date order. Workers
+never share a benchmark, and a benchmark is never written by two workers at
+once, so the month-end flags and the chained statistics stay consistent while
+the universe is loaded on all cores.
+
+On SQLite, writers queue up on the database write lock. Give the connection a
+generous busy timeout (eg. OPTIONS = {'timeout': 60}) when running more than
+one process. In-memory SQLite databases cannot be shared between processes, use
+processes=1 there.
+"""
+import multiprocessing
+from collections import defaultdict
+
+from django.db import connections
+
+from benchmarks.locks import benchmark_lock
+
+
+def partition_by_benchmark(rows):
+    """
+    Group price rows by benchmark. Each row is a dict of BenchmarkData field
+    values with a 'benchmark' key holding a Benchmark or its primary key.
+
+    Returns a dict of {benchmark_id: [row, ...]}, the rows without the
+    'benchmark' key.
+    """
+    partitions = defaultdict(list)
+    for row in rows:
+        row = dict(row)
+        benchmark = row.pop('benchmark')
+        partitions[getattr(benchmark, 'pk', benchmark)].append(row)
+    return dict(partitions)
+
+
+def ingest_benchmark_data(benchmark_id, rows, refresh=True):
+    """
+    Save the price rows of a single benchmark, oldest first, in one transaction
+    holding the benchmark lock. Rows for dates that already exist replace the
+    stored points.
+
+    If refresh is True the cached data of the benchmark is regenerated once all
+    rows are written.
+
+    Returns the number of rows written.
+    """
+    from benchmarks.models import Benchmark, BenchmarkData
+
+    rows = sorted(rows, key=lambda row: row['date'])
+    if not rows:
+        return 0
+
+    with benchmark_lock(benchmark_id):
+        benchmark = Benchmark.objects.get(pk=benchmark_id)
+        existing = dict(BenchmarkData.objects.filter(benchmark=benchmark,
+                                                     date__gte=rows[0]['date'],
+                                                     date__lte=rows[-1]['date']).values_list('date', 'id'))
+        for row in rows:
+            point = BenchmarkData(benchmark=benchmark, id=existing.get(row['date']), **row)
+            point.save()
+
+        if refresh:
+            benchmark.save()
+
+    return len(rows)
+
+
+def _close_connections():
+    """
+    Drop inherited database connections, so that every worker process opens
+    its own.
+    """
+    for connection in connections.all():
+        connection.close()
+
+
+def _ingest_partition(args):
+    benchmark_id, rows, refresh = args
+    return benchmark_id, ingest_benchmark_data(benchmark_id, rows, refresh=refresh)
+
+
+def ingest(rows, processes=None, refresh=True):
+    """
+    Ingest price rows for any number of benchmarks over a process pool.
+
+    rows is an iterable of dicts of BenchmarkData field values, each with a
+    'benchmark' key (see partition_by_benchmark). processes defaults to the
+    number of CPUs; with processes=1 everything runs in the calling process.
+
+    Returns a dict of {benchmark_id: number of rows written}.
+    """
+    partitions = partition_by_benchmark(rows)
+
+    # Largest benchmarks first, so that a long history does not end up last
+    tasks = sorted(((benchmark_id, benchmark_rows, refresh) for benchmark_id, benchmark_rows in partitions.items()),
+                   key=lambda task: len(task[1]), reverse=True)
+
+    if processes == 1 or len(tasks) <= 1:
+        return dict(_ingest_partition(task) for task in tasks)
+
+    _close_connections()
+    pool = multiprocessing.Pool(processes, initializer=_close_connections)
+    try:
+        results = dict(pool.imap_unordered(_ingest_partition, tasks, chunksize=1))
+    finally:
+        pool.close()
+        pool.join()
+    return results
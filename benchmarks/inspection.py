@@ -0,0 +1,198 @@
+"""
+Scanner for suspicious benchmark prices.
+
+Each benchmark's prices are loaded once, as floats, into numpy arrays and checked for:
+
+    nonpositive  a price of zero or less
+    spike        a daily log return more than z_threshold standard deviations
+                 away from the mean of the previous window returns
+    stale        the same price repeated on stale_days or more consecutive points
+                 (every repeat after the first is flagged)
+    reversal     a move of more than jump (eg. 5%) that is undone the next day,
+                 ie. a single junk price
+
+Flagged quoted (QUO) rows get price_type 'INS' (Requires Inspection), in one
+update per benchmark. Forward-filled and already flagged rows are left out of
+the arrays, and adjusted (ADJ) rows are checked but never flagged. Rate
+benchmarks, whose price is always 0, are skipped.
+
+A scan can be limited to the points since a date; the points just before it
+are still loaded so that the windows are complete. Every flagging scan stores
+the date of the last point it scanned as the benchmark's watermark
+(Benchmark.inspected_until), and an incremental scan starts after it.
+
+Usage:
+    findings = scan_benchmarks(since=date(2015, 6, 1))
+    findings = scan_benchmarks(incremental=True)  # the points added since the last scan
+    for finding in findings:
+        print finding.symbol, finding.date, finding.reasons
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection
+
+from benchmarks.managers import float_sql
+from benchmarks.models import Benchmark, BenchmarkData
+
+
+REASONS = ('nonpositive', 'spike', 'stale', 'reversal')
+
+Finding = namedtuple('Finding', ['benchmark_id', 'symbol', 'data_id', 'date', 'price', 'reasons'])
+
+DEFAULT_OPTIONS = {
+    'window': 60,
+    'min_periods': 20,
+    'z_threshold': 6.0,
+    'stale_days': 5,
+    'jump': 0.05,
+    'revert_tolerance': 0.25,
+}
+
+
+def scan_prices(prices, window=60, min_periods=20, z_threshold=6.0, stale_days=5, jump=0.05, revert_tolerance=0.25):
+    """
+    Check an array of consecutive prices and return a dict of boolean masks,
+    one per reason, each as long as prices.
+    """
+    prices = np.asarray(prices, dtype=float)
+    length = len(prices)
+    masks = dict((reason, np.zeros(length, dtype=bool)) for reason in REASONS)
+    if length == 0:
+        return masks
+
+    positive = prices > 0
+    masks['nonpositive'] = ~positive
+
+    # Log returns; returns[i] is the move into point i + 1. Undefined around bad prices.
+    valid = positive[1:] & positive[:-1]
+    returns = np.zeros(length - 1)
+    returns[valid] = np.log(prices[1:][valid] / prices[:-1][valid])
+
+    # Mean and standard deviation of the previous window valid returns, from running sums
+    counts = np.concatenate([[0], np.cumsum(valid)])
+    sums = np.concatenate([[0.0], np.cumsum(returns)])
+    squares = np.concatenate([[0.0], np.cumsum(returns ** 2)])
+    ends = np.arange(length - 1)
+    starts = np.maximum(ends - window, 0)
+    count = counts[ends] - counts[starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (sums[ends] - sums[starts]) / count
+        std = np.sqrt(np.maximum((squares[ends] - squares[starts]) / count - mean ** 2, 0.0))
+        z_scores = np.abs(returns - mean) / std
+        spikes = valid & (count >= min_periods) & (std > 0) & (z_scores > z_threshold)
+
+    # A jump that is undone by the next move. The move back is not a spike of its own.
+    reversals = np.zeros(length - 1, dtype=bool)
+    if length > 2:
+        big = valid[:-1] & valid[1:] & (np.abs(returns[:-1]) > np.log1p(jump))
+        undone = np.abs(returns[:-1] + returns[1:]) < revert_tolerance * np.abs(returns[:-1])
+        reversals[:-1] = big & undone & (np.sign(returns[:-1]) != np.sign(returns[1:]))
+        spikes[1:] &= ~reversals[:-1]
+    masks['spike'][1:] = spikes
+    masks['reversal'][1:] = reversals
+
+    # Runs of equal prices
+    run_starts = np.concatenate([[True], prices[1:] != prices[:-1]])
+    run_ids = np.cumsum(run_starts) - 1
+    run_lengths = np.bincount(run_ids)[run_ids]
+    masks['stale'] = (run_lengths >= stale_days) & ~run_starts & positive
+    return masks
+
+
+# Prices are read as floats, which skips the Decimal conversion of every row
+POINTS_SQL = """
+SELECT id, %(date)s, %(price)s, price_type FROM %(data)s
+WHERE benchmark_id = %%s AND price_type NOT IN ('FIL', 'INS')%(where)s
+ORDER BY %(date)s%(order)s
+"""
+
+
+def load_points(benchmark_id, since=None, lookback=0):
+    """
+    Return the (id, date, price, price_type) rows to scan, in date order: all
+    of them, or the rows from since on and the lookback rows before it
+    """
+    qn = connection.ops.quote_name
+    tables = {'data': qn(BenchmarkData._meta.db_table), 'date': qn('date'), 'price': float_sql('price', connection)}
+    cursor = connection.cursor()
+    if since == None:
+        cursor.execute(POINTS_SQL % dict(tables, where='', order=''), [benchmark_id])
+        return cursor.fetchall()
+    cursor.execute(POINTS_SQL % dict(tables, where=' AND %s < %%s' % tables['date'], order=' DESC LIMIT %s' % int(lookback)),
+                   [benchmark_id, since])
+    earlier = cursor.fetchall()[::-1]
+    cursor.execute(POINTS_SQL % dict(tables, where=' AND %s >= %%s' % tables['date'], order=''), [benchmark_id, since])
+    return earlier + cursor.fetchall()
+
+
+def scan_benchmark(benchmark, since=None, flag=True, incremental=False, **options):
+    """
+    Scan the prices of one benchmark (the points from since on, if given) and
+    return a Finding per suspicious point. With incremental and no since, the
+    scan starts after the benchmark's watermark. With flag, the quoted points
+    found are marked as requiring inspection and the watermark moves to the
+    last point scanned.
+    """
+    options = dict(DEFAULT_OPTIONS, **options)
+    if benchmark.benchmark_type == "R":
+        return []
+    if incremental and since == None and benchmark.inspected_until != None:
+        since = benchmark.inspected_until + timedelta(days=1)
+
+    lookback = max(options['window'], options['stale_days']) + 1
+    rows = load_points(benchmark.pk, since, lookback)
+    if not rows:
+        return []
+
+    masks = scan_prices([row[2] for row in rows], **options)
+    suspicious = np.zeros(len(rows), dtype=bool)
+    for mask in masks.values():
+        suspicious |= mask
+
+    findings = []
+    flagged_ids = []
+    for index in np.nonzero(suspicious)[0].tolist():
+        data_id, point_date, price, price_type = rows[index]
+        if since != None and point_date < since:
+            continue
+        reasons = tuple(reason for reason in REASONS if masks[reason][index])
+        findings.append(Finding(benchmark.pk, benchmark.symbol, data_id, point_date, price, reasons))
+        if price_type == 'QUO':
+            flagged_ids.append(data_id)
+
+    if flag and flagged_ids:
+        for i in range(0, len(flagged_ids), 500):
+            BenchmarkData.objects.filter(id__in=flagged_ids[i:i + 500]).update(price_type='INS')
+        benchmark.data_changed()
+    if flag and rows[-1][1] != benchmark.inspected_until:
+        benchmark.inspected_until = rows[-1][1]
+        Benchmark.objects.filter(pk=benchmark.pk).update(inspected_until=benchmark.inspected_until)
+    return findings
+
+
+def scan_benchmarks(benchmarks=None, since=None, flag=True, incremental=False, **options):
+    """
+    Scan every active benchmark (or the given ones) and return all findings,
+    ordered by symbol and date.
+    """
+    if benchmarks == None:
+        benchmarks = Benchmark.objects.active().exclude(benchmark_type="R").only(
+            'id', 'symbol', 'benchmark_type', 'inspected_until').order_by('symbol')
+    findings = []
+    for benchmark in benchmarks:
+        findings.extend(scan_benchmark(benchmark, since=since, flag=flag, incremental=incremental, **options))
+    return findings
+
+
+def summarize(findings):
+    """
+    Return {symbol: {reason: count}} for a list of findings
+    """
+    summary = {}
+    for finding in findings:
+        counts = summary.setdefault(finding.symbol, dict((reason, 0) for reason in REASONS))
+        for reason in finding.reasons:
+            counts[reason] += 1
+    return summary
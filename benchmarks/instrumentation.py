@@ -0,0 +1,261 @@
+"""
+Opt-in timing and query instrumentation for the model hot paths.
+
+Methods decorated with @instrumented record their wall time, the number of
+queries they issue and the number of rows they fetch (including nested calls),
+and hand the record to every registered sink. While no sink is registered the
+decorator only checks an empty list before calling through, and the database
+connections are only wrapped while a measurement is open.
+
+Usage:
+    with profiling() as sink:
+        benchmark.save()
+    for name, stats in sink.report():
+        ...
+
+Sinks are callables taking a MethodCall. MemorySink aggregates them,
+LoggingSink logs them and SignalSink sends the method_profiled signal.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from django.dispatch import Signal
+
+
+MethodCall = namedtuple('MethodCall', ['name', 'seconds', 'queries', 'rows'])
+
+method_profiled = Signal(providing_args=['call'])
+
+_sinks = []
+_local = threading.local()
+
+
+def _frames():
+    """
+    The counters of the measurements open in this thread, innermost last
+    """
+    try:
+        return _local.frames
+    except AttributeError:
+        _local.frames = []
+        return _local.frames
+
+
+def _count(queries=0, rows=0):
+    for frame in _frames():
+        frame[0] += queries
+        frame[1] += rows
+
+
+class CountingCursorWrapper(CursorWrapper):
+    """
+    Counts the rows fetched, and unless the connection counts them with an
+    execute wrapper the queries executed, for the open measurements
+    """
+    counts_queries = True
+
+    def execute(self, sql, params=None):
+        if self.counts_queries:
+            _count(queries=1)
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        if self.counts_queries:
+            _count(queries=1)
+        return self.cursor.executemany(sql, param_list)
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            _count(rows=1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        _count(rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        _count(rows=len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            _count(rows=1)
+            yield row
+
+
+def _count_query(execute, sql, params, many, context):
+    _count(queries=1)
+    return execute(sql, params, many, context)
+
+
+def _install_cursor_wrapper(connection):
+    """
+    Count on connection until the matching _remove_cursor_wrapper. Queries
+    are counted by an execute wrapper where Django has them (2.0 on), and
+    rows by wrapping the cursors. Counting blocks nest, so only the outermost
+    one changes the connection.
+    """
+    connection._counting_depth = getattr(connection, '_counting_depth', 0) + 1
+    if connection._counting_depth > 1:
+        return
+    make_cursor = connection.cursor
+    counts_queries = not hasattr(connection, 'execute_wrappers')
+
+    def cursor():
+        wrapper = CountingCursorWrapper(make_cursor(), connection)
+        wrapper.counts_queries = counts_queries
+        return wrapper
+
+    connection._uncounted_cursor = connection.__dict__.get('cursor')
+    connection.cursor = cursor
+    if not counts_queries:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _remove_cursor_wrapper(connection):
+    connection._counting_depth -= 1
+    if connection._counting_depth:
+        return
+    if connection._uncounted_cursor is not None:
+        connection.cursor = connection._uncounted_cursor
+    else:
+        del connection.cursor  # Back to the method of the connection class
+    del connection._uncounted_cursor
+    if _count_query in getattr(connection, 'execute_wrappers', []):
+        connection.execute_wrappers.remove(_count_query)
+
+
+@contextmanager
+def counting():
+    """
+    Count the queries and rows of a block in this thread, whether or not a
+    sink is registered. Yields the [queries, rows] counters. The connections
+    are only wrapped for the duration of the block.
+    """
+    frames = _frames()
+    frame = [0, 0]
+    wrapped = []
+    try:
+        for connection in connections.all():
+            _install_cursor_wrapper(connection)
+            wrapped.append(connection)
+        frames.append(frame)
+        try:
+            yield frame
+        finally:
+            frames.pop()  # Measurements nest, so this is always the innermost
+    finally:
+        for connection in wrapped:
+            _remove_cursor_wrapper(connection)
+
+
+@contextmanager
+def measure(name):
+    """
+    Measure a block of code and report it to the sinks as name
+    """
+    if not _sinks:
+        yield
+        return
+
+    start = time.time()
+    try:
+        with counting() as frame:
+            yield
+    finally:
+        call = MethodCall(name, time.time() - start, frame[0], frame[1])
+        for sink in list(_sinks):
+            sink(call)
+
+
+def instrumented(name):
+    """
+    Decorator measuring every call of a function as name
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return func(*args, **kwargs)
+            with measure(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+@contextmanager
+def profiling(sink=None):
+    """
+    Register a sink (a new MemorySink by default) for the duration of the block
+    """
+    sink = sink if sink is not None else MemorySink()
+    add_sink(sink)
+    try:
+        yield sink
+    finally:
+        remove_sink(sink)
+
+
+class MemorySink(object):
+    """
+    Aggregates calls per method name
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def __call__(self, call):
+        with self.lock:
+            stats = self.stats.setdefault(call.name, {'calls': 0, 'seconds': 0.0, 'queries': 0, 'rows': 0})
+            stats['calls'] += 1
+            stats['seconds'] += call.seconds
+            stats['queries'] += call.queries
+            stats['rows'] += call.rows
+
+    def report(self):
+        """
+        Return (name, stats) pairs, the most expensive first
+        """
+        return sorted(self.stats.items(), key=lambda item: item[1]['seconds'], reverse=True)
+
+
+class LoggingSink(object):
+    """
+    Logs every call at DEBUG level
+    """
+
+    def __init__(self, logger='benchmarks.instrumentation', level=logging.DEBUG):
+        self.logger = logger if hasattr(logger, 'log') else logging.getLogger(logger)
+        self.level = level
+
+    def __call__(self, call):
+        self.logger.log(self.level, "%s took %.1fms, %s queries, %s rows",
+                        call.name, call.seconds * 1000, call.queries, call.rows)
+
+
+class SignalSink(object):
+    """
+    Sends the method_profiled signal for every call
+    """
+
+    def __call__(self, call):
+        method_profiled.send(sender=self.__class__, call=call)
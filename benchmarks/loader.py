@@ -0,0 +1,209 @@
+"""
+Concurrent loading of many benchmark series.
+
+load_dataframes() runs generate_dataframe() for many benchmarks, each with its
+own arguments (date range, freq, ...), on a bounded pool of threads, and
+returns the dataframes in request order. load_series() does the same with
+Benchmark.series().
+
+Django opens one database connection per thread: each worker uses its own,
+and closes it when it has no more work, so no connection outlives a load.
+While one worker waits on the database, the others convert their rows, so
+when the round trips dominate the wall time of a report approaches that of
+its slowest loads. The Python side of each load still holds the GIL.
+
+The workers only see committed data. On an in-memory SQLite database, which
+the connections of other threads do not share, the loads run one after the
+other in the calling thread.
+
+load_dataframes_async() starts a load in the background and returns at once
+a BackgroundLoad, whose get() blocks until the results are in (or raises the
+error of the load), with an optional callback run with the results.
+
+Settings:
+    BENCHMARK_LOADER_WORKERS = 8  # optional, see benchmarks.settings
+
+Usage:
+    frames = load_dataframes([(benchmark, {'start_date': date(2015, 1, 1), 'freq': 'M'})
+                              for benchmark in benchmarks])
+"""
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+from Queue import Empty, Queue
+
+from django.conf import settings
+from django.db import connections
+
+import benchmarks.settings as benchmarksettings
+from benchmarks.routers import read_database
+
+
+def loader_workers(workers=None):
+    if workers == None:
+        workers = getattr(settings, 'BENCHMARK_LOADER_WORKERS', benchmarksettings.BENCHMARK_LOADER_WORKERS)
+    return max(int(workers), 1)
+
+
+def thread_local_database(using=None):
+    """
+    True if the databases of an analytics read cannot be read from other
+    threads (in-memory SQLite)
+    """
+    for alias in set([read_database(using), 'default']):
+        connection = connections[alias]
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db(connection.settings_dict['NAME']):
+            return True
+    return False
+
+
+def run_concurrently(tasks, workers=None):
+    """
+    Run (func, args, kwargs) tasks on up to workers threads and return their
+    results in task order. Each worker closes its database connections when
+    it is done. After an error no new task is started, and the error of the
+    first failed task is raised.
+    """
+    tasks = list(tasks)
+    workers = min(loader_workers(workers), len(tasks))
+    if workers <= 1:
+        return [func(*args, **kwargs) for func, args, kwargs in tasks]
+
+    queue = Queue()
+    for index, task in enumerate(tasks):
+        queue.put((index, task))
+    results = [None] * len(tasks)
+    errors = []
+
+    def work(worker):
+        try:
+            while not errors:
+                try:
+                    index, (func, args, kwargs) = queue.get_nowait()
+                except Empty:
+                    return
+                try:
+                    results[index] = func(*args, **kwargs)
+                except Exception:
+                    errors.append((index, sys.exc_info()))
+        finally:
+            connections.close_all()
+
+    pool = ThreadPool(workers)
+    try:
+        pool.map(work, range(workers))
+    finally:
+        pool.close()
+        pool.join()
+    if errors:
+        index, (error_type, error, traceback) = min(errors)
+        raise error_type, error, traceback
+    return results
+
+
+def _tasks(func, requests, using=None):
+    tasks = []
+    for request in requests:
+        benchmark, options = request if isinstance(request, tuple) else (request, {})
+        options = dict(options)
+        if using != None:
+            options.setdefault('using', using)
+        tasks.append((func, (benchmark,), options))
+    return tasks
+
+
+def _generate_dataframe(benchmark, **options):
+    return benchmark.generate_dataframe(**options)
+
+
+def _series(benchmark, **options):
+    return benchmark.series(**options)
+
+
+def load_dataframes(requests, workers=None, using=None):
+    """
+    Return the generate_dataframe() results of requests, in order. Each
+    request is a benchmark, or a (benchmark, options) pair where options are
+    the keyword arguments of generate_dataframe().
+    """
+    if thread_local_database(using):
+        workers = 1
+    return run_concurrently(_tasks(_generate_dataframe, requests, using), workers)
+
+
+def load_series(requests, workers=None, using=None):
+    """
+    Return the Benchmark.series() results of requests, in order, like
+    load_dataframes()
+    """
+    if thread_local_database(using):
+        workers = 1
+    return run_concurrently(_tasks(_series, requests, using), workers)
+
+
+class BackgroundLoad(object):
+    """
+    A load running in a background thread. The callback runs with the results
+    before the load is done, so that wait() and get() return after it; an
+    error of the callback is the error of the load. The background thread
+    closes its database connections before the load is done.
+    """
+
+    def __init__(self, func, args=(), kwargs=None, callback=None, background=True):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._callback = callback
+        self._done = threading.Event()
+        self._results = None
+        self._exc_info = None
+        self._background = background
+        if background:
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+        else:
+            self._run()
+
+    def _run(self):
+        try:
+            self._results = self._func(*self._args, **self._kwargs)
+            if self._callback != None:
+                self._callback(self._results)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        finally:
+            try:
+                if self._background:
+                    # A load with a single worker runs its queries in this thread
+                    connections.close_all()
+            finally:
+                self._done.set()
+
+    def ready(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Wait until the load is done, or timeout seconds. Returns True if it is done.
+        """
+        return self._done.wait(timeout)
+
+    def get(self, timeout=None):
+        """
+        Return the results, or raise the error of the load
+        """
+        if not self._done.wait(timeout):
+            raise threading.ThreadError("The load is still running")
+        if self._exc_info != None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._results
+
+
+def load_dataframes_async(requests, workers=None, using=None, callback=None):
+    """
+    Start load_dataframes() in the background and return its BackgroundLoad.
+    On an in-memory SQLite database the load is done before returning.
+    """
+    return BackgroundLoad(load_dataframes, (list(requests),), {'workers': workers, 'using': using},
+                          callback=callback, background=not thread_local_database(using))
@@ -0,0 +1,65 @@
+"""
+Per-benchmark write locks.
+
+Saving a BenchmarkData point reads the other points of its month (to set the
+is_monthly flag) and the previous point (to chain change and growth of 10K).
+Two writers working on the same benchmark at once can therefore corrupt each
+other's statistics. Every such writer takes the benchmark lock first.
+"""
+from contextlib import contextmanager
+
+from django.db import connections, router, transaction, IntegrityError
+from django.db.transaction import TransactionManagementError
+from django.utils import timezone
+
+# First key of the two-key PostgreSQL advisory lock, so that benchmark locks
+# do not collide with advisory locks taken by other apps.
+ADVISORY_LOCK_NAMESPACE = 7301
+
+
+def acquire_benchmark_lock(benchmark_id, using=None):
+    """
+    Take the write lock for a benchmark until the end of the current
+    transaction. Must be called inside transaction.atomic().
+
+    On PostgreSQL this is a transaction-level advisory lock. On other databases
+    the BenchmarkLock row of the benchmark is updated, which holds a row lock
+    (or, on SQLite, the database write lock) until the transaction ends.
+    """
+    from benchmarks.models import BenchmarkLock
+
+    if using is None:
+        using = router.db_for_write(BenchmarkLock)
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        raise TransactionManagementError("The benchmark lock must be acquired inside an atomic block")
+
+    if connection.vendor == 'postgresql':
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [ADVISORY_LOCK_NAMESPACE, benchmark_id])
+        return
+
+    now = timezone.now()
+    locks = BenchmarkLock.objects.using(using).filter(benchmark_id=benchmark_id)
+    if locks.update(locked_at=now) == 0:
+        # First writer for this benchmark, create the lock row
+        try:
+            with transaction.atomic(using=using):
+                BenchmarkLock.objects.using(using).create(benchmark_id=benchmark_id, locked_at=now)
+        except IntegrityError:
+            # Another writer created it in the meantime
+            locks.update(locked_at=now)
+
+
+@contextmanager
+def benchmark_lock(benchmark_id, using=None):
+    """
+    Open a transaction holding the write lock for a benchmark.
+
+    Usage:
+        with benchmark_lock(benchmark.pk):
+            ...
+    """
+    with transaction.atomic(using=using):
+        acquire_benchmark_lock(benchmark_id, using=using)
+        yield
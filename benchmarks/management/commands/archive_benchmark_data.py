@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+from benchmarks.management.commands.audit_benchmark_gaps import parse_date_option
+
+
+class Command(BaseCommand):
+    help = "Moves the data points of closed years into the compressed archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Archive only these benchmarks")
+        parser.add_argument('--before', help="Archive the years before the year of this date (YYYY-MM-DD), "
+                                             "BENCHMARK_VALUE_DATA_START_DATE by default")
+
+    def handle(self, *args, **options):
+        from benchmarks.archive import archive_benchmark
+
+        benchmarks = Benchmark.objects.all()
+        if options['symbols']:
+            benchmarks = benchmarks.filter(symbol__in=options['symbols'])
+            if benchmarks.count() != len(set(options['symbols'])):
+                raise CommandError("Unknown benchmark in %s" % ', '.join(options['symbols']))
+        before = parse_date_option(options['before']) if options['before'] else None
+
+        start = time.time()
+        total = 0
+        for benchmark in benchmarks.order_by('symbol'):
+            archived = archive_benchmark(benchmark, before=before)
+            if archived:
+                self.stdout.write("%-20s %8s points archived" % (benchmark.symbol, archived))
+            total += archived
+        self.stdout.write("Archived %s points in %.1fs" % (total, time.time() - start))
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+
+
+def parse_date_option(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError("Invalid date %s, use YYYY-MM-DD" % value)
+
+
+class Command(BaseCommand):
+    help = "Reports the missing and unexpected value dates of every active benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Audit only these benchmarks")
+        parser.add_argument('--start', help="First date to audit (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last date to audit (YYYY-MM-DD), three days ago by default")
+        parser.add_argument('--gaps-only', action='store_true', help="Only list benchmarks with gaps")
+        parser.add_argument('--details', action='store_true', help="List every gap")
+
+    def handle(self, *args, **options):
+        from benchmarks.audit import audit_gaps
+
+        benchmark_ids = None
+        if options['symbols']:
+            benchmark_ids = list(Benchmark.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+            if len(benchmark_ids) != len(set(options['symbols'])):
+                raise CommandError("Unknown benchmark in %s" % ', '.join(options['symbols']))
+
+        start_date = parse_date_option(options['start']) if options['start'] else None
+        end_date = parse_date_option(options['end']) if options['end'] else None
+        summaries = audit_gaps(start_date, end_date, benchmark_ids=benchmark_ids)
+
+        self.stdout.write("%-20s %10s %10s %7s %5s %7s %7s %10s" % (
+            'Symbol', 'First', 'Last good', 'Points', 'Gaps', 'Missing', 'Longest', 'Unexpected'))
+        with_gaps = 0
+        for summary in summaries:
+            if summary.gap_count:
+                with_gaps += 1
+            elif options['gaps_only']:
+                continue
+            self.stdout.write("%-20s %10s %10s %7s %5s %7s %7s %10s" % (
+                summary.symbol, summary.first_date or '-', summary.last_good_date or '-', summary.points,
+                summary.gap_count, summary.missing, summary.longest_gap, summary.unexpected))
+            if options['details']:
+                for gap in summary.gaps:
+                    self.stdout.write("    %s missing between %s and %s" % (gap.missing, gap.after, gap.before))
+        self.stdout.write("%s of %s benchmarks have gaps" % (with_gaps, len(summaries)))
@@ -0,0 +1,34 @@
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+
+
+class Command(BaseCommand):
+    help = "Seeds the growth of 10K of the first data point of each benchmark and rechains its whole history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Backfill only these benchmarks")
+        parser.add_argument('--seed', default='10000', help="Growth of 10K of the first data point (default 10000)")
+
+    def handle(self, *args, **options):
+        from benchmarks.growth import backfill_growth_of_10k
+
+        benchmarks = Benchmark.objects.all()
+        if options['symbols']:
+            benchmarks = benchmarks.filter(symbol__in=options['symbols'])
+            if benchmarks.count() != len(set(options['symbols'])):
+                raise CommandError("Unknown benchmark in %s" % ', '.join(options['symbols']))
+        try:
+            seed = Decimal(options['seed'])
+        except InvalidOperation:
+            raise CommandError("Invalid seed %s" % options['seed'])
+
+        start = time.time()
+        updated = backfill_growth_of_10k(benchmarks, seed=seed)
+        for symbol, count in sorted(updated.items()):
+            if count:
+                self.stdout.write("%-20s %8s points updated" % (symbol, count))
+        self.stdout.write("Updated %s points in %.1fs" % (sum(updated.values()), time.time() - start))
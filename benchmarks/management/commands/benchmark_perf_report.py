@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks.models import Benchmark
+
+
+def format_seconds(value):
+    return '%.3f' % value if value != None else '-'
+
+
+class Command(BaseCommand):
+    help = "Reports the timings of the recent refresh runs and the slowest benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=30, help="Number of recent runs (default 30)")
+        parser.add_argument('--kind', help="Only runs of this kind (refresh, rebuild)")
+        parser.add_argument('--top', type=int, default=20, help="Number of slowest benchmarks (default 20)")
+
+    def handle(self, *args, **options):
+        from benchmarks.telemetry import load_timings, percentiles, recent_runs, run_summaries, slowest_benchmarks
+
+        runs = recent_runs(options['kind'], options['runs'])
+        if not runs:
+            self.stdout.write("No refresh runs recorded")
+            return
+
+        self.stdout.write("%-19s %-8s %6s %6s %9s %8s %8s %8s %9s %11s" % (
+            'Started', 'Kind', 'Count', 'Failed', 'Total s', 'p50 s', 'p95 s', 'Max s', 'Queries', 'Rows'))
+        for summary in run_summaries(runs):
+            run = summary['run']
+            self.stdout.write("%-19s %-8s %6s %6s %9s %8s %8s %8s %9s %11s" % (
+                run.started_at.strftime('%Y-%m-%d %H:%M:%S'), run.kind, run.benchmarks, run.failures,
+                format_seconds(run.seconds), format_seconds(summary['p50']), format_seconds(summary['p95']),
+                format_seconds(summary['max']), summary['queries'], summary['rows']))
+
+        p50, p95 = percentiles(load_timings(runs)[2])
+        self.stdout.write("\nAll %s runs: p50 %ss, p95 %ss per benchmark" % (len(runs), format_seconds(p50),
+                                                                             format_seconds(p95)))
+
+        slowest = slowest_benchmarks(runs, options['top'])
+        symbols = dict(Benchmark.objects.filter(pk__in=[result['benchmark_id'] for result in slowest]).values_list(
+            'pk', 'symbol'))
+        self.stdout.write("\nSlowest %s benchmarks by median time" % len(slowest))
+        self.stdout.write("%-20s %5s %9s %9s %8s %10s %6s %8s" % (
+            'Symbol', 'Runs', 'Median s', 'Latest s', 'Queries', 'Rows', 'Failed', 'Trend'))
+        for result in slowest:
+            self.stdout.write("%-20s %5s %9s %9s %8d %10d %6s %8s" % (
+                symbols.get(result['benchmark_id'], result['benchmark_id']), result['runs'],
+                format_seconds(result['median']), format_seconds(result['latest']), result['queries'],
+                result['rows'], result['failures'],
+                '%+.0f%%' % result['trend'] if result['trend'] != None else '-'))
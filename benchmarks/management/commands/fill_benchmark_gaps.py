@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+from benchmarks.management.commands.audit_benchmark_gaps import parse_date_option
+
+
+class Command(BaseCommand):
+    help = "Inserts forward-filled data points for the missing trading days of the active benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Fill only these benchmarks")
+        parser.add_argument('--start', help="First date to fill (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last date to fill (YYYY-MM-DD), three days ago by default")
+
+    def handle(self, *args, **options):
+        from benchmarks.filling import fill_missing_days
+
+        benchmark_ids = None
+        if options['symbols']:
+            benchmark_ids = list(Benchmark.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+            if len(benchmark_ids) != len(set(options['symbols'])):
+                raise CommandError("Unknown benchmark in %s" % ', '.join(options['symbols']))
+
+        start_date = parse_date_option(options['start']) if options['start'] else None
+        end_date = parse_date_option(options['end']) if options['end'] else None
+        filled = fill_missing_days(start_date, end_date, benchmark_ids=benchmark_ids)
+
+        symbols = dict(Benchmark.objects.filter(pk__in=list(filled)).values_list('id', 'symbol'))
+        for benchmark_id, rows in sorted(filled.items(), key=lambda item: symbols[item[0]]):
+            self.stdout.write("%-20s %6s rows filled" % (symbols[benchmark_id], rows))
+        self.stdout.write("Filled %s rows in %s benchmarks" % (sum(filled.values()), len(filled)))
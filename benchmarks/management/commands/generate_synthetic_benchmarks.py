@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from countries.models import Country
+
+
+class Command(BaseCommand):
+    help = "Creates synthetic benchmarks with daily price histories for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmarks', type=int, default=10, help="Number of benchmarks to create")
+        parser.add_argument('--years', type=float, default=20, help="Years of daily data per benchmark")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed, for deterministic runs")
+        parser.add_argument('--rate-fraction', type=float, default=0.1, help="Share of rate-type benchmarks")
+        parser.add_argument('--gap-probability', type=float, default=0.2, help="Share of benchmarks with gaps")
+        parser.add_argument('--outlier-probability', type=float, default=0.1, help="Share of benchmarks with outliers")
+        parser.add_argument('--country', help="ISO alpha-2 code of the country whose holidays are skipped")
+        parser.add_argument('--groups', type=int, default=3, help="Number of benchmark groups")
+        parser.add_argument('--prefix', default='SYN', help="Prefix of the benchmark names and symbols")
+        parser.add_argument('--first-number', type=int, default=0, help="Number of the first benchmark")
+
+    def handle(self, *args, **options):
+        from benchmarks.synthetic import generate_synthetic_benchmarks
+
+        country = None
+        if options['country']:
+            try:
+                country = Country.objects.get(symbol_alpha2_code=options['country'].upper())
+            except Country.DoesNotExist:
+                raise CommandError("Unknown country %s" % options['country'])
+
+        start = time.time()
+        benchmarks, rows = generate_synthetic_benchmarks(options['benchmarks'], years=options['years'],
+                                                         seed=options['seed'],
+                                                         rate_fraction=options['rate_fraction'],
+                                                         gap_probability=options['gap_probability'],
+                                                         outlier_probability=options['outlier_probability'],
+                                                         country=country, prefix=options['prefix'],
+                                                         first_number=options['first_number'],
+                                                         group_count=options['groups'])
+        elapsed = time.time() - start
+        self.stdout.write("Created %s benchmarks with %s data points in %.1fs (%.0f rows/s)" % (
+            len(benchmarks), rows, elapsed, rows / elapsed if elapsed else 0))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+
+
+class Command(BaseCommand):
+    help = "Refreshes a benchmark and prints the time, queries and rows of each model method"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbol', help="Symbol of the benchmark")
+        parser.add_argument('--rebuild', action='store_true', help="Also rebuild the data point statistics")
+        parser.add_argument('--dataframe', action='store_true', help="Also generate the filled dataframe")
+
+    def handle(self, *args, **options):
+        from benchmarks.instrumentation import profiling
+
+        try:
+            benchmark = Benchmark.objects.get(symbol=options['symbol'])
+        except Benchmark.DoesNotExist:
+            raise CommandError("Unknown benchmark %s" % options['symbol'])
+
+        with profiling() as sink:
+            if options['rebuild']:
+                benchmark.rebuild_statistics()
+            benchmark.save()
+            if options['dataframe']:
+                benchmark.generate_dataframe()
+
+        self.stdout.write("%-40s %6s %10s %10s %8s %10s" % ('Method', 'Calls', 'Total ms', 'Mean ms', 'Queries', 'Rows'))
+        for name, stats in sink.report():
+            self.stdout.write("%-40s %6s %10.1f %10.1f %8s %10s" % (
+                name, stats['calls'], stats['seconds'] * 1000, stats['seconds'] * 1000 / stats['calls'],
+                stats['queries'], stats['rows']))
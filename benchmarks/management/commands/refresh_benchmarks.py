@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+
+
+class Command(BaseCommand):
+    help = "Refreshes the cached data of every active benchmark, recording the refresh telemetry"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Refresh only these benchmarks")
+        parser.add_argument('--rebuild', action='store_true', help="Also rebuild the data point statistics")
+        parser.add_argument('--all', action='store_true', help="Include the inactive benchmarks")
+        parser.add_argument('--skip-groups', action='store_true',
+                            help="Do not recompute the group statistics after a full refresh")
+
+    def handle(self, *args, **options):
+        from benchmarks.snapshots import snapshot_batch
+        from benchmarks.telemetry import refresh_run
+
+        benchmarks = Benchmark.objects.all() if options['all'] else Benchmark.objects.active()
+        if options['symbols']:
+            benchmarks = Benchmark.objects.filter(symbol__in=options['symbols'])
+            if benchmarks.count() != len(set(options['symbols'])):
+                raise CommandError("Unknown benchmark in %s" % ', '.join(options['symbols']))
+
+        start = time.time()
+        with snapshot_batch(), refresh_run('rebuild' if options['rebuild'] else 'refresh') as run:
+            for benchmark in benchmarks.order_by('symbol'):
+                try:
+                    with run.record(benchmark) as timing:
+                        if options['rebuild']:
+                            timing.points = benchmark.rebuild_statistics()
+                        benchmark.save()
+                except Exception as error:
+                    # One bad benchmark does not stop the nightly run; the error is in the telemetry
+                    self.stderr.write("%s failed: %s" % (benchmark.symbol, error))
+        self.stdout.write("Refreshed %s benchmarks (%s failed) in %.1fs" % (
+            run.run.benchmarks, run.run.failures, time.time() - start))
+
+        # The group rankings and composites read the cached data of every active benchmark
+        if not options['symbols'] and not options['skip_groups']:
+            from benchmarks.groups import refresh_group_statistics
+
+            start = time.time()
+            ranked = refresh_group_statistics()
+            self.stdout.write("Ranked %s benchmarks in %.1fs" % (ranked, time.time() - start))
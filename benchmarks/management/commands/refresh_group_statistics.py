@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.management.commands.audit_benchmark_gaps import parse_date_option
+
+
+class Command(BaseCommand):
+    help = "Recomputes the member rankings, averages and composite series of every benchmark group"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First date of the composite series (YYYY-MM-DD), "
+                                            "BENCHMARK_VALUE_DATA_START_DATE by default")
+
+    def handle(self, *args, **options):
+        from benchmarks.groups import refresh_group_statistics
+
+        start_date = parse_date_option(options['start']) if options['start'] else None
+        start = time.time()
+        ranked = refresh_group_statistics(start_date=start_date)
+        self.stdout.write("Ranked %s benchmarks in %.1fs" % (ranked, time.time() - start))
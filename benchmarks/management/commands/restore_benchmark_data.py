@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+
+
+class Command(BaseCommand):
+    help = "Moves archived data points back into the BenchmarkData table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Restore only these benchmarks")
+        parser.add_argument('--year', type=int, action='append', dest='years', help="Restore only this year (repeatable)")
+
+    def handle(self, *args, **options):
+        from benchmarks.archive import restore_benchmark
+
+        benchmarks = Benchmark.objects.filter(archived_until__isnull=False)
+        if options['symbols']:
+            benchmarks = benchmarks.filter(symbol__in=options['symbols'])
+            if Benchmark.objects.filter(symbol__in=options['symbols']).count() != len(set(options['symbols'])):
+                raise CommandError("Unknown benchmark in %s" % ', '.join(options['symbols']))
+
+        start = time.time()
+        total = 0
+        for benchmark in benchmarks.order_by('symbol'):
+            restored = restore_benchmark(benchmark, years=options['years'])
+            if restored:
+                self.stdout.write("%-20s %8s points restored" % (benchmark.symbol, restored))
+            total += restored
+        self.stdout.write("Restored %s points in %.1fs" % (total, time.time() - start))
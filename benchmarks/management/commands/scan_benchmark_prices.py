@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.models import Benchmark
+from benchmarks.management.commands.audit_benchmark_gaps import parse_date_option
+
+
+class Command(BaseCommand):
+    help = "Flags spikes, stale prices, reverted jumps and non-positive prices for inspection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help="Scan only these benchmarks")
+        parser.add_argument('--since', help="Only scan the points from this date (YYYY-MM-DD)")
+        parser.add_argument('--days', type=int, help="Only scan the points of the last DAYS days")
+        parser.add_argument('--incremental', action='store_true',
+                            help="Only scan the points after the last flagging scan of each benchmark")
+        parser.add_argument('--dry-run', action='store_true', help="Report without flagging")
+        parser.add_argument('--details', action='store_true', help="List every suspicious point")
+        parser.add_argument('--window', type=int, default=60, help="Points in the z-score window")
+        parser.add_argument('--z-threshold', type=float, default=6.0, help="Z-score of a spike")
+        parser.add_argument('--stale-days', type=int, default=5, help="Repeated prices that make a stale run")
+        parser.add_argument('--jump', type=float, default=0.05, help="Smallest reverted move, as a fraction")
+
+    def handle(self, *args, **options):
+        from benchmarks.inspection import REASONS, scan_benchmarks, summarize
+
+        benchmarks = None
+        if options['symbols']:
+            benchmarks = list(Benchmark.objects.filter(symbol__in=options['symbols']).only(
+                'id', 'symbol', 'benchmark_type', 'inspected_until'))
+            if len(benchmarks) != len(set(options['symbols'])):
+                raise CommandError("Unknown benchmark in %s" % ', '.join(options['symbols']))
+
+        since = None
+        if options['since']:
+            since = parse_date_option(options['since'])
+        elif options['days']:
+            since = date.today() - timedelta(days=options['days'])
+
+        findings = scan_benchmarks(benchmarks, since=since, flag=not options['dry_run'],
+                                   incremental=options['incremental'],
+                                   window=options['window'], z_threshold=options['z_threshold'],
+                                   stale_days=options['stale_days'], jump=options['jump'])
+
+        self.stdout.write("%-20s %s" % ('Symbol', ' '.join('%11s' % reason for reason in REASONS)))
+        for symbol, counts in sorted(summarize(findings).items()):
+            self.stdout.write("%-20s %s" % (symbol, ' '.join('%11s' % counts[reason] for reason in REASONS)))
+        if options['details']:
+            for finding in findings:
+                self.stdout.write("%-20s %s %12s %s" % (finding.symbol, finding.date, finding.price,
+                                                       ', '.join(finding.reasons)))
+        self.stdout.write("%s suspicious points%s" % (len(findings), " (not flagged)" if options['dry_run'] else ""))
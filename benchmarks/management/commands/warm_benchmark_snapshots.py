@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.models import Benchmark
+
+
+class Command(BaseCommand):
+    help = "Writes the summary card documents of every active benchmark to the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Include the inactive benchmarks")
+
+    def handle(self, *args, **options):
+        from benchmarks.snapshots import rebuild_snapshots
+
+        benchmarks = Benchmark.objects.all() if options['all'] else Benchmark.objects.active()
+        start = time.time()
+        written = rebuild_snapshots(benchmarks)
+        self.stdout.write("Wrote %s snapshots in %.1fs" % (written, time.time() - start))
@@ -0,0 +1,171 @@
+"""
+QuerySets with named field profiles for the benchmark models.
+
+Benchmark and BenchmarkData rows carry many cached Decimal columns that most
+readers never look at. Each profile loads only the columns needed for one kind
+of read, eg.:
+
+    Benchmark.objects.active().listing()
+    BenchmarkData.objects.filter(benchmark=benchmark).prices_only()
+"""
+from django.db import connections, models
+from django.db.models import Case, Value, When
+
+
+# The predicate of the partial month-end index per database (see migration
+# 0006_data_access_indexes), with the flag as a literal: SQLite only uses a
+# partial index when the query repeats its predicate, not with a bound value
+MONTH_END_PREDICATES = {
+    'sqlite': '%s = 1',
+    'postgresql': '%s = true',
+}
+
+# Decimal columns are read as floats with CAST, except on MySQL, which cannot
+# CAST to a floating point type before 8.0.17; adding a float literal converts
+FLOAT_SQL = {
+    'mysql': '(%s + 0E0)',
+}
+DEFAULT_FLOAT_SQL = 'CAST(%s AS DOUBLE PRECISION)'
+
+
+def float_sql(column, connection):
+    """
+    SQL reading column as a float on connection
+    """
+    return FLOAT_SQL.get(connection.vendor, DEFAULT_FLOAT_SQL) % column
+
+
+def update_rows(queryset, values, fields, batch_size=None):
+    """
+    Write different values to many rows of a queryset with one UPDATE per
+    batch of rows, instead of one per row. values maps the id of each row to
+    the tuple of its new values of fields, which are set with CASE WHEN id.
+    
+    Returns the number of rows updated.
+    """
+    if batch_size == None:
+        # Each row takes two parameters per field and one for the id, within SQLite's 999
+        batch_size = max(990 // (2 * len(fields) + 1), 1)
+    opts = queryset.model._meta
+    rows = sorted(values.items())
+    updated = 0
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        updated += queryset.filter(id__in=[pk for pk, row in batch]).update(**dict(
+            (name, Case(*[When(id=pk, then=Value(row[index])) for pk, row in batch],
+                        output_field=opts.get_field(name)))
+            for index, name in enumerate(fields)))
+    return updated
+
+
+class BenchmarkQuerySet(models.QuerySet):
+    """
+    QuerySet for Benchmark
+    """
+
+    # Enough to list, link and sort benchmarks
+    LISTING_FIELDS = ('id', 'group', 'name', 'slug', 'symbol', 'currency',
+                      'benchmark_state', 'benchmark_type', 'benchmark_asset_class',
+                      'latest_date', 'latest_price', 'latest_change', 'ytd_return', 'archived_until',
+                      'refreshed_at', 'data_version', 'data_modified_at')
+
+    def active(self):
+        return self.filter(benchmark_state="AC")
+
+    def listing(self):
+        return self.only(*self.LISTING_FIELDS)
+
+
+class BenchmarkDataQuerySet(models.QuerySet):
+    """
+    QuerySet for BenchmarkData
+    """
+
+    PRICES_ONLY_FIELDS = ('id', 'benchmark', 'date', 'price')
+
+    LISTING_FIELDS = PRICES_ONLY_FIELDS + ('price_type', 'change')
+
+    # The point-in-time statistics of a data point
+    SNAPSHOT_FIELDS = LISTING_FIELDS + ('is_monthly', 'growth_of_10_k', 'change_52_week')
+
+    def prices_only(self):
+        return self.only(*self.PRICES_ONLY_FIELDS)
+
+    def listing(self):
+        return self.only(*self.LISTING_FIELDS)
+
+    def snapshot(self):
+        return self.only(*self.SNAPSHOT_FIELDS)
+
+    def month_ends(self):
+        """
+        The is_monthly points, filtered so that the partial month-end index is used
+        """
+        connection = connections[self.db]
+        if connection.vendor not in MONTH_END_PREDICATES:
+            return self.filter(is_monthly=True)
+        qn = connection.ops.quote_name
+        column = '%s.%s' % (qn(self.model._meta.db_table), qn('is_monthly'))
+        return self.extra(where=[MONTH_END_PREDICATES[connection.vendor] % column])
+
+    def price_points(self):
+        """
+        Return (date, price) tuples ordered by date, without building model instances.
+        """
+        return self.order_by('date').values_list('date', 'price')
+
+    def period_ends(self, freq):
+        """
+        Return the last point of each week (W, weeks starting on Monday),
+        month (M), quarter (Q) or year (A) among the points of one benchmark.
+
+        Month ends are the is_monthly points, plus the last point in case the
+        points end within a month. Quarter and year ends are the last of those
+        in each period, grouped in the database. Week ends are grouped in the
+        database on PostgreSQL, SQLite and MySQL; on other databases every
+        point is returned, and BenchmarkSeries.period_end() does the grouping.
+        """
+        if freq not in ('W', 'M', 'Q', 'A'):
+            raise ValueError("Unknown frequency %s, use W, M, Q or A" % freq)
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+
+        points = self
+        if freq != 'W':
+            # Compiled for this queryset's database, not the default one as sql_with_params() would
+            inner_query = self.order_by().values_list('date', flat=True).query
+            inner_sql, params = inner_query.get_compiler(using=self.db).as_sql()
+            points = self.extra(where=['(%s.%s = %%s OR %s.%s IN (SELECT MAX(p.%s) FROM (%s) p))' % (
+                table, qn('is_monthly'), table, qn('date'), qn('date'), inner_sql)], params=[True] + list(params))
+            if freq == 'M':
+                return points
+
+        key = self._period_key_sql(freq, 'p.%s' % qn('date'), connection)
+        if key is None:
+            return points
+        inner_query = points.order_by().values_list('date', flat=True).query
+        inner_sql, params = inner_query.get_compiler(using=self.db).as_sql()
+        return points.extra(where=['%s.%s IN (SELECT MAX(p.%s) FROM (%s) p GROUP BY %s)' % (
+            table, qn('date'), qn('date'), inner_sql, key)], params=params)
+
+    @staticmethod
+    def _period_key_sql(freq, column, connection):
+        """
+        SQL identifying the period of column, or None if the database has no
+        portable way to compute it
+        """
+        if freq == 'W':
+            if connection.vendor == 'postgresql':
+                return "date_trunc('week', %s)" % column
+            if connection.vendor == 'sqlite':
+                return "date(%s, 'weekday 0', '-6 days')" % column
+            if connection.vendor == 'mysql':
+                return "YEARWEEK(%s, 3)" % column
+            return None
+        year = connection.ops.date_extract_sql('year', column)
+        if freq == 'A':
+            return year
+        month = connection.ops.date_extract_sql('month', column)
+        return '%s * 10 + CASE WHEN %s <= 3 THEN 1 WHEN %s <= 6 THEN 2 WHEN %s <= 9 THEN 3 ELSE 4 END' % (
+            year, month, month, month)
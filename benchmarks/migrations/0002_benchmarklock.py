@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BenchmarkLock',
+            fields=[
+                ('benchmark', models.OneToOneField(related_name='lock', primary_key=True, serialize=False, to='benchmarks.Benchmark')),
+                ('locked_at', models.DateTimeField(null=True, editable=False, blank=True)),
+            ],
+            options={
+                'verbose_name': 'Benchmark Lock',
+                'verbose_name_plural': 'Benchmark Locks',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0002_benchmarklock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BenchmarkArchive',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('year', models.IntegerField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('points', models.IntegerField()),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'ordering': ['benchmark', 'year'],
+                'verbose_name': 'Benchmark Archive',
+                'verbose_name_plural': 'Benchmark Archives',
+            },
+        ),
+        migrations.AddField(
+            model_name='benchmark',
+            name='archived_until',
+            field=models.DateField(help_text=b'Last date of the archived history', null=True, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkarchive',
+            name='benchmark',
+            field=models.ForeignKey(related_name='archives', to='benchmarks.Benchmark'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='benchmarkarchive',
+            unique_together=set([('benchmark', 'year')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0003_benchmarkarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='benchmark',
+            name='refreshed_at',
+            field=models.DateTimeField(help_text=b'When the cached data was last generated', null=True, editable=False, blank=True),
+        ),
+    ]
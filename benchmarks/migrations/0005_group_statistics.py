@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0004_benchmark_refreshed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BenchmarkGroupComposite',
+            fields=[
+                ('group', models.OneToOneField(related_name='composite', primary_key=True, serialize=False, to='benchmarks.BenchmarkGroup')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('points', models.IntegerField()),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'verbose_name': 'Benchmark Group Composite',
+                'verbose_name_plural': 'Benchmark Group Composites',
+            },
+        ),
+        migrations.CreateModel(
+            name='BenchmarkRanking',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('ytd_return', models.DecimalField(null=True, max_digits=20, decimal_places=2, blank=True)),
+                ('ytd_return_rank', models.IntegerField(null=True, blank=True)),
+                ('ytd_return_percentile', models.FloatField(null=True, blank=True)),
+                ('change_52_week', models.DecimalField(null=True, max_digits=20, decimal_places=2, blank=True)),
+                ('change_52_week_rank', models.IntegerField(null=True, blank=True)),
+                ('change_52_week_percentile', models.FloatField(null=True, blank=True)),
+                ('volatility', models.FloatField(help_text=b'Annualized volatility of the daily returns of the last 52 weeks', null=True, blank=True)),
+                ('volatility_rank', models.IntegerField(null=True, blank=True)),
+                ('volatility_percentile', models.FloatField(null=True, blank=True)),
+                ('benchmark', models.OneToOneField(related_name='ranking', to='benchmarks.Benchmark')),
+            ],
+            options={
+                'ordering': ['group', 'ytd_return_rank'],
+                'verbose_name': 'Benchmark Ranking',
+                'verbose_name_plural': 'Benchmark Rankings',
+            },
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='mean_52_week_change',
+            field=models.DecimalField(null=True, editable=False, max_digits=20, decimal_places=2, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='mean_volatility',
+            field=models.FloatField(null=True, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='mean_ytd_return',
+            field=models.DecimalField(null=True, editable=False, max_digits=20, decimal_places=2, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='median_52_week_change',
+            field=models.DecimalField(null=True, editable=False, max_digits=20, decimal_places=2, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='median_volatility',
+            field=models.FloatField(null=True, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='median_ytd_return',
+            field=models.DecimalField(null=True, editable=False, max_digits=20, decimal_places=2, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='num_ranked',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='benchmarkgroup',
+            name='statistics_date',
+            field=models.DateField(null=True, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmarkranking',
+            name='group',
+            field=models.ForeignKey(related_name='rankings', to='benchmarks.BenchmarkGroup'),
+        ),
+        migrations.AlterIndexTogether(
+            name='benchmarkranking',
+            index_together=set([('group', 'ytd_return_rank')]),
+        ),
+    ]
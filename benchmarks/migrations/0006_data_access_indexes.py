@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Serves latest() (forward scan) and the series reads (backward scan) of a
+# benchmark from the index alone
+DATE_PRICE_INDEX = 'benchmarks_benchmarkdata_benchmark_date_desc_price'
+
+# The month-end points of a benchmark, see BenchmarkDataQuerySet.month_ends()
+MONTH_END_INDEX = 'benchmarks_benchmarkdata_month_ends'
+
+MONTH_END_PREDICATES = {
+    'sqlite': '"is_monthly" = 1',
+    'postgresql': '"is_monthly" = true',
+}
+
+
+def create_indexes(apps, schema_editor):
+    BenchmarkData = apps.get_model('benchmarks', 'BenchmarkData')
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    table = qn(BenchmarkData._meta.db_table)
+    schema_editor.execute('CREATE INDEX %s ON %s (%s, %s DESC, %s)' % (
+        qn(DATE_PRICE_INDEX), table, qn('benchmark_id'), qn('date'), qn('price')))
+    if connection.vendor in MONTH_END_PREDICATES:
+        schema_editor.execute('CREATE INDEX %s ON %s (%s, %s) WHERE %s' % (
+            qn(MONTH_END_INDEX), table, qn('benchmark_id'), qn('date'), MONTH_END_PREDICATES[connection.vendor]))
+    else:
+        # No partial indexes: the flag leads the date instead
+        schema_editor.execute('CREATE INDEX %s ON %s (%s, %s, %s)' % (
+            qn(MONTH_END_INDEX), table, qn('benchmark_id'), qn('is_monthly'), qn('date')))
+
+
+def drop_indexes(apps, schema_editor):
+    BenchmarkData = apps.get_model('benchmarks', 'BenchmarkData')
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    for name in (MONTH_END_INDEX, DATE_PRICE_INDEX):
+        if connection.vendor == 'mysql':
+            schema_editor.execute('DROP INDEX %s ON %s' % (qn(name), qn(BenchmarkData._meta.db_table)))
+        else:
+            schema_editor.execute('DROP INDEX %s' % qn(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0005_group_statistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
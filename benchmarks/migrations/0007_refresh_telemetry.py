@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0006_data_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BenchmarkRefreshRun',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('kind', models.CharField(max_length=20)),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('seconds', models.FloatField(null=True, blank=True)),
+                ('benchmarks', models.IntegerField(default=0)),
+                ('failures', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'verbose_name': 'Benchmark Refresh Run',
+                'verbose_name_plural': 'Benchmark Refresh Runs',
+            },
+        ),
+        migrations.CreateModel(
+            name='BenchmarkRefreshTiming',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('seconds', models.FloatField()),
+                ('queries', models.IntegerField()),
+                ('rows', models.IntegerField(help_text=b'Rows fetched')),
+                ('points', models.IntegerField(help_text=b'Data points updated', null=True, blank=True)),
+                ('outcome', models.CharField(default=b'OK', max_length=2, choices=[('OK', 'Succeeded'), ('ER', 'Failed')])),
+                ('error', models.CharField(max_length=255, blank=True)),
+                ('benchmark', models.ForeignKey(related_name='refresh_timings', to='benchmarks.Benchmark')),
+                ('run', models.ForeignKey(related_name='timings', to='benchmarks.BenchmarkRefreshRun')),
+            ],
+            options={
+                'verbose_name': 'Benchmark Refresh Timing',
+                'verbose_name_plural': 'Benchmark Refresh Timings',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='benchmarkrefreshtiming',
+            index_together=set([('benchmark', 'run')]),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0007_refresh_telemetry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BenchmarkRevision',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('date', models.DateField()),
+                ('previous_price', models.DecimalField(max_digits=20, decimal_places=2)),
+                ('price', models.DecimalField(null=True, max_digits=20, decimal_places=2, blank=True)),
+                ('valid_from', models.DateTimeField()),
+                ('benchmark', models.ForeignKey(related_name='revisions', to='benchmarks.Benchmark')),
+            ],
+            options={
+                'ordering': ['valid_from'],
+                'verbose_name': 'Benchmark Revision',
+                'verbose_name_plural': 'Benchmark Revisions',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='benchmarkrevision',
+            index_together=set([('benchmark', 'valid_from')]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0008_benchmarkrevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='benchmark',
+            name='data_modified_at',
+            field=models.DateTimeField(help_text=b'When the price data was last written', null=True, editable=False, blank=True),
+        ),
+        migrations.AddField(
+            model_name='benchmark',
+            name='data_version',
+            field=models.IntegerField(default=0, help_text=b'Incremented by every write of the price data', editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0009_benchmark_data_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='benchmarkrevision',
+            name='previous_price',
+            field=models.DecimalField(null=True, max_digits=20, decimal_places=2, blank=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('benchmarks', '0010_revision_insertions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='benchmark',
+            name='inspected_until',
+            field=models.DateField(help_text=b'Last date scanned by benchmarks.inspection', null=True, editable=False, blank=True),
+        ),
+    ]
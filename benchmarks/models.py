@@ -1,21 +1,24 @@
-from django.db import models
-from django.db.models import Avg, Max, Min, Count, Sum, StdDev
+from django.db import models, router, transaction
+from django.db.models import Avg, Max, Min, Count, Sum, F
 
 # Import django models
 from forex.models import Currency
 from countries.models import Country
-from holidays.models import Holiday
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.text import slugify
 
 # Import misc models
-import numpy as np
 import calendar as cal
+import math
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from pandas import DataFrame, Series, date_range
 
 # Import Settings
 import benchmarks.settings as benchmarksettings
+from benchmarks.instrumentation import instrumented
+from benchmarks.locks import acquire_benchmark_lock, benchmark_lock
+from benchmarks.managers import BenchmarkQuerySet, BenchmarkDataQuerySet, update_rows
 
 
 class BenchmarkGroup(models.Model):
@@ -31,6 +34,16 @@ class BenchmarkGroup(models.Model):
     # Cached data
     num_benchmarks = models.IntegerField(default=0)
     
+    # Group statistics, see benchmarks.groups
+    statistics_date = models.DateField(null=True, blank=True, editable=False)
+    num_ranked = models.IntegerField(default=0, editable=False)
+    median_ytd_return = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
+    mean_ytd_return = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
+    median_52_week_change = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
+    mean_52_week_change = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
+    median_volatility = models.FloatField(null=True, blank=True, editable=False)
+    mean_volatility = models.FloatField(null=True, blank=True, editable=False)
+    
     class Meta:
         verbose_name_plural = 'Benchmark Groups'
         verbose_name = 'Benchmark Group'
@@ -49,6 +62,14 @@ class BenchmarkGroup(models.Model):
         self.slug=slugify(self.name)        
         
         super(BenchmarkGroup, self).save(*args, **kwargs) # Call the "real" save() method.
+    
+    def composite_series(self, start_date=None, end_date=None):
+        """
+        Return the equal-weighted composite of the group's members as a
+        BenchmarkSeries, as of the last group statistics refresh
+        """
+        from benchmarks.groups import composite_series
+        return composite_series(self, start_date, end_date)
 
 
 
@@ -102,6 +123,11 @@ class Benchmark(models.Model):
     
     # Misc
     full_start_date = models.DateField(blank=True, null=True, editable=False)
+    archived_until = models.DateField(blank=True, null=True, editable=False, help_text="Last date of the archived history")
+    refreshed_at = models.DateTimeField(blank=True, null=True, editable=False, help_text="When the cached data was last generated")
+    data_version = models.IntegerField(default=0, editable=False, help_text="Incremented by every write of the price data")
+    data_modified_at = models.DateTimeField(blank=True, null=True, editable=False, help_text="When the price data was last written")
+    inspected_until = models.DateField(blank=True, null=True, editable=False, help_text="Last date scanned by benchmarks.inspection")
     num_components = models.IntegerField(null=True, blank=True)
     
     # Latest Data
@@ -132,6 +158,7 @@ class Benchmark(models.Model):
     month_02_prior = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     month_01_prior = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     
+    objects = BenchmarkQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = 'Benchmarks'
@@ -157,6 +184,32 @@ class Benchmark(models.Model):
             return benchmarksettings.BENCHMARK_VALUE_DATA_START_DATE  
     
     
+    def data_changed(self, using=None):
+        """
+        Record a write of the price data of this benchmark: increments
+        data_version, which keys the in-process series caches and the ETag of
+        the series views, sets data_modified_at and drops the benchmark's
+        snapshot document
+        """
+        self.data_modified_at = timezone.now()
+        benchmarks = Benchmark.objects.db_manager(using).filter(pk=self.pk)
+        benchmarks.update(data_version=F('data_version') + 1, data_modified_at=self.data_modified_at)
+        # Read back, since other writers may have incremented it too
+        self.data_version = benchmarks.values_list('data_version', flat=True)[0]
+        
+        # The cached summary card holds the old data version
+        from benchmarks.snapshots import benchmark_data_changed
+        benchmark_data_changed(self)
+    
+    
+    def reads_archive(self, start_date=None):
+        """
+        Returns True if a read from start_date on reaches into the archived history
+        """
+        return self.archived_until != None and (start_date == None or start_date <= self.archived_until)
+    
+    
+    @instrumented('Benchmark.find_missing_values')
     def find_missing_values(self, direction=0, return_data=True, verbose=True):
         """
         This is a helper method that searches the benchmark value data and tries to find missing
@@ -168,150 +221,99 @@ class Benchmark(models.Model):
         If direction ==1, find all value dates that SHOULD NOT be in the db but are.
         eg. a weekend that is in our db
         
-        This is inefficient but works for now.
-        
-        There is an equivalent function for stocks.
+        See benchmarks.analytics.find_missing_values
         """
-        
-        start_date = self.effective_series_start_date()
-        end_date = date.today() - timedelta(days=3)
-        
-        # Get benchmark dates from database
-        value_points_db = BenchmarkData.objects.filter(benchmark=self, 
-                                                date__gte=start_date).values_list('date', flat=True)
-        
-        # Get required dates (exclude weekends)
-        required_dates = date_range(start_date, end_date, freq="B")
-        required_dates_list = required_dates.tolist()
-        required_dates_list_asdates = [i.date() for i in required_dates_list]
-        
-        # Remove holidays
-        if self.associated_country != None:
-            holidays = Holiday.objects.filter(country=self.associated_country,
-                                              date__gte=start_date,
-                                              date__lte=end_date).values_list('date', flat=True)
-            for holiday in holidays:
-                if holiday in required_dates_list_asdates:
-                    required_dates_list_asdates.remove(holiday)
-        
-        assert direction in [0,1]
-        
-        
-        missing_values = []
-        # Find missing values
-        if direction == 0:
-            for required_value in required_dates_list_asdates:
-                if required_value not in value_points_db:
-                    missing_values.append(required_value)
-                    
-            print "Missing %s value points" % (str(len(missing_values)))
-        
-        if direction == 1:
-            for value in value_points_db:
-                if value not in required_dates_list_asdates:
-                    missing_values.append(value)
-                    
-            print "Unrequired %s value  points" % (str(len(missing_values)))
-
-        if verbose == True:
-            new_list = []
-            for i in missing_values:
-                new_list.append((i, "      " + str(i.strftime("%A"))))
-            missing_values = new_list
-            
-        if return_data == True:
-            missing_values.sort()
-            return missing_values    
+        from benchmarks.analytics import find_missing_values
+        return find_missing_values(self, direction=direction, return_data=return_data, verbose=verbose)
     
-    def generate_dataframe(self, start_date=None, end_date=None, with_change=False, fill=True):
+    @instrumented('Benchmark.generate_dataframe')
+    def generate_dataframe(self, start_date=None, end_date=None, with_change=False, fill=True, freq=None, using=None,
+                           as_of=None):
         """
         Generate a Pandas dataframe using Benchmark data
-        """
-        
-        benchmark_symbol = self.symbol
-        
-        # Set start and end dates if unspecified
-        if start_date == None:
-            start_date = self.effective_series_start_date()
-        if end_date == None:
-            end_date = date.today()
-        start_date_with_timelag = start_date - timedelta(days=90)
-        
-        # Get Benchmark Data
-        benchmark_data = BenchmarkData.objects.filter(benchmark=self, 
-                                            date__gte=start_date_with_timelag, 
-                                            date__lte=end_date).values_list('date', 'price')        
         
-        # Get earliest and latest actual data dates
-        try:
-            latest_actual_date = benchmark_data.reverse()[0][0]
-            earliest_actual_date = benchmark_data[0][0]
-        except:
-            latest_actual_date = end_date   
-            earliest_actual_date = start_date
-            
-        # Create dataframe
-        price_column_name = "PRICE:" + benchmark_symbol
-        if benchmark_data.count() > 5:  # Otherwise we get lower bound errors
-            # Generate numpy array form queryset data
-            benchmark_data_array = np.core.records.fromrecords(benchmark_data, names=['DATE', price_column_name])
-            df = DataFrame.from_records(benchmark_data_array, index='DATE')
-            end_date = df.index[-1]  # Set end date from today to the actual last recorded date           
-        else:
-            # If there is no data, generate an empty queryset
-            benchmark_data_array = np.core.records.fromrecords([(date(1900,1,1) ,0)], names=['DATE', price_column_name])            
-            df = DataFrame.from_records(benchmark_data_array, index='DATE')
-            return df        
-        
-        # Convert to float
-        df = df.astype(float)
-        
-        # Reindex dataframe to create a datapoint for each day
-        if fill == True:
-            if len(benchmark_data_array) > 1:  # Use >1 and not >0, since we may have single junk data
-                date_index = date_range(start_date_with_timelag, end_date)
-                df = df.reindex(date_index)
-            else:
-                date_index = []
-                df = df.reindex(date_index)
-                return df
-                
-            # Forward Fill
-            df[price_column_name] = df[price_column_name].fillna(method="pad")
-            
-            # Reindex to required range
-            date_index = date_range(max(earliest_actual_date,start_date), end_date)
-            df = df.reindex(date_index)
-        else:
-            date_index = [i[0] for i in benchmark_data if i[0] >= max(earliest_actual_date,start_date) and i[0] <=end_date]
-            df = df.reindex(date_index)
-        
-        if with_change == True:
-            df["CHANGE"] = df["PRICE:"+self.symbol].pct_change()          
+        See benchmarks.analytics.generate_dataframe
+        """
+        from benchmarks.analytics import generate_dataframe
+        return generate_dataframe(self, start_date=start_date, end_date=end_date, with_change=with_change, fill=fill,
+                                  freq=freq, using=using, as_of=as_of)
         
-        return df
+    def compare_portfolios(self, portfolio_returns, windows=None, annualization=None, using=None):
+        """
+        Measure portfolios against this benchmark (tracking error, beta, alpha,
+        information ratio, capture ratios)
         
+        See benchmarks.relative.compare_portfolios
+        """
+        from benchmarks.relative import compare_portfolios, DEFAULT_WINDOWS
+        return compare_portfolios(portfolio_returns, self, windows=windows or DEFAULT_WINDOWS,
+                                  annualization=annualization, using=using)
+
+    def rolling(self, metric, window, step=1, start_date=None, end_date=None, using=None):
+        """
+        Return a rolling return, volatility or drawdown series of this
+        benchmark, eg. benchmark.rolling('volatility', '1Y', step=5)
+
+        See benchmarks.rolling.rolling
+        """
+        from benchmarks.rolling import rolling
+        return rolling(self, metric, window, step=step, start_date=start_date, end_date=end_date, using=using)
+
+    def growth_series(self, start_date, end_date=None, amount=10000, using=None):
+        """
+        Return the growth of amount invested at start_date as a BenchmarkSeries
+
+        See benchmarks.growth.growth_matrix
+        """
+        import numpy as np
+        from benchmarks.growth import growth_matrix
+        from benchmarks.series import BenchmarkSeries
+        dates, values = growth_matrix([self], start_date, end_date, amount=amount, using=using)
+        valid = ~np.isnan(values[:, 0])
+        return BenchmarkSeries(dates[valid], values[valid, 0], symbol=self.symbol)
+
+    @instrumented('Benchmark.generate_cached_data')
     def generate_cached_data(self):
         """
         Generate data for the Twelve month price movement and latest benchmark price data...
         """
+        self.refreshed_at = timezone.now()
+        
+        # The data version is only written by data_changed(), the inspection watermark by
+        # benchmarks.inspection and the archive date by benchmarks.archive, keep the stored ones
+        if self.pk != None:
+            stored = Benchmark.objects.filter(pk=self.pk).values_list('data_version', 'data_modified_at',
+                                                                      'inspected_until', 'archived_until').first()
+            if stored != None:
+                self.data_version, self.data_modified_at, self.inspected_until, self.archived_until = stored
+        
         # Calculate full start date
         try:
-            first_point = BenchmarkData.objects.filter(benchmark=self)[0]
+            first_point = BenchmarkData.objects.filter(benchmark=self).only('date')[0]
             self.full_start_date = first_point.date
         except:
             self.full_start_date = None
+        if self.archived_until != None:
+            from benchmarks.archive import archive_start_date
+            self.full_start_date = min(point_date for point_date in (archive_start_date(self), self.full_start_date)
+                                       if point_date != None)
         
         # Cache volatility, high, low, and coefficient of variation
         today = date.today()
         previous_date = today - timedelta(days=365)
         data_1_year_all = BenchmarkData.objects.filter(date__gte=previous_date, date__lte=today, benchmark=self)
-        if data_1_year_all.count() > 0:
-            self.earliest_date = BenchmarkData.objects.filter(benchmark=self).order_by('date')[0].date
-            self.latest_52_week_volatility = Decimal(str(data_1_year_all.aggregate(StdDev('price'))['price__stddev']))
-            self.latest_52_week_high= Decimal(str(data_1_year_all.aggregate(Max('price'))['price__max']))
-            self.latest_52_week_low = Decimal(str(data_1_year_all.aggregate(Min('price'))['price__min']))
-            average_price = Decimal(str(data_1_year_all.aggregate(Avg('price'))['price__avg']))
+        # One pass over the year. The (population) standard deviation is derived from the
+        # sum of squares, since not every backend has a STDDEV aggregate (eg. SQLite).
+        data_1_year_stats = data_1_year_all.aggregate(count=Count('price'), high=Max('price'), low=Min('price'),
+                                                      average=Avg('price'), sum_squares=Sum(F('price') * F('price')))
+        if data_1_year_stats['count'] > 0:
+            self.earliest_date = self.full_start_date
+            mean = float(data_1_year_stats['average'])
+            variance = max(float(data_1_year_stats['sum_squares']) / data_1_year_stats['count'] - mean ** 2, 0.0)
+            self.latest_52_week_volatility = Decimal(str(math.sqrt(variance)))
+            self.latest_52_week_high= Decimal(str(data_1_year_stats['high']))
+            self.latest_52_week_low = Decimal(str(data_1_year_stats['low']))
+            average_price = Decimal(str(data_1_year_stats['average']))
             if self.latest_52_week_volatility != None and average_price != None and average_price != 0:
                 self.latest_52_week_cov = self.latest_52_week_volatility / average_price
             else:
@@ -339,41 +341,40 @@ class Benchmark(models.Model):
         
         # Generate Data
         prior_date = date(today.year -1 , today.month, 1)
-        prices = BenchmarkData.objects.filter(benchmark=self, date__gte=prior_date, date__lt=today, is_monthly=True)
-        for price in prices:
-            price_date = price.date
+        prices = BenchmarkData.objects.filter(benchmark=self, date__gte=prior_date, date__lt=today).month_ends().price_points()
+        for price_date, price_value in prices:
             #print price_date
             month_span = ( (today.month + 12) - price_date.month ) % 12
             #print month_span
             if date(price_date.year, price_date.month, 1) != date(today.year, today.month, 1):
                 if month_span == 1:
-                    self.month_01_prior = price.price
+                    self.month_01_prior = price_value
                 if month_span == 2:
-                    self.month_02_prior = price.price
+                    self.month_02_prior = price_value
                 if month_span == 3:
-                    self.month_03_prior = price.price
+                    self.month_03_prior = price_value
                 if month_span == 4:
-                    self.month_04_prior = price.price
+                    self.month_04_prior = price_value
                 if month_span == 5:
-                    self.month_05_prior = price.price
+                    self.month_05_prior = price_value
                 if month_span == 6:
-                    self.month_06_prior = price.price
+                    self.month_06_prior = price_value
                 if month_span == 7:
-                    self.month_07_prior = price.price
+                    self.month_07_prior = price_value
                 if month_span == 8:
-                    self.month_08_prior = price.price
+                    self.month_08_prior = price_value
                 if month_span == 9:
-                    self.month_09_prior = price.price
+                    self.month_09_prior = price_value
                 if month_span == 10:
-                    self.month_10_prior = price.price
+                    self.month_10_prior = price_value
                 if month_span == 11:
-                    self.month_11_prior = price.price
+                    self.month_11_prior = price_value
                 if month_span == 12:
-                    self.month_12_prior = price.price
+                    self.month_12_prior = price_value
         
         # Now cache some other data
         try:
-            latest_price = BenchmarkData.objects.filter(benchmark=self).latest()
+            latest_price = BenchmarkData.objects.filter(benchmark=self).snapshot().latest()
             #print "Benchmark data found.... Caching it..."
             self.latest_date = latest_price.date
             self.latest_price = latest_price.price
@@ -387,29 +388,207 @@ class Benchmark(models.Model):
             self.latest_52_week_change = None
         
         try:
-            last_price_last_year = BenchmarkData.objects.filter(benchmark=self, date__year=date.today().year - 1).latest()
-            current_price = BenchmarkData.objects.filter(benchmark=self).latest()
-            self.ytd_return = ( (current_price.price / last_price_last_year.price ) - 1) * 100
+            last_price_last_year = BenchmarkData.objects.filter(benchmark=self, date__year=date.today().year - 1).prices_only().latest()
+            self.ytd_return = ( (latest_price.price / last_price_last_year.price ) - 1) * 100
         #except BenchmarkData.DoesNotExist: 
         except:
             self.ytd_return = None
     
     
-    def calculate_return(self, start_date, end_date):
+    def read_querysets(self, start_date=None, end_date=None, using=None):
         """
-        Calculate the return of this benchmark between two dates
+        Return the BenchmarkData querysets of an analytics read between two dates
+        (inclusive), one per database the read is split across, oldest first.
+        
+        See benchmarks.routers.read_plan
         """
-        df = self.generate_dataframe()
-        try:
-            start_value = df.ix[start_date]["PRICE:"+self.symbol]
-            end_value = df.ix[end_date]["PRICE:"+self.symbol]
-            output = ((end_value / start_value) - 1.0) * 100.0
-        except:
-            output = None
+        from benchmarks.routers import read_plan
+        
+        querysets = []
+        for alias, part_start_date, part_end_date in read_plan(start_date, end_date, using,
+                                                               modified_at=self.data_modified_at):
+            benchmark_data = BenchmarkData.objects.using(alias).filter(benchmark=self)
+            if part_start_date != None:
+                benchmark_data = benchmark_data.filter(date__gte=part_start_date)
+            if part_end_date != None:
+                benchmark_data = benchmark_data.filter(date__lte=part_end_date)
+            querysets.append(benchmark_data)
+        return querysets
+    
+    @instrumented('Benchmark.series')
+    def series(self, start_date=None, end_date=None, using=None, as_of=None):
+        """
+        Return the price data between two dates (inclusive) as a BenchmarkSeries.
+        Either date may be None, in which case the series is unbounded on that side.
+        The data is read from using, or as routed by benchmarks.routers.
+        With as_of (a datetime or date), the data is as it was known then, see
+        benchmarks.revisions.
+        """
+        from benchmarks.series import BenchmarkSeries
+        
+        if as_of != None:
+            from benchmarks.revisions import asof_series
+            return asof_series(self, as_of, start_date, end_date, using=using)
+        
+        records = []
+        for benchmark_data in self.read_querysets(start_date, end_date, using):
+            records.extend(benchmark_data.price_points())
+        series = BenchmarkSeries.from_records(records, symbol=self.symbol)
+        if self.reads_archive(start_date):
+            from benchmarks.archive import archived_prices
+            from benchmarks.routers import read_database
+            dates, prices = archived_prices(self, start_date, end_date, using=read_database(using))
+            series = BenchmarkSeries(dates, prices, symbol=self.symbol).merge(series)
+        return series
+    
+    @instrumented('Benchmark.period_series')
+    def period_series(self, freq, start_date=None, end_date=None, using=None):
+        """
+        Return the last price of each week (W), month (M), quarter (Q) or year (A)
+        between two dates (inclusive) as a BenchmarkSeries. Only the period-end
+        points are fetched.
+        """
+        from benchmarks.series import BenchmarkSeries
+        
+        # A read split across databases ends a period early; period_end() drops that point again
+        records = []
+        for benchmark_data in self.read_querysets(start_date, end_date, using):
+            records.extend(benchmark_data.period_ends(freq).price_points())
+        series = BenchmarkSeries.from_records(records, symbol=self.symbol)
+        if self.reads_archive(start_date):
+            from benchmarks.archive import archived_prices
+            from benchmarks.routers import read_database
+            dates, prices = archived_prices(self, start_date, end_date, using=read_database(using))
+            series = BenchmarkSeries(dates, prices, symbol=self.symbol).period_end(freq).merge(series)
+        return series.period_end(freq)
+    
+    @instrumented('Benchmark.calculate_return')
+    def calculate_return(self, start_date, end_date, series=None, using=None):
+        """
+        Calculate the return of this benchmark between two dates (dates,
+        datetimes or YYYY-MM-DD strings).
+        
+        The price on each date is the last price at or before it, as in the
+        forward-filled generate_dataframe(), so a weekend or holiday takes the
+        price of the trading day before. Returns None if either date is not a
+        date, is outside the data, or the start price is zero. An already
+        loaded BenchmarkSeries can be passed to avoid hitting the database.
+        """
+        dates = []
+        for value in (start_date, end_date):
+            if isinstance(value, datetime):
+                value = value.date()
+            elif not isinstance(value, date):
+                try:
+                    value = parse_date(value)
+                except (TypeError, ValueError):
+                    value = None
+            if value == None:
+                return None
+            dates.append(value)
+        start_date, end_date = dates
+        
+        if series == None:
+            # Look back far enough to find a price for the start date. The series runs past
+            # end_date, so that an end_date on a weekend or in a gap is still within the data
+            series = self.series(start_date - timedelta(days=90), using=using)
+        return series.return_between(start_date, end_date)
+        
+        
+    @instrumented('Benchmark.rebuild_statistics')
+    def rebuild_statistics(self, seed=None):
+        """
+        Recompute the is_monthly flag, change, 52 week change and growth of 10K of every
+        data point of this benchmark in one pass, as BenchmarkData.save() would have if the
+        points had been saved one by one in date order. Only the points whose values change
+        are written, with one UPDATE per batch of points.
+        
+        The first point keeps its growth of 10K, so the chain stays null if it has none. With
+        seed (eg. 10000), a first point without one is seeded with it. A benchmark with
+        archived years chains from the last archived point instead, which is not rewritten.
+        
+        Returns the number of data points updated.
+        """
+        cents = Decimal('0.01')
+        if seed != None:
+            seed = Decimal(seed).quantize(cents)
         
-        return output
+        def quantize(value):
+            return value.quantize(cents) if value != None else None
         
+        with benchmark_lock(self.pk):
+            points = list(BenchmarkData.objects.filter(benchmark=self).order_by('date').values_list(
+                'id', 'date', 'price', 'is_monthly', 'change', 'change_52_week', 'growth_of_10_k'))
+            
+            # The archived points before the first live point are read (but not written), so that
+            # the first live points chain from them
+            if points and self.archived_until != None:
+                from benchmarks.archive import archived_points
+                points = [(None, point['date'], point['price'], point['is_monthly'], point['change'],
+                           point['change_52_week'], point['growth_of_10_k'])
+                          for point in archived_points(self, points[0][1] - timedelta(weeks=53), points[0][1])
+                          if point['date'] < points[0][1]] + points
+            
+            monthly_ids = []
+            not_monthly_ids = []
+            updates = {}
+            window_start = 0
+            previous_price = None
+            previous_growth = points[0][6] if points else None
+            for index, (pk, point_date, price, is_monthly, change, change_52_week, growth_of_10_k) in enumerate(points):
+                if pk == None:
+                    previous_price = price
+                    previous_growth = growth_of_10_k
+                    continue
+                
+                # Month end flag
+                is_month_end = (index == len(points) - 1 or
+                                (points[index + 1][1].year, points[index + 1][1].month) != (point_date.year, point_date.month))
+                if is_month_end and not is_monthly:
+                    monthly_ids.append(pk)
+                elif is_monthly and not is_month_end:
+                    not_monthly_ids.append(pk)
+                
+                # Daily change
+                if previous_price != None and previous_price != 0:
+                    new_change = ((price - previous_price) / previous_price) * 100
+                else:
+                    new_change = None
+                
+                # 52 Week change, from the first earlier point in the last 52 weeks
+                while points[window_start][1] < point_date - timedelta(weeks=52):
+                    window_start += 1
+                price_52_week_previous = points[window_start][2]
+                if window_start == index:
+                    new_change_52_week = None
+                elif price_52_week_previous != 0:
+                    new_change_52_week = ((price - price_52_week_previous) / price_52_week_previous) * 100
+                else:
+                    new_change_52_week = None
+                
+                # Growth of 10K, chained from the previous point. The first point keeps its value.
+                if previous_price == None:
+                    new_growth_of_10_k = growth_of_10_k if growth_of_10_k != None else seed
+                elif new_change != None and previous_growth != None:
+                    new_growth_of_10_k = quantize((1 + (new_change / 100)) * previous_growth)
+                else:
+                    new_growth_of_10_k = None
+                
+                new_values = (quantize(new_change), quantize(new_change_52_week), new_growth_of_10_k)
+                if new_values != (change, change_52_week, growth_of_10_k):
+                    updates[pk] = new_values
+                
+                previous_price = price
+                previous_growth = new_growth_of_10_k
+            
+            for ids, flag in ((not_monthly_ids, False), (monthly_ids, True)):
+                for i in range(0, len(ids), 500):
+                    BenchmarkData.objects.filter(id__in=ids[i:i + 500]).update(is_monthly=flag)
+            update_rows(BenchmarkData.objects.all(), updates, ('change', 'change_52_week', 'growth_of_10_k'))
         
+        return len(set(updates) | set(monthly_ids) | set(not_monthly_ids))
+    
+    @instrumented('Benchmark.save')
     def save(self, *args, **kwargs):
         """
         Caches some data
@@ -421,6 +600,10 @@ class Benchmark(models.Model):
         self.slug=slugify(self.name)        
         
         super(Benchmark, self).save(*args, **kwargs) # Call the "real" save() method.
+        
+        # Write the summary card document to the cache
+        from benchmarks.snapshots import benchmark_saved
+        benchmark_saved(self)
 
 
 class BenchmarkData(models.Model):
@@ -469,24 +652,68 @@ class BenchmarkData(models.Model):
     high_52_week = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     low_52_week = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True, editable=False)
     
+    objects = BenchmarkDataQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = 'Benchmark Data'
         verbose_name = 'Benchmark Data'
         ordering = ['date']
+        # Migration 0006_data_access_indexes adds a covering (benchmark, date DESC, price)
+        # index and a partial index of the month-end points
         unique_together = ("benchmark", "date")
         get_latest_by = "date"
 
     def __unicode__(self):
         return u'%s %s' % (unicode(self.benchmark.name), unicode(self.date),)
     
-    def daily_percentage_change(self):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(BenchmarkData, cls).from_db(db, field_names, values)
+        # The stored price, so that a correction can be logged without reading it again
+        if 'price' in field_names:
+            instance._stored_price = instance.price
+        return instance
+    
+    def price_revision(self, new_price, using=None):
+        """
+        The BenchmarkRevision logging the change of the stored price of this
+        point to new_price (None if the point is deleted), or its insertion if
+        no row is stored for it yet, or None if the price is unchanged. The
+        stored price is read from using when the point was not loaded from the
+        database, eg. a new instance given the id of an existing row. See
+        benchmarks.revisions.
+        """
+        if self.benchmark.benchmark_type == "R":
+            return None
+        if '_stored_price' in self.__dict__:
+            stored = [self._stored_price]
+        elif self.pk == None:
+            stored = []
+        else:
+            stored = list(BenchmarkData.objects.using(using).filter(pk=self.pk).values_list('price', flat=True))
+        if new_price != None:
+            new_price = self._meta.get_field('price').to_python(new_price)
+        if not stored:
+            if new_price == None:
+                return None
+            return BenchmarkRevision(benchmark_id=self.benchmark_id, date=self.date, previous_price=None,
+                                     price=new_price, valid_from=timezone.now())
+        stored_price = stored[0]
+        if new_price == stored_price:
+            return None
+        return BenchmarkRevision(benchmark_id=self.benchmark_id, date=self.date, previous_price=stored_price,
+                                 price=new_price, valid_from=timezone.now())
+    
+    @instrumented('BenchmarkData.daily_percentage_change')
+    def daily_percentage_change(self, previous_price=None):
         """
-        Computer the price change from the previous price
+        Computer the price change from the previous price.
+        The previous data point is looked up unless it is passed in.
         """
         try:
-            previous_price = BenchmarkData.objects.filter(benchmark=self.benchmark, 
-                                                          date__lt=self.date).latest()
+            if previous_price == None:
+                previous_price = BenchmarkData.objects.filter(benchmark=self.benchmark, 
+                                                              date__lt=self.date).prices_only().latest()
             latest_change = ((self.price - previous_price.price) / previous_price.price) * 100
             return latest_change
         except:
@@ -503,15 +730,17 @@ class BenchmarkData(models.Model):
         start_of_month = date(year, month, 1)
         end_of_month = date(year, month, cal.monthrange(year, month)[1])
         month_points = BenchmarkData.objects.filter(benchmark=self.benchmark, date__lte=end_of_month, date__gte=start_of_month)
-        if month_points:
-            last_point = month_points.latest()
-            if last_point.date == self.date:
-                return True
-            else:
-                return False
-        else:
+        try:
+            last_point = month_points.prices_only().latest()
+        except BenchmarkData.DoesNotExist:
             return True
+        # This point may not be saved yet, so it is the last one if nothing later exists
+        if last_point.date <= self.date:
+            return True
+        else:
+            return False
         
+    @instrumented('BenchmarkData.set_monthly')
     def set_monthly(self):
         """
         Determines whether this price data point is at the end of the month and sets
@@ -527,30 +756,35 @@ class BenchmarkData(models.Model):
         # Sets the is_monthly flag.
         if self.is_end_of_month():
             # Set is_monthly to False for all other objects for this month 
-            not_monthly = BenchmarkData.objects.filter(benchmark=self.benchmark, date__gte=start_of_month, date__lte=end_of_month, is_monthly=True).exclude(date=self.date)
+            not_monthly = BenchmarkData.objects.filter(benchmark=self.benchmark, date__gte=start_of_month, date__lte=end_of_month).month_ends().exclude(date=self.date)
             not_monthly.update(is_monthly=False)
             self.is_monthly=True
     
+    @instrumented('BenchmarkData.generate_statistics')
     def generate_statistics(self, *args, **kwargs):
         """
         Generates the statistics for this data point.
         """
+        # The previous data point, used by the daily change and the growth of 10K
+        try:
+            previous_point = BenchmarkData.objects.filter(benchmark=self.benchmark, date__lt=self.date).snapshot().latest()
+        except BenchmarkData.DoesNotExist:
+            previous_point = None
+        
         # Generate the statistics
-        self.change = self.daily_percentage_change()
+        if previous_point != None:
+            self.change = self.daily_percentage_change(previous_price=previous_point)
+        else:
+            self.change = None
         
-        # 1 Month data
-        date_1_month_previous = self.date - timedelta(days=30)
-        date_1_month_previous_data = BenchmarkData.objects.filter(benchmark=self.benchmark, date__gte=date_1_month_previous, date__lte=self.date).order_by('date')
-        if date_1_month_previous_data.count() > 0:
-            price_1_month_previous = date_1_month_previous_data[0]
-            #self.change_1_month = ((Decimal(self.price) - Decimal(price_1_month_previous.price)) / Decimal(price_1_month_previous.price)) * 100
+        # 1 Month data (not computed yet)
+        #self.change_1_month = ((Decimal(self.price) - Decimal(price_1_month_previous.price)) / Decimal(price_1_month_previous.price)) * 100
         
         # 52 Week data
         date_52_week_previous = self.date - timedelta(weeks=52)
-        date_52_week_previous_data = BenchmarkData.objects.filter(benchmark=self.benchmark, date__gte=date_52_week_previous, date__lte=self.date).order_by('date')
-        if date_52_week_previous_data.count() > 0:
+        price_52_week_previous = BenchmarkData.objects.filter(benchmark=self.benchmark, date__gte=date_52_week_previous, date__lte=self.date).order_by('date').prices_only().first()
+        if price_52_week_previous != None:
             # 52 Week change
-            price_52_week_previous = date_52_week_previous_data[0]
             if price_52_week_previous.price != 0:
                 try:
                     self.change_52_week = ((Decimal(self.price) - Decimal(price_52_week_previous.price)) / Decimal(price_52_week_previous.price)) * 100
@@ -563,13 +797,9 @@ class BenchmarkData(models.Model):
             self.change_52_week = None
         
         # Growth of 10K
-        try:
-            previous_point = BenchmarkData.objects.filter(benchmark=self.benchmark, date__lt=self.date).latest()
-            if self.change != None and previous_point.growth_of_10_k != None:
-                self.growth_of_10_k = (1 + (self.change / 100) ) * previous_point.growth_of_10_k
-            else:
-                self.growth_of_10_k = None
-        except BenchmarkData.DoesNotExist:
+        if previous_point != None and self.change != None and previous_point.growth_of_10_k != None:
+            self.growth_of_10_k = (1 + (self.change / 100) ) * previous_point.growth_of_10_k
+        else:
             self.growth_of_10_k = None
     
     def simple_save(self, *args, **kwargs):
@@ -578,6 +808,7 @@ class BenchmarkData(models.Model):
         """
         super(BenchmarkData, self).save(*args, **kwargs) # Call the "real" save() method.
     
+    @instrumented('BenchmarkData.save')
     def save(self, *args, **kwargs):
         """
         Overrides the save method. 
@@ -593,6 +824,199 @@ class BenchmarkData(models.Model):
             if self.rate != None:
                 raise AssertionError("Rate must be NOT specified for a Non-Rate-Type Benchmark")
         
-        self.set_monthly()
-        self.generate_statistics()
-        super(BenchmarkData, self).save(*args, **kwargs) # Call the "real" save() method.
+        # The month-end flag and the chained statistics are read-modify-write
+        # on the neighbouring rows, so they are computed under the benchmark
+        # lock and committed together with the row itself, on the database
+        # the row is written to.
+        using = kwargs.get('using') or router.db_for_write(BenchmarkData, instance=self)
+        with transaction.atomic(using=using):
+            acquire_benchmark_lock(self.benchmark_id, using=using)
+            self.set_monthly()
+            self.generate_statistics()
+            adding = self._state.adding
+            revision = self.price_revision(self.price, using=using)
+            super(BenchmarkData, self).save(*args, **kwargs) # Call the "real" save() method.
+            if revision != None:
+                revision.save(using=using)
+            if adding or revision != None:
+                self.benchmark.data_changed(using=using)
+            self._stored_price = self.price
+    
+    def delete(self, *args, **kwargs):
+        """
+        Deletes the point, logging its price in the revision log
+        """
+        using = kwargs.get('using') or router.db_for_write(BenchmarkData, instance=self)
+        with transaction.atomic(using=using):
+            revision = self.price_revision(None, using=using)
+            super(BenchmarkData, self).delete(*args, **kwargs)
+            if revision != None:
+                revision.save(using=using)
+            self.benchmark.data_changed(using=using)
+
+
+class BenchmarkLock(models.Model):
+    """
+    A lock row for a benchmark. Writers that touch the month-end flags or the
+    chained statistics of a benchmark update this row first, which serializes
+    them on databases without advisory locks (eg. SQLite).
+    """
+
+    benchmark = models.OneToOneField(Benchmark, primary_key=True, related_name='lock')
+    locked_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'Benchmark Locks'
+        verbose_name = 'Benchmark Lock'
+
+    def __unicode__(self):
+        return u'%s' % (unicode(self.benchmark_id))
+
+
+class BenchmarkArchive(models.Model):
+    """
+    One calendar year of a benchmark's data points, moved out of BenchmarkData
+    and stored as compressed columns. See benchmarks.archive.
+    """
+
+    benchmark = models.ForeignKey(Benchmark, related_name='archives')
+    year = models.IntegerField()
+    start_date = models.DateField()
+    end_date = models.DateField()
+    points = models.IntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        verbose_name_plural = 'Benchmark Archives'
+        verbose_name = 'Benchmark Archive'
+        ordering = ['benchmark', 'year']
+        unique_together = ("benchmark", "year")
+
+    def __unicode__(self):
+        return u'%s %s' % (unicode(self.benchmark_id), unicode(self.year))
+
+
+class BenchmarkRanking(models.Model):
+    """
+    The ranks and percentiles of a benchmark within its group, as of the last
+    group statistics refresh. See benchmarks.groups.
+    """
+
+    group = models.ForeignKey(BenchmarkGroup, related_name='rankings')
+    benchmark = models.OneToOneField(Benchmark, related_name='ranking')
+
+    ytd_return = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    ytd_return_rank = models.IntegerField(null=True, blank=True)
+    ytd_return_percentile = models.FloatField(null=True, blank=True)
+    change_52_week = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    change_52_week_rank = models.IntegerField(null=True, blank=True)
+    change_52_week_percentile = models.FloatField(null=True, blank=True)
+    volatility = models.FloatField(null=True, blank=True, help_text="Annualized volatility of the daily returns of the last 52 weeks")
+    volatility_rank = models.IntegerField(null=True, blank=True)
+    volatility_percentile = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Benchmark Rankings'
+        verbose_name = 'Benchmark Ranking'
+        ordering = ['group', 'ytd_return_rank']
+        index_together = [("group", "ytd_return_rank")]
+
+    def __unicode__(self):
+        return u'%s %s' % (unicode(self.group_id), unicode(self.benchmark_id))
+
+
+class BenchmarkGroupComposite(models.Model):
+    """
+    The equal-weighted composite series of a group, as compressed date and
+    value arrays. See benchmarks.groups.
+    """
+
+    group = models.OneToOneField(BenchmarkGroup, primary_key=True, related_name='composite')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    points = models.IntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        verbose_name_plural = 'Benchmark Group Composites'
+        verbose_name = 'Benchmark Group Composite'
+
+    def __unicode__(self):
+        return u'%s' % (unicode(self.group_id))
+
+
+class BenchmarkRefreshRun(models.Model):
+    """
+    A refresh or statistics rebuild of many benchmarks. See benchmarks.telemetry.
+    """
+
+    kind = models.CharField(max_length=20)
+    started_at = models.DateTimeField(db_index=True)
+    seconds = models.FloatField(null=True, blank=True)
+    benchmarks = models.IntegerField(default=0)
+    failures = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Benchmark Refresh Runs'
+        verbose_name = 'Benchmark Refresh Run'
+        ordering = ['-started_at']
+
+    def __unicode__(self):
+        return u'%s %s' % (unicode(self.kind), unicode(self.started_at))
+
+
+class BenchmarkRefreshTiming(models.Model):
+    """
+    The time, queries and rows of one benchmark in a refresh run
+    """
+
+    run = models.ForeignKey(BenchmarkRefreshRun, related_name='timings')
+    benchmark = models.ForeignKey(Benchmark, related_name='refresh_timings')
+    seconds = models.FloatField()
+    queries = models.IntegerField()
+    rows = models.IntegerField(help_text="Rows fetched")
+    points = models.IntegerField(null=True, blank=True, help_text="Data points updated")
+
+    OUTCOME_CHOICES = (
+        (u'OK', u'Succeeded'),
+        (u'ER', u'Failed'),
+    )
+    outcome = models.CharField(max_length=2, default="OK", choices=OUTCOME_CHOICES)
+    error = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Benchmark Refresh Timings'
+        verbose_name = 'Benchmark Refresh Timing'
+        index_together = [("benchmark", "run")]
+
+    def __unicode__(self):
+        return u'%s %s' % (unicode(self.run_id), unicode(self.benchmark_id))
+
+
+class BenchmarkRevision(models.Model):
+    """
+    An entry of the append-only log of price writes: from valid_from on, the
+    price of the point of benchmark at date is price (None if the point was
+    deleted) instead of previous_price (None if the point was inserted). See
+    benchmarks.revisions.
+    """
+
+    benchmark = models.ForeignKey(Benchmark, related_name='revisions')
+    date = models.DateField()
+    previous_price = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    price = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    valid_from = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = 'Benchmark Revisions'
+        verbose_name = 'Benchmark Revision'
+        ordering = ['valid_from']
+        index_together = [("benchmark", "valid_from")]
+
+    def __unicode__(self):
+        return u'%s %s %s' % (unicode(self.benchmark_id), unicode(self.date), unicode(self.valid_from))
+
+    def save(self, *args, **kwargs):
+        if self.pk != None:
+            raise AssertionError("The revision log is append-only")
+        super(BenchmarkRevision, self).save(*args, **kwargs)
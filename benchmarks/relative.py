@@ -0,0 +1,215 @@
+"""
+Relative performance of portfolios against benchmarks.
+
+compare_portfolios() measures many portfolios against one benchmark, and
+compare_benchmarks() one portfolio against many benchmarks. Either way the
+return series are aligned once, on the portfolio's dates: the benchmark return
+of each period is taken from the benchmark prices at or before the period's
+start and end dates, so daily, weekly or monthly portfolio returns all work.
+The statistics are then computed for every pair and window at once, on masked
+(periods x pairs) arrays.
+
+Statistics (annualized where it applies, returns in percent):
+
+    excess_return       mean active return
+    tracking_error      standard deviation of the active returns
+    information_ratio   excess_return / tracking_error
+    beta                cov(portfolio, benchmark) / var(benchmark)
+    alpha               mean portfolio return - beta * mean benchmark return
+    correlation
+    up_capture          annualized portfolio return over the periods the
+    down_capture        benchmark rose (fell), relative to the benchmark's, x 100
+
+The price series of a benchmark is loaded once and kept in a small in-process
+cache, shared by the threads of the process and keyed by the benchmark's data
+version (see Benchmark.data_changed), so comparing it with many portfolios,
+or again later, does not reload it until its prices are written.
+
+Usage:
+    df = compare_portfolios(portfolio_returns, benchmark)  # a DataFrame, one column per portfolio
+    df.loc[('Fund A', '3Y'), 'tracking_error']
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Trailing windows, as (label, days); None is the whole common history
+DEFAULT_WINDOWS = (('1Y', 365), ('3Y', 3 * 365), ('5Y', 5 * 365), ('ITD', None))
+
+STATISTICS = ('periods', 'excess_return', 'tracking_error', 'information_ratio', 'beta', 'alpha', 'correlation',
+              'up_capture', 'down_capture')
+
+# Price series of recently compared benchmarks
+SERIES_CACHE_SIZE = 128
+_series_cache = OrderedDict()
+_series_cache_lock = threading.Lock()
+
+
+def benchmark_series(benchmark, using=None):
+    """
+    The full price series of a benchmark, from the cache if its prices have
+    not been written since it was loaded
+    """
+    key = (benchmark.pk, benchmark.data_version, using)
+    with _series_cache_lock:
+        series = _series_cache.pop(key, None)
+        if series is not None:
+            _series_cache[key] = series
+    if series is None:
+        # Loaded outside the lock, so that other benchmarks load meanwhile
+        series = benchmark.series(using=using)
+        with _series_cache_lock:
+            _series_cache[key] = series
+            while len(_series_cache) > SERIES_CACHE_SIZE:
+                _series_cache.popitem(last=False)
+    return series
+
+
+def periods_per_year(dates):
+    """
+    Infer the periods per year of a datetime64[D] date grid from its median spacing
+    """
+    if len(dates) < 2:
+        return 252
+    spacing = np.median(np.diff(dates).astype(np.int64))
+    for limit, periods in ((4, 252), (10, 52), (45, 12), (120, 4)):
+        if spacing <= limit:
+            return periods
+    return 1
+
+
+def period_returns(series, dates):
+    """
+    The returns of a price series over the periods between consecutive dates,
+    NaN for the first date
+    """
+    prices = series.asof_values(dates)
+    returns = np.full(len(dates), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = np.where(prices[:-1] > 0, prices[1:] / prices[:-1] - 1, np.nan)
+    return returns
+
+
+def relative_statistics(portfolio_returns, benchmark_returns, dates, windows=DEFAULT_WINDOWS, annualization=None):
+    """
+    Compute the relative statistics of every pair of columns of two
+    (periods x pairs) return arrays, over the trailing windows ending at the
+    last date. NaN returns are left out pair by pair.
+
+    Returns {window label: {statistic: array of one value per pair}}.
+    """
+    portfolio_returns = np.asarray(portfolio_returns, dtype=float)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+    if annualization == None:
+        annualization = periods_per_year(dates)
+    results = OrderedDict()
+    for label, days in windows:
+        in_window = np.ones(len(dates), dtype=bool)
+        if days != None and len(dates):
+            in_window = dates > dates[-1] - np.timedelta64(days, 'D')
+        mask = in_window[:, None] & ~np.isnan(portfolio_returns) & ~np.isnan(benchmark_returns)
+        results[label] = _statistics(np.where(mask, portfolio_returns, 0.0), np.where(mask, benchmark_returns, 0.0),
+                                     mask, annualization)
+    return results
+
+
+def _statistics(p, b, mask, annualization):
+    """
+    The statistics of the masked columns of p and b (zero where masked out)
+    """
+    n = mask.sum(axis=0).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_p = p.sum(axis=0) / n
+        mean_b = b.sum(axis=0) / n
+        dp = np.where(mask, p - mean_p, 0.0)
+        db = np.where(mask, b - mean_b, 0.0)
+        var_p = (dp ** 2).sum(axis=0) / (n - 1)
+        var_b = (db ** 2).sum(axis=0) / (n - 1)
+        cov = (dp * db).sum(axis=0) / (n - 1)
+        active = p - b
+        mean_active = active.sum(axis=0) / n
+        var_active = (np.where(mask, active - mean_active, 0.0) ** 2).sum(axis=0) / (n - 1)
+
+        tracking_error = np.sqrt(var_active * annualization)
+        beta = cov / var_b
+
+        statistics = {
+            'periods': n,
+            'excess_return': mean_active * annualization * 100,
+            'tracking_error': tracking_error * 100,
+            'information_ratio': mean_active * annualization / tracking_error,
+            'beta': beta,
+            'alpha': (mean_p - beta * mean_b) * annualization * 100,
+            'correlation': cov / np.sqrt(var_p * var_b),
+        }
+        for name, side in (('up_capture', b > 0), ('down_capture', b < 0)):
+            side = side & mask
+            count = side.sum(axis=0)
+            portfolio = np.expm1(np.where(side, np.log1p(p), 0.0).sum(axis=0) * annualization / count)
+            benchmark = np.expm1(np.where(side, np.log1p(b), 0.0).sum(axis=0) * annualization / count)
+            statistics[name] = portfolio / benchmark * 100
+    for name, values in statistics.items():
+        values[~np.isfinite(values)] = np.nan
+    return statistics
+
+
+def _to_frame(results, labels):
+    from pandas import DataFrame, MultiIndex
+
+    index = []
+    rows = []
+    for i, label in enumerate(labels):
+        for window, statistics in results.items():
+            index.append((label, window))
+            rows.append([statistics[name][i] for name in STATISTICS])
+    if not rows:
+        return DataFrame(columns=list(STATISTICS))
+    return DataFrame(rows, index=MultiIndex.from_tuples(index, names=['pair', 'window']), columns=list(STATISTICS))
+
+
+def _grid(returns):
+    """
+    The datetime64[D] dates and (periods x columns) values of a returns
+    Series or DataFrame
+    """
+    from pandas import DataFrame
+
+    if not isinstance(returns, DataFrame):
+        returns = returns.to_frame()
+    returns = returns.sort_index()
+    return returns.index.values.astype('datetime64[D]'), returns.values.astype(float), list(returns.columns)
+
+
+def compare_portfolios(portfolio_returns, benchmark, windows=DEFAULT_WINDOWS, annualization=None, using=None):
+    """
+    Measure many portfolios against one benchmark.
+
+    portfolio_returns is a pandas DataFrame of periodic returns (as fractions,
+    eg. 0.012), one column per portfolio, indexed by the period end dates. A
+    Series is taken as a single portfolio.
+
+    Returns a DataFrame indexed by (portfolio, window), one column per statistic.
+    """
+    dates, portfolios, labels = _grid(portfolio_returns)
+    returns = period_returns(benchmark_series(benchmark, using=using), dates)
+    benchmarks = np.repeat(returns[:, None], portfolios.shape[1], axis=1)
+    return _to_frame(relative_statistics(portfolios, benchmarks, dates, windows, annualization), labels)
+
+
+def compare_benchmarks(portfolio_returns, benchmarks, windows=DEFAULT_WINDOWS, annualization=None, using=None):
+    """
+    Measure one portfolio (a pandas Series of periodic returns) against many
+    benchmarks.
+
+    Returns a DataFrame indexed by (benchmark symbol, window), one column per
+    statistic.
+    """
+    dates, portfolio, labels = _grid(portfolio_returns)
+    benchmarks = list(benchmarks)
+    returns = np.column_stack([period_returns(benchmark_series(benchmark, using=using), dates)
+                               for benchmark in benchmarks]) if benchmarks else np.zeros((len(dates), 0))
+    portfolios = np.repeat(portfolio[:, :1], len(benchmarks), axis=1)
+    return _to_frame(relative_statistics(portfolios, returns, dates, windows, annualization),
+                     [benchmark.symbol for benchmark in benchmarks])
@@ -0,0 +1,151 @@
+"""
+Point-in-time reads of corrected price histories.
+
+BenchmarkData rows are corrected in place. Each write of a price is appended
+to the BenchmarkRevision log: BenchmarkData.save() and delete() log the points
+they insert, change or delete, the gap filler logs its FIL rows, and
+correct_prices() applies and logs a batch of corrections at once. Only the
+changed (benchmark, date, price) values are stored, with the time from which
+the new value is valid. Restored archive years and synthetic load-test data
+are not logged.
+
+The history as it was known at a knowledge time K is the live history, with
+each point that was written after K back at the previous price of its
+earliest revision after K: a deleted point is restored, a point inserted
+after K is left out, and so are the points dated after K. An as-of read is
+the normal read plus one indexed query of the revisions after K, merged on
+the arrays:
+
+    series = benchmark.series(as_of=datetime(2016, 3, 31, 18, 0, tzinfo=utc))
+    df = benchmark.generate_dataframe(start_date=date(2015, 1, 1), as_of=date(2016, 3, 31))
+
+A knowledge date stands for the end of that day, in the current time zone.
+The log is read from the primary database, which has every correction.
+
+Every write of the price data also increments Benchmark.data_version, which
+keys the in-process series caches, so they never serve corrected prices.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from benchmarks.locks import benchmark_lock
+from benchmarks.managers import update_rows
+from benchmarks.models import BenchmarkData, BenchmarkRevision
+
+
+def knowledge_time(as_of):
+    """
+    The knowledge time of as_of, a datetime or a date (the end of that day)
+    """
+    if not isinstance(as_of, datetime):
+        as_of = datetime.combine(as_of + timedelta(days=1), time())
+    if settings.USE_TZ and timezone.is_naive(as_of):
+        as_of = timezone.make_aware(as_of)
+    return as_of
+
+
+def knowledge_date(as_of):
+    """
+    The last value date known at knowledge time as_of
+    """
+    if not isinstance(as_of, datetime):
+        return as_of
+    as_of = knowledge_time(as_of)
+    return timezone.localtime(as_of).date() if timezone.is_aware(as_of) else as_of.date()
+
+
+def revisions_after(benchmark, as_of, start_date=None, end_date=None):
+    """
+    Return the (date, previous price) of the earliest revision after as_of of
+    each revised point between two dates (inclusive), in date order. The
+    previous price is None where the point was inserted after as_of.
+    """
+    revisions = BenchmarkRevision.objects.using(DEFAULT_DB_ALIAS).filter(benchmark=benchmark,
+                                                                         valid_from__gt=knowledge_time(as_of))
+    if start_date != None:
+        revisions = revisions.filter(date__gte=start_date)
+    if end_date != None:
+        revisions = revisions.filter(date__lte=end_date)
+    points = []
+    for point_date, previous_price in revisions.order_by('date', 'valid_from').values_list('date', 'previous_price'):
+        if not points or points[-1][0] != point_date:
+            points.append((point_date, previous_price))
+    return points
+
+
+def revise_series(series, revisions, as_of):
+    """
+    Apply revisions_after() to a BenchmarkSeries, on its arrays
+    """
+    from benchmarks.series import BenchmarkSeries
+
+    dates, values = series.dates, series.values
+    if revisions:
+        revision_dates = np.array([point[0] for point in revisions], dtype='datetime64[D]')
+        revision_values = np.array([float(point[1]) if point[1] != None else np.nan for point in revisions])
+        dates = np.union1d(dates, revision_dates)
+        merged = np.zeros(len(dates))
+        merged[np.searchsorted(dates, series.dates)] = values
+        merged[np.searchsorted(dates, revision_dates)] = revision_values
+        # The points inserted after as_of
+        known = ~np.isnan(merged)
+        dates, values = dates[known], merged[known]
+    known = dates <= np.datetime64(knowledge_date(as_of), 'D')
+    return BenchmarkSeries(dates[known], values[known], symbol=series.symbol)
+
+
+def revise_points(points, revisions, as_of):
+    """
+    Apply revisions_after() to (date, price) points in date order
+    """
+    last_date = knowledge_date(as_of)
+    if revisions:
+        revised = dict(revisions)
+        points = sorted([point for point in points if point[0] not in revised] +
+                        [point for point in revisions if point[1] != None])
+    return [point for point in points if point[0] <= last_date]
+
+
+def asof_series(benchmark, as_of, start_date=None, end_date=None, using=None):
+    """
+    Return the price data between two dates (inclusive) as known at as_of,
+    as a BenchmarkSeries
+    """
+    return revise_series(benchmark.series(start_date, end_date, using=using),
+                         revisions_after(benchmark, as_of, start_date, end_date), as_of)
+
+
+def correct_prices(benchmark, prices):
+    """
+    Correct the prices of existing points of a benchmark, given as {date:
+    price}, with batched updates, logging the changed ones in one bulk insert,
+    then rebuild the statistics of the benchmark. Dates without a point are
+    ignored.
+
+    Returns the number of points corrected.
+    """
+    price_field = BenchmarkData._meta.get_field('price')
+    prices = dict((point_date, price_field.to_python(price)) for point_date, price in prices.items())
+    with benchmark_lock(benchmark.pk):
+        dates = sorted(prices)
+        changed = []
+        for i in range(0, len(dates), 500):
+            changed.extend((pk, point_date, price) for pk, point_date, price in BenchmarkData.objects.filter(
+                benchmark=benchmark, date__in=dates[i:i + 500]).values_list('id', 'date', 'price')
+                if prices[point_date] != price)
+        if not changed:
+            return 0
+        update_rows(BenchmarkData.objects.all(), dict((pk, (prices[point_date],)) for pk, point_date, price in changed),
+                    ['price'])
+        now = timezone.now()
+        BenchmarkRevision.objects.bulk_create([
+            BenchmarkRevision(benchmark_id=benchmark.pk, date=point_date, previous_price=price,
+                              price=prices[point_date], valid_from=now)
+            for pk, point_date, price in changed], batch_size=500)
+        benchmark.data_changed()
+    benchmark.rebuild_statistics()
+    return len(changed)
@@ -0,0 +1,222 @@
+"""
+Rolling-window analytics series.
+
+Benchmark.rolling(metric, window, step) returns a BenchmarkSeries of a
+rolling metric over the benchmark's prices:
+
+    return      the return over the last window points, in percent
+    volatility  the annualized standard deviation of the last window daily
+                returns, in percent
+    drawdown    the fall from the highest price of the last window points,
+                in percent (0 or negative)
+
+Every metric is computed in O(n) over the float price array: return from
+shifted prices, volatility from cumulative sums of the returns and their
+squares, drawdown from a block-wise rolling maximum. window is a number of
+points, or one of the WINDOWS labels (eg. '1Y').
+
+The prices and the computed metrics are kept in a small in-process cache per
+benchmark, keyed by its data version (see Benchmark.data_changed). When the
+version has moved, the data points up to the cached last date are checked
+with one aggregate query and the revision log; if they are unchanged only the
+new days are read, and each cached metric is extended by computing the new
+points from the last window of prices. Otherwise the history is reloaded.
+
+The cache is shared by the threads of a process (see benchmarks.loader): each
+cached benchmark has its own lock, held while it is brought up to date.
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from benchmarks.models import BenchmarkData, BenchmarkRevision
+
+
+# Window labels, in trading days
+WINDOWS = {
+    '1M': 21,
+    '3M': 63,
+    '6M': 126,
+    '1Y': 252,
+    '3Y': 756,
+    '5Y': 1260,
+}
+
+METRICS = ('return', 'volatility', 'drawdown')
+
+CACHE_SIZE = 128
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def rolling_return(values, window):
+    result = np.full(len(values), np.nan)
+    if len(values) > window:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[window:] = (values[window:] / values[:-window] - 1) * 100
+    return result
+
+
+def rolling_volatility(values, window):
+    result = np.full(len(values), np.nan)
+    if len(values) > window:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = values[1:] / values[:-1] - 1
+        sums = np.concatenate([[0.0], np.cumsum(returns)])
+        squares = np.concatenate([[0.0], np.cumsum(returns ** 2)])
+        window_sums = sums[window:] - sums[:-window]
+        window_squares = squares[window:] - squares[:-window]
+        variance = (window_squares - window_sums ** 2 / window) / (window - 1)
+        result[window:] = np.sqrt(np.maximum(variance, 0.0) * 252) * 100
+    return result
+
+
+def rolling_max(values, window):
+    """
+    The maximum of the last window values at each point (van Herk/Gil-Werman:
+    prefix and suffix maxima of blocks of window values)
+    """
+    result = np.full(len(values), np.nan)
+    if len(values) < window:
+        return result
+    padded = np.concatenate([values, np.full((-len(values)) % window, -np.inf)])
+    blocks = padded.reshape(-1, window)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    starts = np.arange(len(values) - window + 1)
+    result[window - 1:] = np.maximum(suffix[starts], prefix[starts + window - 1])
+    return result
+
+
+def rolling_drawdown(values, window):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (values / rolling_max(values, window) - 1) * 100
+
+
+COMPUTE = {
+    'return': rolling_return,
+    'volatility': rolling_volatility,
+    'drawdown': rolling_drawdown,
+}
+
+
+def window_points(window):
+    if window in WINDOWS:
+        return WINDOWS[window]
+    window = int(window)
+    if window < 2:
+        raise ValueError("The window must be at least 2 points")
+    return window
+
+
+def fingerprint(benchmark, end_date):
+    """
+    Count and sum of the prices up to end_date, to check that they have not
+    changed since they were cached. Read from the primary, since the last
+    cached days may not have reached a replica yet.
+    """
+    stats = BenchmarkData.objects.using(DEFAULT_DB_ALIAS).filter(benchmark=benchmark, date__lte=end_date).aggregate(
+        count=Count('id'), total=Sum('price'))
+    return stats['count'], stats['total']
+
+
+def revised_since(benchmark, since, end_date):
+    """
+    True if a price up to end_date was written since the time since
+    """
+    return BenchmarkRevision.objects.using(DEFAULT_DB_ALIAS).filter(benchmark=benchmark, valid_from__gte=since,
+                                                                    date__lte=end_date).exists()
+
+
+class RollingState(object):
+    """
+    The cached prices and metrics of a benchmark. Loaded on the first refresh().
+    """
+
+    def __init__(self, using=None):
+        self.using = using
+        self.lock = threading.Lock()
+        self.dates = None
+
+    def load(self, benchmark):
+        self.marked_at = timezone.now()
+        series = benchmark.series(using=self.using)
+        self.dates, self.values = series.dates, series.values
+        self.results = {}
+        self.mark(benchmark)
+
+    def mark(self, benchmark):
+        self.version = benchmark.data_version
+        self.fingerprint = fingerprint(benchmark, self.dates[-1].tolist()) if len(self.dates) else None
+
+    def refresh(self, benchmark):
+        """
+        Bring the state up to date with the benchmark, extending it if only
+        new days were added
+        """
+        if self.dates is None:
+            self.load(benchmark)
+            return
+        if self.version == benchmark.data_version:
+            return
+        if (not len(self.dates) or fingerprint(benchmark, self.dates[-1].tolist()) != self.fingerprint or
+                revised_since(benchmark, self.marked_at, self.dates[-1].tolist())):
+            self.load(benchmark)
+            return
+        marked_at = timezone.now()
+        tail = benchmark.series(self.dates[-1].tolist() + timedelta(days=1), using=self.using)
+        old_length = len(self.dates)
+        self.dates = np.concatenate([self.dates, tail.dates])
+        self.values = np.concatenate([self.values, tail.values])
+        for (metric, window), result in self.results.items():
+            # The new points only depend on the last window of prices before them
+            start = max(old_length - window - 1, 0)
+            extension = COMPUTE[metric](self.values[start:], window)[old_length - start:]
+            self.results[(metric, window)] = np.concatenate([result, extension])
+        self.marked_at = marked_at
+        self.mark(benchmark)
+
+    def metric(self, metric, window):
+        if (metric, window) not in self.results:
+            self.results[(metric, window)] = COMPUTE[metric](self.values, window)
+        return self.results[(metric, window)]
+
+
+def rolling(benchmark, metric, window, step=1, start_date=None, end_date=None, using=None):
+    """
+    Return a rolling metric of a benchmark as a BenchmarkSeries, from the
+    first point with a full window on, every step points (counted back from
+    the last point), between two dates (inclusive).
+    """
+    from benchmarks.series import BenchmarkSeries
+
+    if metric not in COMPUTE:
+        raise ValueError("Unknown metric %s, use %s" % (metric, ', '.join(METRICS)))
+    window = window_points(window)
+    step = int(step)
+    if step < 1:
+        raise ValueError("The step must be at least 1")
+
+    key = (benchmark.pk, using)
+    with _cache_lock:
+        state = _cache.pop(key, None)
+        if state is None:
+            state = RollingState(using=using)
+        _cache[key] = state
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    with state.lock:
+        state.refresh(benchmark)
+        dates, values = state.dates, state.metric(metric, window)
+    valid = np.nonzero(~np.isnan(values))[0]
+    if not len(valid):
+        return BenchmarkSeries([], [], symbol=benchmark.symbol)
+    positions = np.arange(len(values) - 1, valid[0] - 1, -step)[::-1]
+    return BenchmarkSeries(dates[positions], values[positions], symbol=benchmark.symbol).between(start_date,
+                                                                                                end_date)
@@ -0,0 +1,105 @@
+"""
+Read-replica routing for the analytics reads.
+
+The analytics APIs (Benchmark.series(), period_series(), calculate_return()
+and generate_dataframe()) take a using argument. By default they read from the
+alias named by the BENCHMARK_REPLICA_DATABASE setting, or from the primary if
+it is not set. Everything else, in particular BenchmarkData.save() with its
+month-end flag and chained statistics, and Benchmark.save() with its cached
+data, reads and writes the primary.
+
+Replication lag guard: data points dated within BENCHMARK_REPLICA_LAG_DAYS of
+today may not have reached the replica yet, so that part of a read is always
+sent to the primary. A read of the full history fetches the old points from
+the replica and the few recent ones from the primary. A correction can also
+change an old point: the reads of a benchmark whose price data was written
+(Benchmark.data_modified_at) within BENCHMARK_REPLICA_LAG_SECONDS go to the
+primary entirely, so that a stale read is not cached under the new
+data_version.
+
+BenchmarkRouter sends every write of the benchmarks app to the primary, also
+for instances loaded from the replica, and the reads made inside a transaction
+on the primary (read-modify-write paths) to the primary.
+
+Settings:
+    DATABASE_ROUTERS = ['benchmarks.routers.BenchmarkRouter']
+    BENCHMARK_REPLICA_DATABASE = 'replica'
+    BENCHMARK_REPLICA_LAG_DAYS = 7  # optional, see benchmarks.settings
+    BENCHMARK_REPLICA_LAG_SECONDS = 3600  # optional
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+import benchmarks.settings as benchmarksettings
+
+
+def read_database(using=None):
+    """
+    The alias of an analytics read: using, the replica, or the primary
+    """
+    return using or getattr(settings, 'BENCHMARK_REPLICA_DATABASE', None) or DEFAULT_DB_ALIAS
+
+
+def replica_cutoff():
+    """
+    The first value date that is always read from the primary
+    """
+    lag_days = getattr(settings, 'BENCHMARK_REPLICA_LAG_DAYS', benchmarksettings.BENCHMARK_REPLICA_LAG_DAYS)
+    return date.today() - timedelta(days=lag_days)
+
+
+def recently_modified(modified_at):
+    """
+    True if price data written at modified_at may not have reached the
+    replica yet
+    """
+    lag_seconds = getattr(settings, 'BENCHMARK_REPLICA_LAG_SECONDS', benchmarksettings.BENCHMARK_REPLICA_LAG_SECONDS)
+    return modified_at != None and modified_at > timezone.now() - timedelta(seconds=lag_seconds)
+
+
+def read_plan(start_date=None, end_date=None, using=None, modified_at=None):
+    """
+    Split an analytics read between two dates (inclusive, either may be None)
+    into (alias, start_date, end_date) parts, oldest first: the part before
+    replica_cutoff() from the read database, and the rest from the primary.
+    If the data read was written at modified_at, within the replica lag, the
+    read is not split and goes to the primary.
+    """
+    alias = read_database(using)
+    if alias == DEFAULT_DB_ALIAS or recently_modified(modified_at):
+        return [(DEFAULT_DB_ALIAS, start_date, end_date)]
+    cutoff = replica_cutoff()
+    if end_date != None and end_date < cutoff:
+        return [(alias, start_date, end_date)]
+    if start_date != None and start_date >= cutoff:
+        return [(DEFAULT_DB_ALIAS, start_date, end_date)]
+    return [(alias, start_date, cutoff - timedelta(days=1)), (DEFAULT_DB_ALIAS, cutoff, end_date)]
+
+
+class BenchmarkRouter(object):
+    """
+    Database router keeping the writes of the benchmarks app on the primary
+    """
+
+    app_label = 'benchmarks'
+
+    def db_for_read(self, model, **hints):
+        # Inside a transaction on the primary, reads must see its writes
+        if model._meta.app_label == self.app_label and connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = set([DEFAULT_DB_ALIAS, read_database()])
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
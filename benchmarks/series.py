@@ -0,0 +1,188 @@
+"""
+A compact, array-backed price series for a benchmark.
+
+Most callers only need the price on a date or the return between two dates.
+BenchmarkSeries answers those from two sorted NumPy arrays, without building a
+pandas DataFrame. A DataFrame can still be produced on demand with
+to_dataframe().
+"""
+from datetime import datetime
+
+import numpy as np
+
+
+def _to_datetime64(value):
+    """
+    Convert a date, datetime, string or datetime64 to datetime64[D]
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+class BenchmarkSeries(object):
+    """
+    A series of (date, price) points, sorted by date.
+
+    dates is a datetime64[D] array and values a float64 array of the same
+    length.
+    """
+
+    __slots__ = ('symbol', 'dates', 'values')
+
+    def __init__(self, dates, values, symbol=None):
+        self.symbol = symbol
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.values = np.asarray(values, dtype=np.float64)
+        if self.dates.shape != self.values.shape:
+            raise ValueError("dates and values must have the same length")
+
+    @classmethod
+    def from_records(cls, records, symbol=None):
+        """
+        Build a series from an iterable of (date, price) pairs sorted by date,
+        eg. a values_list('date', 'price') queryset.
+        """
+        records = list(records)
+        if not records:
+            return cls([], [], symbol=symbol)
+        dates, values = zip(*records)
+        return cls(dates, [float(value) for value in values], symbol=symbol)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        if len(self) == 0:
+            return '<BenchmarkSeries %s: empty>' % (self.symbol,)
+        return '<BenchmarkSeries %s: %s points, %s to %s>' % (self.symbol, len(self), self.dates[0], self.dates[-1])
+
+    def __iter__(self):
+        for point_date, value in zip(self.dates.tolist(), self.values.tolist()):
+            yield point_date, value
+
+    def __getitem__(self, key):
+        """
+        series[start:end] returns the points between two dates (inclusive),
+        series[i] returns the (date, price) pair at position i.
+        """
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError("BenchmarkSeries does not support slice steps")
+            return self.between(key.start, key.stop)
+        return self.dates[key].tolist(), float(self.values[key])
+
+    @property
+    def first_date(self):
+        return self.dates[0].tolist() if len(self) else None
+
+    @property
+    def last_date(self):
+        return self.dates[-1].tolist() if len(self) else None
+
+    def between(self, start_date=None, end_date=None):
+        """
+        Return the points between start_date and end_date, both inclusive.
+        Either bound may be None.
+        """
+        start = 0 if start_date is None else np.searchsorted(self.dates, _to_datetime64(start_date), side='left')
+        end = len(self) if end_date is None else np.searchsorted(self.dates, _to_datetime64(end_date), side='right')
+        return BenchmarkSeries(self.dates[start:end], self.values[start:end], symbol=self.symbol)
+
+    def asof(self, as_of_date):
+        """
+        Return the last price at or before as_of_date, or None if the series
+        starts after it.
+        """
+        position = np.searchsorted(self.dates, _to_datetime64(as_of_date), side='right') - 1
+        if position < 0:
+            return None
+        return float(self.values[position])
+
+    def asof_values(self, dates):
+        """
+        Return the last price at or before each of dates (a datetime64[D]
+        array) as a float64 array, NaN where the series starts after the date.
+        """
+        positions = np.searchsorted(self.dates, np.asarray(dates, dtype='datetime64[D]'), side='right') - 1
+        values = np.full(len(positions), np.nan)
+        found = positions >= 0
+        values[found] = self.values[positions[found]]
+        return values
+
+    def return_between(self, start_date, end_date):
+        """
+        Return the percentage return between two dates, using the last price
+        at or before each date. Returns None if either date is outside the
+        series, or the start price is zero.
+        """
+        if len(self) == 0:
+            return None
+        if _to_datetime64(end_date) > self.dates[-1] or _to_datetime64(start_date) > self.dates[-1]:
+            return None
+        start_value = self.asof(start_date)
+        end_value = self.asof(end_date)
+        if start_value is None or end_value is None or start_value == 0:
+            return None
+        return ((end_value / start_value) - 1.0) * 100.0
+
+    def returns(self):
+        """
+        Return the simple returns between consecutive points, as a series
+        dated at the end of each period.
+        """
+        if len(self) < 2:
+            return BenchmarkSeries([], [], symbol=self.symbol)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes = self.values[1:] / self.values[:-1] - 1.0
+        return BenchmarkSeries(self.dates[1:], changes, symbol=self.symbol)
+
+    def merge(self, other):
+        """
+        Return the points of both series, sorted by date. Where both have a
+        point on the same date, the point of other is kept.
+        """
+        dates = np.concatenate([other.dates, self.dates])
+        values = np.concatenate([other.values, self.values])
+        # np.unique keeps the first occurrence of each date, ie. the one from other
+        dates, first = np.unique(dates, return_index=True)
+        return BenchmarkSeries(dates, values[first], symbol=self.symbol or other.symbol)
+
+    def month_end(self):
+        """
+        Return the last point of each calendar month.
+        """
+        return self.period_end('M')
+
+    def period_end(self, freq):
+        """
+        Return the last point of each week (W, weeks starting on Monday), month
+        (M), quarter (Q) or year (A).
+        """
+        if len(self) == 0:
+            return self
+        if freq == 'W':
+            # datetime64[W] weeks start on Thursday, so shift Mondays onto Thursdays
+            periods = (self.dates + np.timedelta64(3, 'D')).astype('datetime64[W]')
+        elif freq == 'M':
+            periods = self.dates.astype('datetime64[M]')
+        elif freq == 'Q':
+            periods = self.dates.astype('datetime64[M]').astype(np.int64) // 3
+        elif freq == 'A':
+            periods = self.dates.astype('datetime64[Y]')
+        else:
+            raise ValueError("Unknown frequency %s, use W, M, Q or A" % freq)
+        last_points = np.append(np.flatnonzero(periods[1:] != periods[:-1]), len(self) - 1)
+        return BenchmarkSeries(self.dates[last_points], self.values[last_points], symbol=self.symbol)
+
+    def to_dataframe(self, with_change=False):
+        """
+        Return a pandas DataFrame in the layout of Benchmark.generate_dataframe(fill=False)
+        """
+        from pandas import DataFrame, DatetimeIndex
+
+        price_column_name = "PRICE:" + (self.symbol or '')
+        df = DataFrame({price_column_name: self.values}, index=DatetimeIndex(self.dates, name='DATE'))
+        if with_change:
+            df["CHANGE"] = df[price_column_name].pct_change()
+        return df
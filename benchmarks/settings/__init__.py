@@ -0,0 +1,23 @@
+from datetime import date
+
+# Value data before this date is not used by the analytics (see Benchmark.effective_series_start_date)
+BENCHMARK_VALUE_DATA_START_DATE = date(2009, 1, 1)
+
+# Analytics reads of data points dated within this many days of today go to the
+# primary database, even when a replica is configured (see benchmarks.routers)
+BENCHMARK_REPLICA_LAG_DAYS = 7
+
+# Analytics reads of a benchmark whose price data was written within this many
+# seconds go to the primary database entirely, since a correction of an old
+# point may not have reached the replica yet (see benchmarks.routers)
+BENCHMARK_REPLICA_LAG_SECONDS = 60 * 60
+
+# Cache alias and timeout (seconds) of the summary card documents (see benchmarks.snapshots)
+BENCHMARK_SNAPSHOT_CACHE = 'default'
+BENCHMARK_SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+# Threads of the concurrent series loader (see benchmarks.loader)
+BENCHMARK_LOADER_WORKERS = 8
+
+# Days of refresh telemetry kept (see benchmarks.telemetry)
+BENCHMARK_TELEMETRY_RETENTION_DAYS = 90
@@ -16,9 +16,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
-    }
+    },
+    # A separate database, filled by the routing tests, standing in for a read replica
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
 }
 
+DATABASE_ROUTERS = ['benchmarks.routers.BenchmarkRouter']
+
 ROOT_URLCONF = 'benchmarks.tests.urls'
 
 STATIC_URL = '/static/'
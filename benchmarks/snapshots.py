@@ -0,0 +1,208 @@
+"""
+Snapshot documents of the benchmark summary cards in the Django cache.
+
+A snapshot holds the SNAPSHOT_FIELDS of a benchmark (latest price and change,
+YTD return, the 52 week statistics and the twelve month_XX_prior prices) as a
+compact tuple of strings and numbers, stored under one key per benchmark in
+the BENCHMARK_SNAPSHOT_CACHE cache. Any cache backend works (locmem, file,
+memcached).
+
+Every Benchmark.save() regenerates the cached data and writes the benchmark's
+document, and every write of its price data (Benchmark.data_changed()) deletes
+it. Inside snapshot_batch() the documents are collected and written with
+one set_many when the batch ends, eg. by the refresh actions. Documents carry
+the benchmark's refreshed_at as their version, and a document is never
+replaced by an older one.
+
+Readers fetch many documents with one get_many; benchmarks missing from the
+cache are read in one query and stored. Benchmarks are read with all their
+fields: the snapshot needs nearly all of them, and a deferred load of the
+rest is slower.
+
+Usage:
+    for snapshot in get_snapshots(benchmark_ids):
+        print snapshot['symbol'], snapshot['latest_price'], snapshot['month_01_prior']
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.dateparse import parse_date, parse_datetime
+
+import benchmarks.settings as benchmarksettings
+from benchmarks.managers import BenchmarkQuerySet
+from benchmarks.models import Benchmark
+
+
+# Everything shown on a summary card
+SNAPSHOT_FIELDS = BenchmarkQuerySet.LISTING_FIELDS + (
+    'latest_52_week_change', 'latest_52_week_volatility', 'latest_52_week_high', 'latest_52_week_low',
+    'latest_52_week_cov') + tuple('month_%02d_prior' % (month,) for month in range(1, 13))
+
+# Changes whenever the layout of a document changes, so that old documents are ignored
+SNAPSHOT_FORMAT = 2
+
+KEY_PREFIX = 'benchmarks:snapshot:%s:' % SNAPSHOT_FORMAT
+
+_local = threading.local()
+_fields = []
+
+
+def snapshot_cache():
+    return caches[getattr(settings, 'BENCHMARK_SNAPSHOT_CACHE', benchmarksettings.BENCHMARK_SNAPSHOT_CACHE)]
+
+
+def snapshot_timeout():
+    return getattr(settings, 'BENCHMARK_SNAPSHOT_TIMEOUT', benchmarksettings.BENCHMARK_SNAPSHOT_TIMEOUT)
+
+
+def snapshot_key(benchmark_id):
+    return KEY_PREFIX + str(benchmark_id)
+
+
+# Fields stored as strings, and how to read them back
+PARSERS = {
+    'DecimalField': Decimal,
+    'DateField': parse_date,
+    'DateTimeField': parse_datetime,
+}
+
+
+def snapshot_fields():
+    """
+    The (attribute name, kind) of every snapshot field, in document order
+    """
+    if not _fields:
+        for name in SNAPSHOT_FIELDS:
+            field = Benchmark._meta.get_field(name)
+            kind = field.get_internal_type()
+            _fields.append((field.attname, kind if kind in PARSERS else None))
+    return _fields
+
+
+def document(benchmark):
+    """
+    The cache document of a benchmark: (version, values), with decimals and
+    dates as strings
+    """
+    values = []
+    for attname, kind in snapshot_fields():
+        value = getattr(benchmark, attname)
+        if value != None and kind != None:
+            value = str(value) if kind == 'DecimalField' else value.isoformat()
+        values.append(value)
+    version = benchmark.refreshed_at.isoformat() if benchmark.refreshed_at != None else ''
+    return (version, tuple(values))
+
+
+def snapshot(document):
+    """
+    The snapshot dict of a cache document
+    """
+    version, values = document
+    result = {'version': version}
+    for (attname, kind), value in zip(snapshot_fields(), values):
+        if value != None and kind != None:
+            value = PARSERS[kind](value)
+        result[attname] = value
+    return result
+
+
+def store_snapshots(benchmarks):
+    """
+    Write the documents of benchmarks (loaded with at least the
+    SNAPSHOT_FIELDS) with one get_many and one set_many, keeping any newer
+    document already in the cache
+    """
+    documents = dict((snapshot_key(benchmark.pk), document(benchmark)) for benchmark in benchmarks)
+    if not documents:
+        return 0
+    cache = snapshot_cache()
+    for key, cached in cache.get_many(documents.keys()).items():
+        if cached[0] > documents[key][0]:
+            del documents[key]
+    cache.set_many(documents, snapshot_timeout())
+    return len(documents)
+
+
+def benchmark_saved(benchmark):
+    """
+    Called by Benchmark.save(): write the benchmark's document now, or at the
+    end of the open snapshot_batch()
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch != None:
+        batch[benchmark.pk] = benchmark
+    else:
+        store_snapshots([benchmark])
+
+
+def benchmark_data_changed(benchmark):
+    """
+    Called by Benchmark.data_changed(): drop the benchmark's document, and any
+    pending in the open snapshot_batch(), since their data version is stale.
+    The next Benchmark.save() or get_snapshots() writes it again.
+    """
+    batch = getattr(_local, 'batch', None)
+    if batch != None:
+        batch.pop(benchmark.pk, None)
+    delete_snapshots([benchmark.pk])
+
+
+@contextmanager
+def snapshot_batch():
+    """
+    Collect the documents of the benchmarks saved in this thread, and write
+    them all when the block ends, also when it ends with an error (the
+    benchmarks saved before it stay saved). Batches may be nested.
+    """
+    if getattr(_local, 'batch', None) != None:
+        yield
+        return
+    _local.batch = {}
+    try:
+        yield
+    finally:
+        batch, _local.batch = _local.batch, None
+        store_snapshots(batch.values())
+
+
+def rebuild_snapshots(benchmarks=None, chunk_size=500):
+    """
+    Write the documents of a Benchmark queryset (every active benchmark by
+    default), reading chunk_size benchmarks per query. Returns the number of
+    documents written.
+    """
+    if benchmarks == None:
+        benchmarks = Benchmark.objects.active()
+    benchmark_ids = list(benchmarks.order_by('pk').values_list('pk', flat=True))
+    written = 0
+    for i in range(0, len(benchmark_ids), chunk_size):
+        written += store_snapshots(Benchmark.objects.filter(pk__in=benchmark_ids[i:i + chunk_size]))
+    return written
+
+
+def get_snapshots(benchmark_ids):
+    """
+    Return the snapshots of benchmark_ids, in the same order, from one
+    get_many. Benchmarks missing from the cache are read in one query and
+    stored; unknown ids are left out.
+    """
+    benchmark_ids = list(benchmark_ids)
+    keys = dict((benchmark_id, snapshot_key(benchmark_id)) for benchmark_id in benchmark_ids)
+    documents = snapshot_cache().get_many(keys.values())
+
+    missing = [benchmark_id for benchmark_id in benchmark_ids if keys[benchmark_id] not in documents]
+    if missing:
+        benchmarks = list(Benchmark.objects.filter(pk__in=missing))
+        store_snapshots(benchmarks)
+        for benchmark in benchmarks:
+            documents[keys[benchmark.pk]] = document(benchmark)
+
+    return [snapshot(documents[keys[benchmark_id]]) for benchmark_id in benchmark_ids if keys[benchmark_id] in documents]
+
+
+def delete_snapshots(benchmark_ids):
+    snapshot_cache().delete_many([snapshot_key(benchmark_id) for benchmark_id in benchmark_ids])
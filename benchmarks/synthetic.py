@@ -0,0 +1,159 @@
+"""
+Synthetic benchmark histories for load testing.
+
+Prices follow a geometric Brownian motion over the business days of the
+benchmark's country (weekends and Holiday dates excluded). Rate benchmarks get
+a mean-reverting rate instead. Histories can include gaps (runs of missing
+days) and outliers (single days of junk prices), so that the data quality
+tools have something to find.
+
+Price data is written with one executemany() per benchmark rather than
+through BenchmarkData.save(), so only is_monthly and change are filled in.
+Use Benchmark.rebuild_statistics() for the other derived fields.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import connection, transaction
+
+from benchmarks.calendars import business_days, month_end_flags
+from benchmarks.models import BenchmarkGroup, Benchmark, BenchmarkData
+
+
+def price_path(rng, length, start_price=1000.0, drift=0.07, volatility=0.2):
+    """
+    A geometric Brownian motion sampled daily (252 days a year)
+    """
+    dt = 1.0 / 252
+    log_returns = rng.normal((drift - 0.5 * volatility ** 2) * dt, volatility * np.sqrt(dt), length)
+    log_returns[0] = 0.0
+    return start_price * np.exp(np.cumsum(log_returns))
+
+
+def rate_path(rng, length, start_rate=2.0, mean_rate=3.0, reversion=0.5, volatility=0.8):
+    """
+    A mean-reverting rate in percent, floored at zero
+    """
+    dt = 1.0 / 252
+    shocks = rng.normal(0.0, volatility * np.sqrt(dt), length)
+    rates = np.empty(length)
+    rate = start_rate
+    for i in range(length):
+        rates[i] = rate
+        rate = max(rate + reversion * (mean_rate - rate) * dt + shocks[i], 0.0)
+    return rates
+
+
+def add_gaps(rng, length, probability, mean_length=5):
+    """
+    Return a mask of the days to keep, with a few runs of days removed
+    """
+    keep = np.ones(length, dtype=bool)
+    if length == 0 or rng.random_sample() >= probability:
+        return keep
+    for start in rng.randint(0, length, size=rng.randint(1, 4)):
+        keep[start:start + rng.geometric(1.0 / mean_length)] = False
+    keep[0] = True
+    return keep
+
+
+def add_outliers(rng, values, probability):
+    """
+    Replace a few single days with junk values, in place
+    """
+    if len(values) == 0 or rng.random_sample() >= probability:
+        return
+    for index in rng.randint(0, len(values), size=rng.randint(1, 4)):
+        values[index] *= rng.choice([0.1, 0.5, 2.0, 10.0])
+
+
+def daily_changes(prices):
+    """
+    Percentage change from the previous price, None where it is undefined
+    """
+    changes = [None] * len(prices)
+    for i in range(1, len(prices)):
+        if prices[i - 1] != 0:
+            changes[i] = round((prices[i] - prices[i - 1]) / prices[i - 1] * 100, 2)
+    return changes
+
+
+def insert_price_data(benchmark, dates, prices, rates=None):
+    """
+    Insert the price data of one benchmark with a single executemany()
+    """
+    opts = BenchmarkData._meta
+    fields = [opts.get_field(name) for name in ('benchmark', 'date', 'price_type', 'price', 'rate',
+                                                'change', 'is_monthly', 'is_trading_day')]
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        connection.ops.quote_name(opts.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)))
+
+    prices = np.round(prices, 2)
+    monthly = month_end_flags(dates).tolist()
+    changes = daily_changes(prices.tolist())
+    rates = rates.tolist() if rates is not None else [None] * len(dates)
+    # Dates are passed as ISO text strings, which no driver needs to adapt
+    rows = [(benchmark.pk, point_date, u'QUO', price, rate, change, is_monthly, True)
+            for point_date, price, rate, change, is_monthly
+            in zip(dates.astype('U10').tolist(), prices.tolist(), rates, changes, monthly)]
+    cursor = connection.cursor()
+    cursor.executemany(sql, rows)
+    return len(rows)
+
+
+def generate_synthetic_benchmarks(count, years=20, seed=None, rate_fraction=0.0, gap_probability=0.0,
+                                  outlier_probability=0.0, country=None, currency=None, prefix='SYN',
+                                  first_number=0, group_count=1, end_date=None):
+    """
+    Create count benchmarks, numbered from first_number, with years of synthetic
+    daily data up to end_date (today by default). The same seed always produces
+    the same data.
+
+    Returns a tuple of (list of benchmarks, number of data points written).
+    """
+    from forex.models import Currency
+
+    rng = np.random.RandomState(seed)
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=int(round(365.25 * years)))
+    dates = business_days(start_date, end_date, country)
+    if currency is None:
+        currency, created = Currency.objects.get_or_create(symbol='USD', defaults={'name': 'US Dollar'})
+
+    groups = []
+    for number in range(group_count):
+        group, created = BenchmarkGroup.objects.get_or_create(name='%s Group %s' % (prefix, number + 1),
+                                                              defaults={'description': 'Synthetic benchmarks'})
+        groups.append(group)
+
+    benchmarks = []
+    written = 0
+    for number in range(first_number, first_number + count):
+        is_rate = rng.random_sample() < rate_fraction
+        keep = add_gaps(rng, len(dates), gap_probability)
+        benchmark_dates = dates[keep]
+        if is_rate:
+            rates = np.round(rate_path(rng, len(benchmark_dates)), 4)
+            prices = np.zeros(len(benchmark_dates))
+        else:
+            rates = None
+            prices = price_path(rng, len(benchmark_dates), start_price=rng.uniform(100, 5000),
+                                drift=rng.uniform(-0.02, 0.12), volatility=rng.uniform(0.05, 0.4))
+            add_outliers(rng, prices, outlier_probability)
+
+        with transaction.atomic():
+            benchmark = Benchmark(group=groups[number % group_count], name='%s Benchmark %05d' % (prefix, number),
+                                  symbol='%s%05d' % (prefix, number), description='Synthetic benchmark',
+                                  currency=currency, associated_country=country,
+                                  benchmark_type='R' if is_rate else 'I', benchmark_asset_class='O' if is_rate else 'C')
+            benchmark.save()
+            written += insert_price_data(benchmark, benchmark_dates, prices, rates)
+            benchmark.data_changed()
+            benchmark.save()  # Cache the latest data
+        benchmarks.append(benchmark)
+
+    for group in groups:
+        group.save()
+    return benchmarks, written
@@ -0,0 +1,217 @@
+"""
+Refresh telemetry: per-benchmark timings of the refresh and rebuild runs.
+
+Inside refresh_run(), each benchmark processed in run.record() gets a
+BenchmarkRefreshTiming with its wall time, the queries it issued and rows it
+fetched (counted by benchmarks.instrumentation), the data points it updated
+and its outcome. The BenchmarkRefreshRun row is written when the run starts,
+and the timings with a bulk_create per TIMING_BATCH_SIZE benchmarks, so a run
+that is killed keeps the timings of all but its last batch (its seconds stay
+empty). When the run ends its duration is written and the runs older than
+BENCHMARK_TELEMETRY_RETENTION_DAYS are pruned. A failure to write telemetry is
+logged, never raised.
+
+The benchmark_perf_report command reads it back: p50/p95 timings per run,
+the slowest benchmarks and how their timings moved across runs. Only these
+report functions import numpy, since the admin actions import this module
+while Django starts.
+
+Usage:
+    with refresh_run('rebuild') as run:
+        for benchmark in benchmarks:
+            with run.record(benchmark) as timing:
+                timing.points = benchmark.rebuild_statistics()
+                benchmark.save()
+"""
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.encoding import force_text
+
+import benchmarks.settings as benchmarksettings
+from benchmarks.instrumentation import counting
+from benchmarks.models import BenchmarkRefreshRun, BenchmarkRefreshTiming
+
+
+logger = logging.getLogger('benchmarks.telemetry')
+
+def retention_days():
+    return getattr(settings, 'BENCHMARK_TELEMETRY_RETENTION_DAYS', benchmarksettings.BENCHMARK_TELEMETRY_RETENTION_DAYS)
+
+
+# The timings are written in batches of this many as the run goes
+TIMING_BATCH_SIZE = 100
+
+
+class RefreshRecorder(object):
+    """
+    Collects the timings of a run
+    """
+
+    def __init__(self, kind):
+        self.run = BenchmarkRefreshRun(kind=kind, started_at=timezone.now())
+        self.pending = []
+
+    @contextmanager
+    def record(self, benchmark):
+        """
+        Time the processing of one benchmark. Yields its
+        BenchmarkRefreshTiming, whose points may be set by the block. An error
+        is recorded and raised again.
+        """
+        timing = BenchmarkRefreshTiming(benchmark_id=benchmark.pk)
+        frame = [0, 0]
+        start = time.time()
+        try:
+            with counting() as frame:
+                yield timing
+        except Exception as error:
+            timing.outcome = 'ER'
+            timing.error = ('%s: %s' % (type(error).__name__, force_text(error)))[:255]
+            raise
+        finally:
+            timing.seconds = time.time() - start
+            timing.queries, timing.rows = frame
+            self.add(timing)
+
+    def add(self, timing):
+        self.run.benchmarks += 1
+        if timing.outcome == 'ER':
+            self.run.failures += 1
+        self.pending.append(timing)
+        if len(self.pending) >= TIMING_BATCH_SIZE:
+            self.save()
+
+    def save(self, seconds=None):
+        """
+        Write the run with its counts so far (and its duration once it has
+        ended) and the pending timings. A failure is logged, not raised, and
+        drops those timings.
+        """
+        pending, self.pending = self.pending, []
+        try:
+            self.run.seconds = seconds
+            self.run.save()
+            for timing in pending:
+                timing.run = self.run
+            BenchmarkRefreshTiming.objects.bulk_create(pending, batch_size=500)
+        except Exception:
+            logger.exception("Could not write the telemetry of the %s run", self.run.kind)
+
+
+@contextmanager
+def refresh_run(kind):
+    """
+    Record the timings of a run of kind (eg. 'refresh' or 'rebuild'), and
+    prune the old runs when it ends
+    """
+    recorder = RefreshRecorder(kind)
+    recorder.save()
+    start = time.time()
+    try:
+        yield recorder
+    finally:
+        recorder.save(time.time() - start)
+        try:
+            prune_telemetry()
+        except Exception:
+            logger.exception("Could not prune the telemetry")
+
+
+def prune_telemetry(days=None):
+    """
+    Delete the runs started more than days (BENCHMARK_TELEMETRY_RETENTION_DAYS
+    by default) ago. Returns the number of runs deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=days if days != None else retention_days())
+    BenchmarkRefreshTiming.objects.filter(run__started_at__lt=cutoff).delete()
+    runs = BenchmarkRefreshRun.objects.filter(started_at__lt=cutoff)
+    count = runs.count()
+    runs.delete()
+    return count
+
+
+def recent_runs(kind=None, count=30):
+    """
+    The last count runs (of kind), oldest first
+    """
+    runs = BenchmarkRefreshRun.objects.all()
+    if kind != None:
+        runs = runs.filter(kind=kind)
+    return list(runs.order_by('-started_at')[:count])[::-1]
+
+
+def load_timings(runs):
+    """
+    The (run ids, benchmark ids, seconds, queries, rows, failed) arrays of the
+    timings of runs
+    """
+    import numpy as np
+
+    rows = list(BenchmarkRefreshTiming.objects.filter(run__in=[run.pk for run in runs]).values_list(
+        'run_id', 'benchmark_id', 'seconds', 'queries', 'rows', 'outcome'))
+    if not rows:
+        return tuple(np.zeros(0, dtype=dtype) for dtype in (np.int64, np.int64, float, np.int64, np.int64, bool))
+    run_ids, benchmark_ids, seconds, queries, fetched, outcomes = zip(*rows)
+    return (np.array(run_ids, dtype=np.int64), np.array(benchmark_ids, dtype=np.int64), np.array(seconds),
+            np.array(queries, dtype=np.int64), np.array(fetched, dtype=np.int64), np.array(outcomes) == 'ER')
+
+
+def percentiles(values):
+    """
+    The (p50, p95) of values, None if there are none
+    """
+    import numpy as np
+
+    if not len(values):
+        return None, None
+    return tuple(np.percentile(values, [50, 95]).tolist())
+
+
+def run_summaries(runs):
+    """
+    Return a dict per run, oldest first: the run and the p50, p95 and max of
+    its benchmark timings, with its total queries and rows
+    """
+    run_ids, benchmark_ids, seconds, queries, fetched, failed = load_timings(runs)
+    summaries = []
+    for run in runs:
+        in_run = run_ids == run.pk
+        p50, p95 = percentiles(seconds[in_run])
+        summaries.append({'run': run, 'p50': p50, 'p95': p95,
+                          'max': seconds[in_run].max() if in_run.any() else None,
+                          'queries': int(queries[in_run].sum()), 'rows': int(fetched[in_run].sum())})
+    return summaries
+
+
+def slowest_benchmarks(runs, top=20):
+    """
+    Return a dict per benchmark for the top benchmarks by median time over
+    runs, slowest first: runs, median and latest seconds, median queries and
+    rows, failures, and the trend (the change of the median time from the
+    older half of the runs to the newer half, in percent)
+    """
+    import numpy as np
+
+    run_ids, benchmark_ids, seconds, queries, fetched, failed = load_timings(runs)
+    run_order = dict((run.pk, index) for index, run in enumerate(runs))
+    order = np.array([run_order[run_id] for run_id in run_ids.tolist()], dtype=np.int64)
+    half = len(runs) // 2
+
+    results = []
+    for benchmark_id in np.unique(benchmark_ids).tolist():
+        mine = benchmark_ids == benchmark_id
+        latest = np.argmax(np.where(mine, order, -1))
+        older, newer = seconds[mine & (order < half)], seconds[mine & (order >= half)]
+        trend = None
+        if len(older) and len(newer) and np.median(older) > 0:
+            trend = (np.median(newer) / np.median(older) - 1) * 100
+        results.append({'benchmark_id': benchmark_id, 'runs': int(mine.sum()), 'median': np.median(seconds[mine]),
+                        'latest': seconds[latest], 'queries': np.median(queries[mine]),
+                        'rows': np.median(fetched[mine]), 'failures': int(failed[mine].sum()), 'trend': trend})
+    results.sort(key=lambda result: result['median'], reverse=True)
+    return results[:top]
@@ -0,0 +1,94 @@
+"""
+The compressed archive tier: archive, read through and restore.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.test import TestCase
+
+from benchmarks.archive import archive_benchmark, archived_prices, load, pack_arrays, restore_benchmark
+from benchmarks.models import Benchmark, BenchmarkArchive, BenchmarkData
+from benchmarks.series import BenchmarkSeries
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+def stored_points(benchmark):
+    return list(BenchmarkData.objects.filter(benchmark=benchmark).order_by('date').values(
+        *[field.name for field in BenchmarkData._meta.concrete_fields if not field.primary_key]))
+
+
+class ArchiveRoundTripTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=3, seed=6, prefix='ARCH', end_date=end_date)[0][0]
+        cls.benchmark.rebuild_statistics()
+        cls.cutoff = date(end_date.year - 1, 1, 1)
+
+    def setUp(self):
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+
+    def test_round_trip(self):
+        points = stored_points(self.benchmark)
+        start_date = points[0]['date']
+        series = self.benchmark.series()
+        monthly = self.benchmark.period_series('M')
+        frame = self.benchmark.generate_dataframe(start_date=start_date, fill=False)
+
+        archived = archive_benchmark(self.benchmark, before=self.cutoff)
+        self.assertEqual(archived, len([point for point in points if point['date'] < self.cutoff]))
+        self.assertFalse(BenchmarkData.objects.filter(benchmark=self.benchmark, date__lt=self.cutoff).exists())
+        self.assertEqual(BenchmarkArchive.objects.filter(benchmark=self.benchmark).count(), 2)
+
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        self.assertEqual(benchmark.archived_until, max(point['date'] for point in points if point['date'] < self.cutoff))
+        self.assertEqual(benchmark.series().dates.tolist(), series.dates.tolist())
+        self.assertEqual(benchmark.series().values.tolist(), series.values.tolist())
+        self.assertEqual(list(benchmark.period_series('M')), list(monthly))
+        self.assertTrue(benchmark.generate_dataframe(start_date=start_date, fill=False).equals(frame))
+        dates, prices = archived_prices(benchmark, end_date=self.cutoff)
+        self.assertEqual(len(dates), archived)
+
+        self.assertEqual(restore_benchmark(benchmark), archived)
+        self.assertEqual(stored_points(self.benchmark), points)
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).archived_until, None)
+
+    def test_archive_merges_years(self):
+        points = stored_points(self.benchmark)
+        archive_benchmark(self.benchmark, before=self.cutoff)
+        # A late point for an archived year, archived again
+        first = points[0]
+        BenchmarkData.objects.create(benchmark=self.benchmark, date=first['date'] - timedelta(days=1),
+                                     price=first['price'])
+        self.assertEqual(archive_benchmark(self.benchmark, before=self.cutoff), 1)
+        restore_benchmark(self.benchmark)
+        self.assertEqual(len(stored_points(self.benchmark)), len(points) + 1)
+
+    def test_stale_instance_keeps_archive(self):
+        series = self.benchmark.series()
+        stale = Benchmark.objects.get(pk=self.benchmark.pk)
+        archive_benchmark(self.benchmark, before=self.cutoff)
+        # A save of an instance loaded before the archive run, eg. by a refresh loop
+        stale.save()
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        self.assertNotEqual(benchmark.archived_until, None)
+        self.assertEqual(benchmark.series().dates.tolist(), series.dates.tolist())
+
+    def test_pack_arrays(self):
+        arrays = load(pack_arrays({'date': np.arange(3, dtype=np.int32), 'value': np.array([1.5, np.nan, 2.0])}))
+        self.assertEqual(arrays['date'].tolist(), [0, 1, 2])
+        self.assertTrue(np.isnan(arrays['value'][1]))
+
+
+class SeriesMergeTest(TestCase):
+
+    def test_merge(self):
+        archived = BenchmarkSeries(['2014-12-30', '2014-12-31', '2015-01-02'], [1.0, 2.0, 3.0], symbol='A')
+        live = BenchmarkSeries(['2015-01-02', '2015-01-05'], [30.0, 40.0])
+        merged = archived.merge(live)
+        self.assertEqual(merged.symbol, 'A')
+        self.assertEqual([point_date.isoformat() for point_date in merged.dates.tolist()],
+                         ['2014-12-30', '2014-12-31', '2015-01-02', '2015-01-05'])
+        self.assertEqual(merged.values.tolist(), [1.0, 2.0, 30.0, 40.0])
+        self.assertEqual(len(BenchmarkSeries([], []).merge(live)), 2)
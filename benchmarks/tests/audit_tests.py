@@ -0,0 +1,68 @@
+"""
+The fleet-wide data-gap audit, checked against Benchmark.find_missing_values().
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from countries.models import Country
+from django.test import TestCase
+from holidays.models import Holiday
+
+from benchmarks.audit import audit_gaps
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class AuditGapsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=3)
+        cls.country = Country.objects.create(name='Audit Country', symbol_alpha2_code='AX', symbol_alpha3_code='AXX',
+                                             is_independent=True, numeric_code=999)
+        # Weekday holidays, plus one on a Saturday, which is not a missing date either way
+        start = cls.end_date - timedelta(days=300)
+        cls.holidays = [day for day in (start + timedelta(days=offset) for offset in range(40, 300, 37))
+                        if day.weekday() < 5]
+        saturday = start + timedelta(days=(5 - start.weekday()) % 7 + 7)
+        for day in cls.holidays + [saturday]:
+            Holiday.objects.create(country=cls.country, date=day)
+
+        cls.benchmarks = generate_synthetic_benchmarks(3, years=1, seed=17, prefix='AUD', gap_probability=1.0,
+                                                       country=cls.country, end_date=cls.end_date - timedelta(days=4))[0]
+        # Unexpected dates: a weekend and a holiday
+        benchmark = cls.benchmarks[0]
+        for day in (saturday + timedelta(days=1), cls.holidays[2]):
+            BenchmarkData(benchmark=benchmark, date=day, price=Decimal('100.00')).save()
+        for benchmark in cls.benchmarks:
+            benchmark.rebuild_statistics(seed=10000)
+
+    def test_matches_find_missing_values(self):
+        summaries = audit_gaps(end_date=self.end_date, benchmark_ids=[benchmark.pk for benchmark in self.benchmarks])
+        self.assertEqual([summary.benchmark_id for summary in summaries], [benchmark.pk for benchmark in self.benchmarks])
+        for summary in summaries:
+            benchmark = Benchmark.objects.get(pk=summary.benchmark_id)
+            missing = benchmark.find_missing_values(verbose=False)
+            unexpected = benchmark.find_missing_values(direction=1, verbose=False)
+            self.assertGreater(summary.gap_count, 1)
+            self.assertEqual(summary.missing, len(missing))
+            self.assertEqual(summary.unexpected, len(unexpected))
+            # Each gap holds exactly the missing dates between its two points
+            for gap in summary.gaps:
+                self.assertEqual(gap.missing, len([day for day in missing if gap.after < day < gap.before]))
+            self.assertEqual(summary.last_good_date, BenchmarkData.objects.filter(benchmark=benchmark).latest().date)
+            self.assertEqual(summary.points, BenchmarkData.objects.filter(benchmark=benchmark).count())
+        self.assertEqual(summaries[0].unexpected, 2)
+
+    def test_stale_series(self):
+        summary = audit_gaps(end_date=self.end_date, benchmark_ids=[self.benchmarks[1].pk])[0]
+        # The trailing gap runs up to the day after the audit end
+        self.assertEqual(summary.gaps[-1].after, summary.last_good_date)
+        self.assertEqual(summary.gaps[-1].before, self.end_date + timedelta(days=1))
+
+    def test_inactive_benchmark_by_id(self):
+        benchmark = self.benchmarks[2]
+        active = audit_gaps(end_date=self.end_date, benchmark_ids=[benchmark.pk])
+        Benchmark.objects.filter(pk=benchmark.pk).update(benchmark_state='IN')
+        self.assertEqual(audit_gaps(end_date=self.end_date, benchmark_ids=[benchmark.pk]), active)
+        self.assertNotIn(benchmark.pk, [summary.benchmark_id for summary in audit_gaps(end_date=self.end_date)])
@@ -0,0 +1,74 @@
+"""
+Forward-filled data points for missing trading days.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.test import TestCase
+
+from benchmarks.audit import audit_gaps
+from benchmarks.calendars import business_days, month_end_flags
+from benchmarks.filling import fill_missing_days
+from benchmarks.models import Benchmark, BenchmarkData, BenchmarkRevision
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class CalendarTest(TestCase):
+
+    def test_business_days(self):
+        days = business_days(date(2015, 1, 1), date(2015, 1, 12))
+        self.assertEqual(days.tolist(), [date(2015, 1, day) for day in (1, 2, 5, 6, 7, 8, 9, 12)])
+        days = business_days(date(2015, 1, 29), date(2015, 2, 3))
+        self.assertEqual(month_end_flags(days).tolist(), [False, True, False, True])
+        self.assertEqual(len(month_end_flags(days[:0])), 0)
+
+
+class FillMissingDaysTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=7)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=2, seed=12, prefix='FIL', end_date=cls.end_date)[0][0]
+        dates = list(BenchmarkData.objects.filter(benchmark=cls.benchmark).order_by('date').values_list(
+            'date', flat=True))
+        # A gap over a month end, and one around the start of the 52 week windows of the latest points
+        month_end = [index for index, is_month_end in enumerate(month_end_flags(np.array(dates, dtype='datetime64[D]')))
+                     if is_month_end][6]
+        year_ago = len(dates) - 262
+        cls.removed = dates[month_end - 2:month_end + 3] + dates[year_ago:year_ago + 4]
+        BenchmarkData.objects.filter(benchmark=cls.benchmark, date__in=cls.removed).delete()
+        cls.benchmark.rebuild_statistics(seed=10000)
+
+    def setUp(self):
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+
+    def test_fill(self):
+        version = self.benchmark.data_version
+        self.assertEqual(fill_missing_days(end_date=self.end_date, benchmark_ids=[self.benchmark.pk]),
+                         {self.benchmark.pk: len(self.removed)})
+        filled = BenchmarkData.objects.filter(benchmark=self.benchmark, price_type='FIL').order_by('date')
+        self.assertEqual([point.date for point in filled], sorted(self.removed))
+        for point in filled:
+            previous = BenchmarkData.objects.filter(benchmark=self.benchmark, date__lt=point.date,
+                                                    price_type='QUO').latest()
+            self.assertEqual((point.price, point.growth_of_10_k, point.is_trading_day),
+                             (previous.price, previous.growth_of_10_k, False))
+        self.assertEqual(BenchmarkRevision.objects.filter(benchmark=self.benchmark, previous_price=None).count(),
+                         len(self.removed))
+        self.assertGreater(Benchmark.objects.get(pk=self.benchmark.pk).data_version, version)
+
+        # The flags and 52 week changes are what a rebuild computes
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).rebuild_statistics(), 0)
+        # Filled days are not filled again, and the trailing gap is left alone
+        self.assertEqual(fill_missing_days(benchmark_ids=[self.benchmark.pk]), {})
+        self.assertFalse(BenchmarkData.objects.filter(benchmark=self.benchmark, date__gt=self.end_date).exists())
+
+    def test_audit_include_filled(self):
+        summary, = audit_gaps(end_date=self.end_date, benchmark_ids=[self.benchmark.pk])
+        self.assertEqual((summary.gap_count, summary.missing), (2, len(self.removed)))
+        fill_missing_days(end_date=self.end_date, benchmark_ids=[self.benchmark.pk])
+        summary, = audit_gaps(end_date=self.end_date, benchmark_ids=[self.benchmark.pk])
+        self.assertEqual(summary.gap_count, 2)
+        summary, = audit_gaps(end_date=self.end_date, benchmark_ids=[self.benchmark.pk], include_filled=True)
+        self.assertEqual(summary.gap_count, 0)
+        self.assertEqual(summary.points, BenchmarkData.objects.filter(benchmark=self.benchmark).count())
@@ -0,0 +1,110 @@
+"""
+Group rankings, averages and composite series.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from StringIO import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from pandas import DataFrame, Series
+
+from benchmarks import groups
+from benchmarks.models import Benchmark, BenchmarkGroup, BenchmarkRanking
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class RankWithinTest(TestCase):
+
+    def test_ranks(self):
+        member_groups = np.array([1, 1, 1, 2, 2, 1])
+        values = np.array([3.0, 5.0, 5.0, 1.0, np.nan, 2.0])
+        ranks, percentiles = groups.rank_within(member_groups, values)
+        np.testing.assert_array_equal(ranks, [3, 1, 1, 1, np.nan, 4])
+        np.testing.assert_allclose(percentiles, [100.0 / 3, 100, 100, 100, np.nan, 0])
+        ranks, percentiles = groups.rank_within(member_groups, values, descending=False)
+        np.testing.assert_array_equal(ranks, [2, 3, 3, 1, np.nan, 1])
+
+    def test_no_values(self):
+        ranks, percentiles = groups.rank_within(np.array([1, 2]), np.array([np.nan, np.nan]))
+        self.assertTrue(np.isnan(ranks).all() and np.isnan(percentiles).all())
+
+
+class VolatilitiesTest(TestCase):
+
+    def test_volatilities(self):
+        rng = np.random.RandomState(3)
+        dates = np.arange(np.datetime64('2015-01-01'), np.datetime64('2015-04-11'), dtype='datetime64[D]')
+        benchmark_ids = np.repeat([4, 7], [len(dates), 10])
+        dates = np.concatenate([dates, dates[:10]])
+        returns = rng.normal(0, 0.01, len(dates))
+        returns[[0, len(dates) - 10]] = np.nan
+        result = groups.volatilities(np.array([4, 7]), benchmark_ids, dates, returns, date(2015, 2, 1))
+        recent = returns[(benchmark_ids == 4) & (dates >= np.datetime64('2015-02-01'))]
+        self.assertAlmostEqual(result[0], np.std(recent, ddof=1) * np.sqrt(252) * 100)
+        # Fewer than MIN_VOLATILITY_RETURNS returns
+        self.assertTrue(np.isnan(result[1]))
+
+
+class RefreshGroupStatisticsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=7)
+        cls.benchmarks = generate_synthetic_benchmarks(6, years=2, seed=8, prefix='GRP', group_count=2,
+                                                       end_date=cls.end_date)[0]
+        cls.empty_group = BenchmarkGroup.objects.create(name='GRP Empty', description='No members')
+
+    def test_refresh(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(groups.refresh_group_statistics(as_of=self.end_date), 6)
+        # The groups without members, then one batch for the others
+        self.assertEqual(len([query for query in queries
+                              if 'UPDATE "benchmarks_benchmarkgroup"' in query['sql']]), 2)
+
+        since = self.end_date - timedelta(weeks=52)
+        for group in BenchmarkGroup.objects.filter(benchmark__isnull=False).distinct():
+            members = list(Benchmark.objects.filter(group=group))
+            self.assertEqual(group.num_ranked, 3)
+            self.assertEqual(group.statistics_date, self.end_date)
+            ytd_returns = [float(member.ytd_return) for member in members]
+            self.assertEqual(group.median_ytd_return, Decimal('%.2f' % np.median(ytd_returns)))
+
+            volatilities = []
+            for member in members:
+                prices = member.series(since - timedelta(days=7))
+                returns = prices.values[1:] / prices.values[:-1] - 1
+                volatilities.append(np.std(returns[prices.dates[1:] >= np.datetime64(since)], ddof=1) *
+                                    np.sqrt(252) * 100)
+            self.assertAlmostEqual(group.mean_volatility, np.mean(volatilities))
+
+            rankings = dict((ranking.benchmark_id, ranking) for ranking in BenchmarkRanking.objects.filter(group=group))
+            by_ytd = sorted(members, key=lambda member: -member.ytd_return)
+            self.assertEqual([rankings[member.pk].ytd_return_rank for member in by_ytd], [1, 2, 3])
+            self.assertEqual([rankings[member.pk].ytd_return_percentile for member in by_ytd], [100, 50, 0])
+            by_volatility = [member.pk for volatility, member in sorted(zip(volatilities, members))]
+            self.assertEqual([rankings[pk].volatility_rank for pk in by_volatility], [1, 2, 3])
+
+        empty_group = BenchmarkGroup.objects.get(pk=self.empty_group.pk)
+        self.assertEqual((empty_group.num_ranked, empty_group.median_ytd_return), (0, None))
+
+    def test_daily_refresh(self):
+        call_command('refresh_benchmarks', self.benchmarks[0].symbol, stdout=StringIO())
+        self.assertFalse(BenchmarkRanking.objects.exists())
+        call_command('refresh_benchmarks', stdout=StringIO())
+        self.assertEqual(BenchmarkRanking.objects.count(), 6)
+        self.assertEqual(BenchmarkGroup.objects.get(pk=self.benchmarks[0].group_id).num_ranked, 3)
+
+    def test_composite(self):
+        groups.refresh_group_statistics(as_of=self.end_date)
+        group = self.benchmarks[0].group
+        frame = DataFrame(dict((member.symbol, Series(member.series().values, index=member.series().dates))
+                               for member in Benchmark.objects.filter(group=group)))
+        expected = 1000 * (1 + frame.pct_change().mean(axis=1).fillna(0)).cumprod()
+        composite = groups.composite_series(group)
+        self.assertEqual(composite.dates.tolist(), [day.date() for day in expected.index])
+        np.testing.assert_allclose(composite.values, expected.values, rtol=1e-9)
+        self.assertEqual(len(groups.composite_series(self.empty_group)), 0)
@@ -0,0 +1,99 @@
+"""
+Rebased growth of 10K and the backfill of the stored chain.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.test import TestCase
+
+from benchmarks.archive import archive_benchmark
+from benchmarks.growth import backfill_growth_of_10k, growth_matrix
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+def chained(prices, seed):
+    """
+    The growth of 10K of each price, chained as BenchmarkData.save() does
+    """
+    growth = [Decimal(seed).quantize(Decimal('0.01'))]
+    for previous_price, price in zip(prices[:-1], prices[1:]):
+        change = ((price - previous_price) / previous_price) * 100
+        growth.append(((1 + (change / 100)) * growth[-1]).quantize(Decimal('0.01')))
+    return growth
+
+
+class GrowthMatrixTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a, cls.b, cls.c = generate_synthetic_benchmarks(3, years=1, seed=10, prefix='GRO',
+                                                            end_date=date(2015, 1, 9))[0]
+        BenchmarkData.objects.all().delete()
+        prices = {
+            cls.a: [(date(2015, 1, 2), 100), (date(2015, 1, 5), 110), (date(2015, 1, 6), 121), (date(2015, 1, 7), 99)],
+            # The November price is outside the lookback of the start dates below
+            cls.b: [(date(2014, 11, 3), 50), (date(2015, 1, 6), 40), (date(2015, 1, 8), 60)],
+            cls.c: [(date(2015, 1, 2), 0), (date(2015, 1, 5), 10)],
+        }
+        BenchmarkData.objects.bulk_create([BenchmarkData(benchmark=benchmark, date=point_date, price=price)
+                                           for benchmark, points in prices.items() for point_date, price in points])
+
+    def test_rebased(self):
+        dates, values = growth_matrix([self.a, self.b, self.c], date(2015, 1, 4))
+        self.assertEqual(dates.tolist(), [date(2015, 1, 4), date(2015, 1, 5), date(2015, 1, 6), date(2015, 1, 7),
+                                          date(2015, 1, 8)])
+        # The base of a is its last price before the Sunday start date, and the
+        # last price is carried over the days it did not trade
+        np.testing.assert_allclose(values[:, 0], [10000, 11000, 12100, 9900, 9900])
+        # b has no price in the lookback, so it is based at its first price after the start date
+        np.testing.assert_allclose(values[:, 1], [np.nan, np.nan, 10000, 10000, 15000])
+        # c has no positive base price
+        self.assertTrue(np.isnan(values[:, 2]).all())
+
+    def test_start_and_end_dates(self):
+        dates, values = growth_matrix([self.a, self.b], date(2015, 1, 5), date(2015, 1, 6), amount=100)
+        self.assertEqual(dates.tolist(), [date(2015, 1, 5), date(2015, 1, 6)])
+        np.testing.assert_allclose(values, [[100, np.nan], [110, 100]])
+
+    def test_no_benchmarks(self):
+        dates, values = growth_matrix([], date(2015, 1, 5))
+        self.assertEqual(dates.tolist(), [date(2015, 1, 5)])
+        self.assertEqual(values.shape, (1, 0))
+
+
+class BackfillGrowthTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=2, seed=11, prefix='BFG', end_date=end_date)[0][0]
+
+    def setUp(self):
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+
+    def stored_growth(self):
+        return list(BenchmarkData.objects.filter(benchmark=self.benchmark).order_by('date').values_list(
+            'growth_of_10_k', flat=True))
+
+    def test_backfill(self):
+        self.assertTrue(all(growth == None for growth in self.stored_growth()))
+        prices = list(BenchmarkData.objects.filter(benchmark=self.benchmark).order_by('date').values_list(
+            'price', flat=True))
+        updated = backfill_growth_of_10k(Benchmark.objects.filter(pk=self.benchmark.pk))
+        self.assertEqual(updated, {self.benchmark.symbol: len(prices)})
+        self.assertEqual(self.stored_growth(), chained(prices, 10000))
+        # Seeded points keep their value
+        self.assertEqual(backfill_growth_of_10k(Benchmark.objects.filter(pk=self.benchmark.pk), seed=500),
+                         {self.benchmark.symbol: 0})
+
+    def test_backfill_chains_from_archive(self):
+        self.benchmark.rebuild_statistics(seed=1000)
+        expected = self.stored_growth()
+        cutoff = date(date.today().year - 1, 1, 1)
+        archived = archive_benchmark(self.benchmark, before=cutoff)
+        BenchmarkData.objects.filter(benchmark=self.benchmark).update(growth_of_10_k=None)
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        self.assertEqual(benchmark.rebuild_statistics(seed=1000), len(expected) - archived)
+        self.assertEqual(self.stored_growth(), expected[archived:])
@@ -0,0 +1,69 @@
+"""
+Query plans of the hot BenchmarkData reads, on SQLite.
+
+Each test runs EXPLAIN QUERY PLAN on the query a hot path issues and checks
+that it searches the index meant for it (see migration
+0006_data_access_indexes), without sorting in a temporary B-tree.
+"""
+from datetime import date, timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from benchmarks.models import BenchmarkData
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+DATE_PRICE_INDEX = 'benchmarks_benchmarkdata_benchmark_date_desc_price'
+MONTH_END_INDEX = 'benchmarks_benchmarkdata_month_ends'
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite specific")
+class QueryPlanTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.benchmark, = generate_synthetic_benchmarks(1, years=2, seed=1, prefix='PLAN')[0]
+        cls.benchmark.rebuild_statistics()
+        cls.today = date.today()
+
+    def query_plan(self, sql, params):
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index, covering=False):
+        plan = self.query_plan(*queryset.query.sql_with_params())
+        self.assertIn(('USING COVERING INDEX %s' if covering else 'INDEX %s') % index, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def data(self):
+        return BenchmarkData.objects.filter(benchmark=self.benchmark)
+
+    def test_previous_point(self):
+        # daily_percentage_change(): the latest point before a date
+        queryset = self.data().filter(date__lt=self.today).prices_only().order_by('-date')[:1]
+        self.assertUsesIndex(queryset, DATE_PRICE_INDEX, covering=True)
+
+    def test_latest_point(self):
+        # generate_statistics(): the latest point with its statistics
+        queryset = self.data().filter(date__lt=self.today).snapshot().order_by('-date')[:1]
+        self.assertUsesIndex(queryset, DATE_PRICE_INDEX)
+
+    def test_series_read(self):
+        # series(), generate_dataframe(): the prices from a date on, by date
+        queryset = self.data().filter(date__gte=self.today - timedelta(days=180)).price_points()
+        self.assertUsesIndex(queryset, DATE_PRICE_INDEX, covering=True)
+
+    def test_year_statistics(self):
+        # generate_cached_data(): the 52 week high, low and volatility aggregate these prices
+        queryset = self.data().filter(date__gte=self.today - timedelta(days=365), date__lte=self.today)
+        self.assertUsesIndex(queryset.values_list('price', flat=True), DATE_PRICE_INDEX, covering=True)
+
+    def test_month_ends(self):
+        # generate_cached_data(): the month-end prices of the last year
+        queryset = self.data().filter(date__gte=self.today - timedelta(days=365), date__lt=self.today)
+        self.assertUsesIndex(queryset.month_ends().price_points(), MONTH_END_INDEX)
+        self.assertEqual(list(queryset.month_ends().price_points()),
+                         list(queryset.filter(is_monthly=True).price_points()))
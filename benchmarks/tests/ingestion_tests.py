@@ -0,0 +1,100 @@
+"""
+Per-benchmark write locks and the parallel ingestion of price data.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import skipIf
+
+import mock
+from django.db import IntegrityError, connection
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from forex.models import Currency
+from benchmarks.ingestion import ingest, partition_by_benchmark
+from benchmarks.locks import benchmark_lock
+from benchmarks.models import Benchmark, BenchmarkData, BenchmarkGroup, BenchmarkLock
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+@skipIf(connection.vendor == 'postgresql', "PostgreSQL uses advisory locks instead of lock rows")
+class LockRowTest(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.benchmark, = generate_synthetic_benchmarks(1, years=1, seed=15, prefix='LOCK',
+                                                        end_date=date.today() - timedelta(days=7))[0]
+        BenchmarkLock.objects.all().delete()
+
+    def lock_updates(self, queries):
+        return len([query for query in queries if 'UPDATE "benchmarks_benchmarklock"' in query['sql']])
+
+    def test_lock_row(self):
+        with benchmark_lock(self.benchmark.pk):
+            pass
+        locked_at = BenchmarkLock.objects.get(benchmark=self.benchmark).locked_at
+        with CaptureQueriesContext(connection) as queries:
+            with benchmark_lock(self.benchmark.pk):
+                pass
+        self.assertEqual(self.lock_updates(queries), 1)
+        self.assertGreaterEqual(BenchmarkLock.objects.get(benchmark=self.benchmark).locked_at, locked_at)
+
+    def test_lock_row_created_by_another_writer(self):
+        with mock.patch.object(QuerySet, 'create', side_effect=IntegrityError("Duplicate lock row")):
+            with CaptureQueriesContext(connection) as queries:
+                with benchmark_lock(self.benchmark.pk):
+                    pass
+        # The update is tried again instead of failing
+        self.assertEqual(self.lock_updates(queries), 2)
+
+    def test_save_locks_its_database(self):
+        for model in (Currency, BenchmarkGroup, Benchmark):
+            model.objects.using('replica').bulk_create(list(model.objects.all()))
+        version = self.benchmark.data_version
+        point = BenchmarkData(benchmark=self.benchmark, date=date.today(), price=Decimal('100.00'))
+        point.save(using='replica')
+        self.assertTrue(BenchmarkData.objects.using('replica').filter(pk=point.pk).exists())
+        self.assertTrue(BenchmarkLock.objects.using('replica').filter(benchmark_id=self.benchmark.pk).exists())
+        self.assertFalse(BenchmarkLock.objects.filter(benchmark=self.benchmark).exists())
+        self.assertEqual(Benchmark.objects.using('replica').get(pk=self.benchmark.pk).data_version, version + 1)
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).data_version, version)
+
+
+class IngestTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=7)
+        cls.benchmarks = generate_synthetic_benchmarks(2, years=1, seed=16, prefix='INGEST',
+                                                       end_date=cls.end_date)[0]
+        for benchmark in cls.benchmarks:
+            benchmark.rebuild_statistics(seed=10000)
+
+    def test_partition_by_benchmark(self):
+        first, second = self.benchmarks
+        rows = [{'benchmark': first, 'date': date(2015, 1, 2), 'price': 1},
+                {'benchmark': second.pk, 'date': date(2015, 1, 2), 'price': 2},
+                {'benchmark': first.pk, 'date': date(2015, 1, 5), 'price': 3}]
+        self.assertEqual(partition_by_benchmark(rows), {
+            first.pk: [{'date': date(2015, 1, 2), 'price': 1}, {'date': date(2015, 1, 5), 'price': 3}],
+            second.pk: [{'date': date(2015, 1, 2), 'price': 2}],
+        })
+        self.assertIn('benchmark', rows[0])
+
+    def test_ingest(self):
+        first, second = self.benchmarks
+        last = BenchmarkData.objects.filter(benchmark=first).latest()
+        rows = [{'benchmark': first, 'date': self.end_date + timedelta(days=days), 'price': Decimal(price)}
+                for days, price in ((3, '101.50'), (1, '100.25'), (2, '99.75'))]
+        # Replaces the stored point of the date
+        rows.append({'benchmark': second.pk, 'date': last.date, 'price': Decimal('55.55')})
+        self.assertEqual(ingest(rows, processes=1), {first.pk: 3, second.pk: 1})
+
+        self.assertEqual(list(BenchmarkData.objects.filter(benchmark=first, date__gt=self.end_date).order_by(
+            'date').values_list('price', flat=True)), [Decimal('100.25'), Decimal('99.75'), Decimal('101.50')])
+        self.assertEqual(BenchmarkData.objects.get(benchmark=second, date=last.date).price, Decimal('55.55'))
+        self.assertEqual(Benchmark.objects.get(pk=first.pk).latest_date, self.end_date + timedelta(days=3))
+        # Written in date order, so the chained statistics need no rebuild
+        for benchmark in self.benchmarks:
+            self.assertEqual(Benchmark.objects.get(pk=benchmark.pk).rebuild_statistics(), 0)
@@ -0,0 +1,114 @@
+"""
+The scanner for suspicious prices.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import connection
+from django.test import TestCase
+
+from benchmarks.inspection import scan_benchmark, scan_benchmarks, scan_prices
+from benchmarks.managers import float_sql
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+def random_walk(length, seed=0):
+    return 100 * np.exp(np.cumsum(np.random.RandomState(seed).normal(0, 0.01, length)))
+
+
+class ScanPricesTest(TestCase):
+
+    def flagged(self, prices, reason, **options):
+        return np.nonzero(scan_prices(prices, **options)[reason])[0].tolist()
+
+    def test_nonpositive(self):
+        prices = random_walk(30)
+        prices[[5, 17]] = [0, -1]
+        self.assertEqual(self.flagged(prices, 'nonpositive'), [5, 17])
+        # No spike around the undefined returns
+        self.assertEqual(self.flagged(prices, 'spike'), [])
+
+    def test_spike(self):
+        prices = random_walk(100)
+        # A lasting move of about 18 standard deviations
+        prices[90:] *= 1.2
+        # Too early for the window to count
+        prices[10:] *= 1.3
+        self.assertEqual(self.flagged(prices, 'spike'), [90])
+        self.assertEqual(self.flagged(prices, 'spike', min_periods=5), [10, 90])
+        self.assertEqual(self.flagged(prices, 'spike', z_threshold=50), [])
+
+    def test_stale(self):
+        prices = random_walk(40)
+        prices[10:16] = prices[10]
+        prices[25:29] = prices[25]
+        self.assertEqual(self.flagged(prices, 'stale'), [11, 12, 13, 14, 15])
+        self.assertEqual(self.flagged(prices, 'stale', stale_days=4), [11, 12, 13, 14, 15, 26, 27, 28])
+
+    def test_reversal(self):
+        prices = random_walk(100)
+        prices[50] *= 1.08
+        prices[70] *= 1.03
+        masks = scan_prices(prices)
+        self.assertEqual(np.nonzero(masks['reversal'])[0].tolist(), [50])
+        # The move back is not flagged as a spike, nor is the smaller jump a reversal
+        self.assertFalse(masks['spike'][51])
+        self.assertEqual(self.flagged(prices, 'reversal', jump=0.02), [50, 70])
+
+    def test_empty(self):
+        self.assertEqual(self.flagged([], 'spike'), [])
+
+    def test_float_sql(self):
+        mysql = type('Connection', (object,), {'vendor': 'mysql'})()
+        self.assertEqual(float_sql('price', mysql), '(price + 0E0)')
+        self.assertEqual(float_sql('price', connection), 'CAST(price AS DOUBLE PRECISION)')
+
+
+class ScanBenchmarkTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=7)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=1, seed=14, prefix='INSP', end_date=cls.end_date)[0][0]
+        cls.points = list(BenchmarkData.objects.filter(benchmark=cls.benchmark).order_by('date'))
+        junk = cls.points[150]
+        junk.price *= 3
+        junk.save()
+
+    def setUp(self):
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+
+    def test_flag_and_watermark(self):
+        version = self.benchmark.data_version
+        findings = scan_benchmarks(flag=False)
+        self.assertEqual([(finding.date, finding.reasons) for finding in findings],
+                         [(self.points[150].date, ('spike', 'reversal'))])
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).inspected_until, None)
+
+        findings = scan_benchmarks()
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(BenchmarkData.objects.get(pk=self.points[150].pk).price_type, 'INS')
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        self.assertEqual(benchmark.inspected_until, self.points[-1].date)
+        self.assertEqual(benchmark.data_version, version + 1)
+        # A refresh does not move the watermark back
+        self.benchmark.save()
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).inspected_until, self.points[-1].date)
+
+    def test_incremental(self):
+        scan_benchmark(self.benchmark)
+        self.assertEqual(scan_benchmark(self.benchmark, incremental=True), [])
+        price = self.points[-1].price
+        for days, factor in ((1, 1), (2, 2), (3, 1)):
+            BenchmarkData(benchmark=self.benchmark, date=self.end_date + timedelta(days=days),
+                          price=price * factor).save()
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        findings = scan_benchmark(benchmark, incremental=True)
+        self.assertEqual([finding.date for finding in findings], [self.end_date + timedelta(days=2)])
+        self.assertEqual(benchmark.inspected_until, self.end_date + timedelta(days=3))
+        self.assertEqual(BenchmarkData.objects.filter(benchmark=benchmark, price_type='INS').count(), 2)
+
+    def test_rate_benchmarks_skipped(self):
+        Benchmark.objects.filter(pk=self.benchmark.pk).update(benchmark_type='R')
+        self.assertEqual(scan_benchmark(Benchmark.objects.get(pk=self.benchmark.pk)), [])
@@ -0,0 +1,51 @@
+"""
+Timing and query instrumentation.
+"""
+from datetime import date, timedelta
+
+from django.db import connection, connections
+from django.test import TestCase
+
+from benchmarks.instrumentation import CountingCursorWrapper, counting, measure, profiling
+from benchmarks.models import Benchmark
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class CountingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=1, seed=9, prefix='INS', end_date=end_date)[0][0]
+
+    def assertUnwrapped(self):
+        for db in connections.all():
+            self.assertNotIn('cursor', db.__dict__)
+            self.assertNotIsInstance(db.cursor(), CountingCursorWrapper)
+
+    def test_counting(self):
+        with counting() as outer:
+            self.assertIsInstance(connection.cursor(), CountingCursorWrapper)
+            list(self.benchmark.benchmarkdata_set.all()[:10])
+            with counting() as inner:
+                Benchmark.objects.get(pk=self.benchmark.pk)
+            self.assertIsInstance(connection.cursor(), CountingCursorWrapper)
+        self.assertEqual(inner, [1, 1])
+        self.assertEqual(outer, [2, 11])
+        self.assertUnwrapped()
+
+    def test_restored_after_error(self):
+        with self.assertRaises(ValueError):
+            with counting():
+                raise ValueError
+        self.assertUnwrapped()
+
+    def test_profiling(self):
+        with profiling() as sink:
+            self.assertUnwrapped()
+            with measure('series'):
+                self.benchmark.series()
+            self.assertUnwrapped()
+        stats = dict(sink.report())['series']
+        self.assertEqual((stats['calls'], stats['queries']), (1, 1))
+        self.assertEqual(stats['rows'], len(self.benchmark.series()))
@@ -0,0 +1,85 @@
+"""
+The concurrent series loader.
+
+The test database is in-memory SQLite, so the database loads run in the
+calling thread; the thread pool itself is tested with plain functions.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+import mock
+from django.db import connections
+from django.test import TestCase
+
+from benchmarks.loader import BackgroundLoad, load_dataframes, load_dataframes_async, load_series, run_concurrently
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+def delayed(value, delay):
+    time.sleep(delay)
+    return value
+
+
+class RunConcurrentlyTest(TestCase):
+
+    def test_results_in_task_order(self):
+        tasks = [(delayed, (index, 0.02 * (index % 3)), {}) for index in range(10)]
+        self.assertEqual(run_concurrently(tasks, workers=4), range(10))
+
+    def test_first_error_raised(self):
+        tasks = [(delayed, (1, 0.01), {}), (int, ('one',), {}), (int, ('two',), {})]
+        with self.assertRaisesRegexp(ValueError, "'one'"):
+            run_concurrently(tasks, workers=1)
+        with self.assertRaises(ValueError):
+            run_concurrently(tasks, workers=3)
+
+    def test_background_load(self):
+        results = []
+        load = BackgroundLoad(delayed, ('done', 0.05), callback=results.append)
+        self.assertEqual(load.get(5), 'done')
+        self.assertTrue(load.ready())
+        # The callback has run by the time the load is done
+        self.assertEqual(results, ['done'])
+        load = BackgroundLoad(int, ('x',), callback=results.append)
+        with self.assertRaises(ValueError):
+            load.get(5)
+        self.assertEqual(results, ['done'])
+        load = BackgroundLoad(delayed, ('done', 0.01), callback=int)
+        with self.assertRaises(ValueError):
+            load.get(5)
+
+    def test_background_load_closes_connections(self):
+        closed = []
+        with mock.patch.object(connections, 'close_all', side_effect=lambda: closed.append(threading.current_thread())):
+            BackgroundLoad(delayed, ('done', 0.01)).get(5)
+            self.assertEqual(len(closed), 1)
+            self.assertNotEqual(closed[0], threading.current_thread())
+            # Inline, the connections belong to the caller
+            BackgroundLoad(delayed, ('done', 0), background=False).get()
+            self.assertEqual(len(closed), 1)
+
+
+class LoadDataframesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.benchmarks = generate_synthetic_benchmarks(3, years=2, seed=1, prefix='LOAD', end_date=end_date)[0]
+
+    def test_load_dataframes(self):
+        requests = [(benchmark, {'start_date': date.today() - timedelta(days=100 * (index + 1)), 'fill': False})
+                    for index, benchmark in enumerate(self.benchmarks)]
+        frames = load_dataframes(requests)
+        for (benchmark, options), frame in zip(requests, frames):
+            self.assertTrue(frame.equals(benchmark.generate_dataframe(**options)))
+
+    def test_load_series(self):
+        series = load_series(self.benchmarks)
+        self.assertEqual([len(s) for s in series], [len(benchmark.series()) for benchmark in self.benchmarks])
+
+    def test_load_dataframes_async(self):
+        load = load_dataframes_async(self.benchmarks[:2])
+        frames = load.get(30)
+        self.assertEqual(len(frames), 2)
+        self.assertTrue(frames[0].equals(self.benchmarks[0].generate_dataframe()))
@@ -0,0 +1,120 @@
+"""
+Query budgets of the model hot paths.
+
+Each test pins the number of queries a hot path issues, and checks that the
+number does not grow with the length of the price history, so that an N+1
+pattern fails the build.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+def count_queries(func, *args, **kwargs):
+    with CaptureQueriesContext(connection) as queries:
+        func(*args, **kwargs)
+    return len(queries)
+
+
+class QueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.short, = generate_synthetic_benchmarks(1, years=1, seed=1, prefix='SHORT', end_date=end_date)[0]
+        cls.long, = generate_synthetic_benchmarks(1, years=5, seed=2, prefix='LONG', end_date=end_date)[0]
+        for benchmark in (cls.short, cls.long):
+            benchmark.rebuild_statistics()
+            benchmark.save()
+
+    def setUp(self):
+        # Fresh instances, so that no related object is cached between tests
+        self.short = Benchmark.objects.get(pk=self.short.pk)
+        self.long = Benchmark.objects.get(pk=self.long.pk)
+
+    def assertQueryBudget(self, budget, func):
+        """
+        func(benchmark) must issue exactly budget queries for both the short
+        and the long history
+        """
+        for benchmark in (self.short, self.long):
+            queries = count_queries(func, benchmark)
+            self.assertEqual(queries, budget, "%s issued %s queries, the budget is %s" % (benchmark.symbol, queries, budget))
+
+    def test_benchmarkdata_save(self):
+        # Savepoint, lock, month end, clear previous month end, previous point,
+        # 52 week point, insert, revision insert, data version update and read
+        # back, release
+        def save(benchmark):
+            BenchmarkData(benchmark=benchmark, date=date.today(), price=Decimal('100.00')).save()
+        self.assertQueryBudget(11, save)
+
+    def test_benchmarkdata_save_within_month(self):
+        # A point that is not the month end leaves the flags alone
+        def save(benchmark):
+            latest = BenchmarkData.objects.filter(benchmark=benchmark).latest()
+            BenchmarkData.objects.filter(pk=latest.pk).delete()
+            BenchmarkData(benchmark=benchmark, date=latest.date, price=Decimal('100.00')).save()
+            point = BenchmarkData(benchmark=benchmark, date=latest.date - timedelta(days=1), price=Decimal('100.00'))
+            BenchmarkData.objects.filter(benchmark=benchmark, date=point.date).delete()
+            with CaptureQueriesContext(connection) as queries:
+                point.save()
+            self.assertEqual(len(queries), 10)
+        save(self.short)
+        save(self.long)
+
+    def test_benchmark_save(self):
+        self.assertQueryBudget(7, lambda benchmark: benchmark.save())
+
+    def test_generate_cached_data(self):
+        # Including the stored data version
+        self.assertQueryBudget(6, lambda benchmark: benchmark.generate_cached_data())
+
+    def test_generate_dataframe(self):
+        self.assertQueryBudget(1, lambda benchmark: benchmark.generate_dataframe(fill=True))
+        self.assertQueryBudget(1, lambda benchmark: benchmark.generate_dataframe(fill=False))
+
+    def test_calculate_return(self):
+        end_date = date.today() - timedelta(days=30)
+        self.assertQueryBudget(1, lambda benchmark: benchmark.calculate_return(end_date - timedelta(days=300), end_date))
+
+    def test_period_series(self):
+        for freq in ('W', 'M', 'Q', 'A'):
+            self.assertQueryBudget(1, lambda benchmark: benchmark.period_series(freq))
+
+    def test_series(self):
+        self.assertQueryBudget(1, lambda benchmark: benchmark.series())
+
+    def test_find_missing_values(self):
+        self.assertQueryBudget(1, lambda benchmark: benchmark.find_missing_values())
+
+    def test_rebuild_statistics(self):
+        # Lock savepoint and update, read, release. Nothing to write after setUpTestData.
+        self.assertQueryBudget(4, lambda benchmark: benchmark.rebuild_statistics())
+
+    def test_rebuild_statistics_writes(self):
+        # Lock savepoint, read, the is_monthly updates, one update per batch of points and release
+        for benchmark in (self.short, self.long):
+            BenchmarkData.objects.filter(benchmark=benchmark).update(change=None, change_52_week=None)
+            points = BenchmarkData.objects.filter(benchmark=benchmark).count()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(benchmark.rebuild_statistics(), points - 1)
+            self.assertLessEqual(len(queries), 4 + points // 100)
+
+    def test_get_snapshots(self):
+        from benchmarks.snapshots import delete_snapshots, get_snapshots
+
+        benchmark_ids = [self.short.pk, self.long.pk]
+        delete_snapshots(benchmark_ids)
+        self.assertEqual(count_queries(get_snapshots, benchmark_ids), 1)
+        self.assertEqual(count_queries(get_snapshots, benchmark_ids), 0)
+        snapshots = get_snapshots(benchmark_ids)
+        self.assertEqual([snapshot['symbol'] for snapshot in snapshots], [self.short.symbol, self.long.symbol])
+        self.assertEqual(snapshots[1]['latest_price'], self.long.latest_price)
+        self.assertEqual(snapshots[1]['month_01_prior'], self.long.month_01_prior)
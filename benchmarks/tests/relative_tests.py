@@ -0,0 +1,111 @@
+"""
+Relative performance statistics.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.test import TestCase
+from pandas import DataFrame, DatetimeIndex, Series
+
+from benchmarks import relative
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.revisions import correct_prices
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+def reference(p, b, annualization):
+    """
+    The statistics of one pair of return arrays, with pandas, NaN pairs left out
+    """
+    frame = DataFrame({'p': p, 'b': b}).dropna()
+    p, b = frame['p'], frame['b']
+    active = p - b
+    tracking_error = active.std() * np.sqrt(annualization)
+    beta = np.cov(p, b)[0, 1] / b.var()
+    results = {
+        'periods': len(frame),
+        'excess_return': active.mean() * annualization * 100,
+        'tracking_error': tracking_error * 100,
+        'information_ratio': active.mean() * annualization / tracking_error,
+        'beta': beta,
+        'alpha': (p.mean() - beta * b.mean()) * annualization * 100,
+        'correlation': p.corr(b),
+    }
+    for name, side in (('up_capture', b > 0), ('down_capture', b < 0)):
+        exponent = float(annualization) / side.sum()
+        results[name] = ((1 + p[side]).prod() ** exponent - 1) / ((1 + b[side]).prod() ** exponent - 1) * 100
+    return results
+
+
+class RelativeStatisticsTest(TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        self.dates = np.arange(np.datetime64('2012-01-02'), np.datetime64('2012-01-02') + 800, 2, dtype='datetime64[D]')
+        self.b = rng.normal(0.0004, 0.01, len(self.dates))
+        self.p = np.column_stack([0.8 * self.b + rng.normal(0.0002, 0.004, len(self.dates)),
+                                  1.3 * self.b + rng.normal(-0.0001, 0.006, len(self.dates))])
+
+    def assertMatchesReference(self, statistics, p, b, annualization):
+        for column in range(p.shape[1]):
+            expected = reference(p[:, column], b[:, column], annualization)
+            for name, value in expected.items():
+                self.assertAlmostEqual(statistics[name][column], value, places=7, msg=name)
+
+    def test_against_reference(self):
+        b = np.repeat(self.b[:, None], 2, axis=1)
+        results = relative.relative_statistics(self.p, b, self.dates, windows=(('1Y', 365), ('ITD', None)),
+                                               annualization=252)
+        self.assertMatchesReference(results['ITD'], self.p, b, 252)
+        in_year = self.dates > self.dates[-1] - np.timedelta64(365, 'D')
+        self.assertMatchesReference(results['1Y'], self.p[in_year], b[in_year], 252)
+        self.assertEqual(results['1Y']['periods'].tolist(), [in_year.sum()] * 2)
+
+    def test_nan_masking(self):
+        p = self.p.copy()
+        b = np.repeat(self.b[:, None], 2, axis=1)
+        p[10:40, 0] = np.nan
+        b[100:110, 1] = np.nan
+        results = relative.relative_statistics(p, b, self.dates, windows=(('ITD', None),), annualization=252)
+        self.assertEqual(results['ITD']['periods'].tolist(), [len(self.dates) - 30, len(self.dates) - 10])
+        self.assertMatchesReference(results['ITD'], p, b, 252)
+
+    def test_periods_per_year(self):
+        days = np.arange(np.datetime64('2015-01-01'), np.datetime64('2016-01-01'), dtype='datetime64[D]')
+        self.assertEqual(relative.periods_per_year(days), 252)
+        self.assertEqual(relative.periods_per_year(days[::7]), 52)
+        self.assertEqual(relative.periods_per_year(days[::30]), 12)
+
+
+class ComparePortfoliosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=30)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=2, seed=5, prefix='REL', end_date=end_date)[0][0]
+
+    def setUp(self):
+        relative._series_cache.clear()
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+
+    def portfolio(self):
+        series = self.benchmark.series()
+        index = DatetimeIndex(series.dates)
+        returns = Series(series.values, index=index).pct_change()
+        return DataFrame({'Fund': returns * 1.1 + 0.0001}, index=index)
+
+    def test_compare_portfolios(self):
+        portfolio = self.portfolio()
+        df = relative.compare_portfolios(portfolio, self.benchmark, windows=(('ITD', None),))
+        self.assertAlmostEqual(df.loc[('Fund', 'ITD'), 'beta'], 1.1, places=6)
+        self.assertAlmostEqual(df.loc[('Fund', 'ITD'), 'correlation'], 1.0, places=6)
+
+    def test_correction_reloads_series(self):
+        portfolio = self.portfolio()
+        before = relative.compare_portfolios(portfolio, self.benchmark, windows=(('ITD', None),))
+        point = BenchmarkData.objects.filter(benchmark=self.benchmark).order_by('-date')[5]
+        correct_prices(self.benchmark, {point.date: point.price * 2})
+        after = relative.compare_portfolios(portfolio, self.benchmark, windows=(('ITD', None),))
+        self.assertNotAlmostEqual(after.loc[('Fund', 'ITD'), 'beta'], before.loc[('Fund', 'ITD'), 'beta'])
+        self.assertEqual(relative.benchmark_series(self.benchmark).values.tolist(),
+                         self.benchmark.series().values.tolist())
@@ -0,0 +1,135 @@
+"""
+The price revision log and as-of reads.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from benchmarks.ingestion import ingest
+from benchmarks.models import Benchmark, BenchmarkData, BenchmarkRevision
+from benchmarks.revisions import correct_prices
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class RevisionLogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=1, seed=1, prefix='REV', end_date=end_date)[0][0]
+
+    def setUp(self):
+        # A fresh instance, since the tests change its data version
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        self.points = list(self.benchmark.benchmarkdata_set.order_by('date'))
+        self.before = timezone.now() - timedelta(seconds=1)
+
+    def age_revisions(self):
+        # Make the revisions logged by the test later than the knowledge time self.before
+        BenchmarkRevision.objects.update(valid_from=timezone.now() + timedelta(seconds=1))
+
+    def test_save_logs_changed_price(self):
+        point = self.points[100]
+        point.save()
+        self.assertFalse(BenchmarkRevision.objects.exists())
+        previous_price = point.price
+        point.price = previous_price + Decimal('1.50')
+        point.save()
+        revision = BenchmarkRevision.objects.get()
+        self.assertEqual((revision.date, revision.previous_price, revision.price),
+                         (point.date, previous_price, previous_price + Decimal('1.50')))
+        with self.assertRaises(AssertionError):
+            revision.save()
+
+    def test_asof_series(self):
+        live = self.benchmark.series()
+        corrected, deleted = self.points[100], self.points[200]
+        corrected.price += Decimal('10.00')
+        corrected.save()
+        deleted.delete()
+        self.age_revisions()
+
+        self.assertEqual(len(self.benchmark.series()), len(live) - 1)
+        as_of = self.benchmark.series(as_of=self.before)
+        self.assertEqual(as_of.dates.tolist(), live.dates.tolist())
+        self.assertEqual(as_of.values.tolist(), live.values.tolist())
+        self.assertEqual(self.benchmark.series(as_of=timezone.now() + timedelta(days=1)).values.tolist(),
+                         self.benchmark.series().values.tolist())
+
+    def test_asof_leaves_out_inserted_points(self):
+        live = self.benchmark.series()
+        live_frame = self.benchmark.generate_dataframe(fill=False)
+        point_date = self.points[150].date + timedelta(days=1)
+        while point_date in set(point.date for point in self.points):
+            point_date += timedelta(days=1)
+        BenchmarkData(benchmark=self.benchmark, date=point_date, price=Decimal('123.45')).save()
+        revision = BenchmarkRevision.objects.get()
+        self.assertEqual((revision.previous_price, revision.price), (None, Decimal('123.45')))
+        self.age_revisions()
+
+        self.assertIn(point_date, self.benchmark.series().dates.tolist())
+        as_of = self.benchmark.series(as_of=self.before)
+        self.assertEqual(as_of.dates.tolist(), live.dates.tolist())
+        self.assertEqual(as_of.values.tolist(), live.values.tolist())
+        self.assertTrue(self.benchmark.generate_dataframe(fill=False, as_of=self.before).equals(live_frame))
+
+    def test_asof_after_ingestion(self):
+        live = self.benchmark.series()
+        replaced, unchanged = self.points[120], self.points[121]
+        self.assertEqual(ingest([{'benchmark': self.benchmark, 'date': replaced.date, 'price': replaced.price + 5},
+                                 {'benchmark': self.benchmark, 'date': unchanged.date, 'price': unchanged.price}],
+                                processes=1), {self.benchmark.pk: 2})
+        # A replaced row is logged as a correction, not an insertion
+        revision = BenchmarkRevision.objects.get()
+        self.assertEqual((revision.date, revision.previous_price, revision.price),
+                         (replaced.date, replaced.price, replaced.price + 5))
+        self.age_revisions()
+
+        as_of = self.benchmark.series(as_of=self.before)
+        self.assertEqual(as_of.dates.tolist(), live.dates.tolist())
+        self.assertEqual(as_of.values.tolist(), live.values.tolist())
+
+    def test_asof_drops_later_points(self):
+        as_of = self.points[-10].date
+        series = self.benchmark.series(as_of=as_of)
+        self.assertEqual(series.dates[-1].tolist(), as_of)
+
+    def test_asof_dataframe(self):
+        live = self.benchmark.generate_dataframe(fill=False)
+        self.assertEqual(correct_prices(self.benchmark, {self.points[150].date: self.points[150].price + 5,
+                                                         self.points[160].date: self.points[160].price,
+                                                         date(1990, 1, 2): 100}), 1)
+        self.assertEqual(BenchmarkRevision.objects.count(), 1)
+        self.age_revisions()
+        self.assertFalse(self.benchmark.generate_dataframe(fill=False).equals(live))
+        self.assertTrue(self.benchmark.generate_dataframe(fill=False, as_of=self.before).equals(live))
+        with self.assertRaises(ValueError):
+            self.benchmark.generate_dataframe(freq='M', as_of=self.before)
+
+    def test_data_version(self):
+        version = self.benchmark.data_version
+        point = self.points[100]
+        point.save()
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).data_version, version)
+        point.price += 1
+        point.save()
+        self.points[101].delete()
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).data_version, version + 2)
+        corrections = dict((point.date, point.price + 1) for point in self.points[110:210])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(correct_prices(self.benchmark, corrections), 100)
+        self.assertEqual(self.benchmark.data_version, version + 3)
+        self.assertEqual(len([query for query in queries if 'SET "price" = CASE' in query['sql']]), 1)
+        self.benchmark.save()
+        self.assertEqual(Benchmark.objects.get(pk=self.benchmark.pk).data_version, version + 3)
+
+    def test_correct_prices_rebuilds_statistics(self):
+        point = self.points[150]
+        correct_prices(self.benchmark, {point.date: point.price * 2})
+        next_point = BenchmarkData.objects.get(pk=self.points[151].pk)
+        self.assertNotEqual(next_point.change, self.points[151].change)
+        self.assertEqual(self.benchmark.rebuild_statistics(), 0)
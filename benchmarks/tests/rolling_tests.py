@@ -0,0 +1,106 @@
+"""
+Rolling return, volatility and drawdown series.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import mock
+import numpy as np
+from django.test import TestCase
+
+from benchmarks import rolling
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.revisions import correct_prices
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+def brute_force(metric, values, window):
+    """
+    The rolling metric of values, one window at a time
+    """
+    result = np.full(len(values), np.nan)
+    for i in range(len(values)):
+        if metric == 'return' and i >= window:
+            result[i] = (values[i] / values[i - window] - 1) * 100
+        elif metric == 'volatility' and i >= window:
+            returns = values[i - window + 1:i + 1] / values[i - window:i] - 1
+            result[i] = np.std(returns, ddof=1) * np.sqrt(252) * 100
+        elif metric == 'drawdown' and i >= window - 1:
+            result[i] = (values[i] / values[i - window + 1:i + 1].max() - 1) * 100
+    return result
+
+
+class RollingComputeTest(TestCase):
+
+    def test_against_brute_force(self):
+        values = 100 * np.exp(np.cumsum(np.random.RandomState(1).normal(0, 0.01, 300)))
+        for metric in rolling.METRICS:
+            for window in (2, 5, 21, 64, 299, 300, 400):
+                expected = brute_force(metric, values, window)
+                np.testing.assert_allclose(rolling.COMPUTE[metric](values, window), expected, rtol=1e-9, atol=1e-9,
+                                           err_msg='%s %s' % (metric, window))
+
+    def test_window_points(self):
+        self.assertEqual(rolling.window_points('1Y'), 252)
+        self.assertEqual(rolling.window_points('10'), 10)
+        with self.assertRaises(ValueError):
+            rolling.window_points(1)
+
+
+class BenchmarkRollingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=30)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=2, seed=4, prefix='ROLL', end_date=cls.end_date)[0][0]
+
+    def setUp(self):
+        rolling._cache.clear()
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+
+    def assertMatchesSeries(self, benchmark, metric, window, step=1):
+        prices = benchmark.series()
+        result = benchmark.rolling(metric, window, step=step)
+        expected = brute_force(metric, prices.values, rolling.window_points(window))
+        first = np.nonzero(~np.isnan(expected))[0][0]
+        positions = np.arange(len(prices) - 1, first - 1, -step)[::-1]
+        self.assertEqual(result.dates.tolist(), prices.dates[positions].tolist())
+        np.testing.assert_allclose(result.values, expected[positions], rtol=1e-9)
+
+    def test_rolling(self):
+        for metric in rolling.METRICS:
+            self.assertMatchesSeries(self.benchmark, metric, '3M')
+            self.assertMatchesSeries(self.benchmark, metric, 10, step=5)
+        with self.assertRaises(ValueError):
+            self.benchmark.rolling('sharpe', '1Y')
+
+    def test_incremental_extension(self):
+        for metric in rolling.METRICS:
+            self.benchmark.rolling(metric, '1M')
+        price = BenchmarkData.objects.filter(benchmark=self.benchmark).latest().price
+        for days in range(1, 6):
+            price *= Decimal('1.01')
+            BenchmarkData(benchmark=self.benchmark, date=self.end_date + timedelta(days=days),
+                          price=price.quantize(Decimal('0.01'))).save()
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        # Extended, not reloaded
+        with mock.patch.object(rolling.RollingState, 'load', side_effect=AssertionError("Reloaded")):
+            extended = dict((metric, benchmark.rolling(metric, '1M')) for metric in rolling.METRICS)
+        for metric in rolling.METRICS:
+            self.assertEqual(extended[metric].dates[-1].tolist(), self.end_date + timedelta(days=5))
+            expected = rolling.COMPUTE[metric](benchmark.series().values, 21)
+            np.testing.assert_allclose(extended[metric].values, expected[~np.isnan(expected)], rtol=1e-9)
+
+    def test_correction_reloads(self):
+        before = self.benchmark.rolling('return', '1M')
+        point = BenchmarkData.objects.filter(benchmark=self.benchmark).order_by('-date')[3]
+        correct_prices(self.benchmark, {point.date: point.price * 2})
+        after = self.benchmark.rolling('return', '1M')
+        self.assertNotEqual(after.values.tolist(), before.values.tolist())
+        self.assertMatchesSeries(self.benchmark, 'return', '1M')
+
+    def test_sum_preserving_correction_reloads(self):
+        self.benchmark.rolling('drawdown', '1M')
+        first, second = BenchmarkData.objects.filter(benchmark=self.benchmark).order_by('-date')[2:4]
+        correct_prices(self.benchmark, {first.date: second.price, second.date: first.price})
+        self.assertMatchesSeries(self.benchmark, 'drawdown', '1M')
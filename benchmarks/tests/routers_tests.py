@@ -0,0 +1,120 @@
+"""
+Read-replica routing, with a second SQLite database as the replica.
+
+The replica is a copy of the primary made in setUp. Each test then changes
+one side only, and checks which side a read saw.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import mock
+from django.db import connections
+from django.db.models.sql.query import Query
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from forex.models import Currency
+from benchmarks.models import Benchmark, BenchmarkData, BenchmarkGroup
+from benchmarks.routers import read_plan, recently_modified, replica_cutoff
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class ReplicaRoutingTest(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.benchmark, = generate_synthetic_benchmarks(1, years=1, seed=1, prefix='REPL')[0]
+        # Written long enough ago to have reached the replica
+        self.benchmark.data_modified_at = timezone.now() - timedelta(days=1)
+        Benchmark.objects.filter(pk=self.benchmark.pk).update(data_modified_at=self.benchmark.data_modified_at)
+        for model in (Currency, BenchmarkGroup, Benchmark, BenchmarkData):
+            model.objects.using('replica').bulk_create(list(model.objects.all()))
+        self.points = list(BenchmarkData.objects.filter(benchmark=self.benchmark).order_by('date'))
+        self.old_point = self.points[len(self.points) // 2]
+        self.recent_point = self.points[-1]
+
+    def test_plan_without_replica(self):
+        self.assertEqual(read_plan(date(2015, 1, 1), None), [('default', date(2015, 1, 1), None)])
+
+    @override_settings(BENCHMARK_REPLICA_DATABASE='replica')
+    def test_plan_with_replica(self):
+        cutoff = replica_cutoff()
+        self.assertEqual(read_plan(date(2015, 1, 1), cutoff - timedelta(days=1)),
+                         [('replica', date(2015, 1, 1), cutoff - timedelta(days=1))])
+        self.assertEqual(read_plan(cutoff, None), [('default', cutoff, None)])
+        self.assertEqual(read_plan(None, None), [('replica', None, cutoff - timedelta(days=1)),
+                                                 ('default', cutoff, None)])
+        self.assertEqual(read_plan(None, None, using='default'), [('default', None, None)])
+        # Just written, the replica may not have it yet
+        self.assertEqual(read_plan(None, None, modified_at=timezone.now()), [('default', None, None)])
+        self.assertEqual(len(read_plan(None, None, modified_at=timezone.now() - timedelta(hours=2))), 2)
+        self.assertFalse(recently_modified(None))
+
+    @override_settings(BENCHMARK_REPLICA_DATABASE='replica')
+    def test_recent_correction_from_primary(self):
+        # An old point corrected on the primary, before the replica has caught up
+        point = BenchmarkData.objects.get(pk=self.old_point.pk)
+        point.price += Decimal('5.00')
+        point.save()
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        self.assertEqual(benchmark.series().asof(point.date), float(point.price))
+        with CaptureQueriesContext(connections['replica']) as queries:
+            benchmark.generate_dataframe(start_date=self.old_point.date, fill=False)
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(BENCHMARK_REPLICA_DATABASE='replica')
+    def test_history_from_replica(self):
+        BenchmarkData.objects.using('replica').filter(pk=self.old_point.pk).update(price=Decimal('1.00'))
+        series = self.benchmark.series()
+        self.assertEqual(series.asof(self.old_point.date), 1.0)
+        series = self.benchmark.series(using='default')
+        self.assertEqual(series.asof(self.old_point.date), float(self.old_point.price))
+
+    @override_settings(BENCHMARK_REPLICA_DATABASE='replica')
+    def test_recent_points_from_primary(self):
+        # The replica lags behind: it does not have the latest point yet
+        BenchmarkData.objects.using('replica').filter(pk=self.recent_point.pk).delete()
+        series = self.benchmark.series()
+        self.assertEqual(len(series), len(self.points))
+        self.assertEqual(series.last_date, self.recent_point.date)
+        df = self.benchmark.generate_dataframe(start_date=self.old_point.date, fill=False)
+        self.assertEqual(df.index[-1], self.recent_point.date)
+
+    @override_settings(BENCHMARK_REPLICA_DATABASE='replica')
+    def test_recent_read_skips_replica(self):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.benchmark.series(replica_cutoff())
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(BENCHMARK_REPLICA_DATABASE='replica')
+    def test_period_series_split(self):
+        self.assertEqual(list(self.benchmark.period_series('M')), list(self.benchmark.period_series('M', using='default')))
+
+    @override_settings(BENCHMARK_REPLICA_DATABASE='replica')
+    def test_period_ends_compiled_for_their_database(self):
+        get_compiler = Query.get_compiler
+        aliases = []
+
+        def recording_get_compiler(query, using=None, connection=None):
+            aliases.append(connection.alias if connection != None else using)
+            return get_compiler(query, using, connection)
+
+        replica_points = BenchmarkData.objects.using('replica').filter(benchmark=self.benchmark)
+        with mock.patch.object(Query, 'get_compiler', recording_get_compiler):
+            quarter_ends = list(replica_points.period_ends('Q').values_list('date', flat=True))
+        self.assertEqual(set(aliases), set(['replica']))
+        self.assertEqual(quarter_ends, list(BenchmarkData.objects.filter(benchmark=self.benchmark).period_ends(
+            'Q').values_list('date', flat=True)))
+
+    def test_writes_go_to_primary(self):
+        benchmark = Benchmark.objects.using('replica').get(pk=self.benchmark.pk)
+        point = BenchmarkData(benchmark=benchmark, date=self.recent_point.date + timedelta(days=1),
+                              price=self.recent_point.price)
+        point.save()
+        self.assertTrue(BenchmarkData.objects.using('default').filter(pk=point.pk).exists())
+        self.assertFalse(BenchmarkData.objects.using('replica').filter(benchmark=benchmark, date=point.date).exists())
+        # The statistics were chained from the primary's previous point
+        self.assertEqual(point.change, Decimal('0'))
+        benchmark.save()
+        self.assertEqual(Benchmark.objects.using('default').get(pk=benchmark.pk).latest_date, point.date)
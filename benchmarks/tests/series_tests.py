@@ -0,0 +1,114 @@
+"""
+The array-backed BenchmarkSeries, and the returns read from it.
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.test import TestCase
+from pandas import Timestamp
+
+from benchmarks.models import Benchmark
+from benchmarks.series import BenchmarkSeries
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class BenchmarkSeriesTest(TestCase):
+
+    def setUp(self):
+        # A Friday, the Monday after it and the last days of February and March
+        self.series = BenchmarkSeries(['2015-01-30', '2015-02-02', '2015-02-27', '2015-03-02', '2015-03-31'],
+                                      [100.0, 110.0, 99.0, 0.0, 120.0], symbol='SER')
+
+    def test_between(self):
+        points = self.series.between(date(2015, 2, 1), date(2015, 3, 2))
+        self.assertEqual(list(points), [(date(2015, 2, 2), 110.0), (date(2015, 2, 27), 99.0), (date(2015, 3, 2), 0.0)])
+        self.assertEqual(points.symbol, 'SER')
+        self.assertEqual(len(self.series.between(end_date='2015-02-02')), 2)
+        self.assertEqual(len(self.series.between(start_date=datetime(2015, 3, 2, 15, 30))), 2)
+        self.assertEqual(len(self.series.between(date(2015, 2, 3), date(2015, 2, 26))), 0)
+        self.assertEqual(list(self.series[date(2015, 3, 2):]), list(self.series.between(date(2015, 3, 2))))
+        self.assertRaises(ValueError, lambda: self.series[::2])
+
+    def test_asof(self):
+        self.assertEqual(self.series.asof(date(2015, 1, 31)), 100.0)
+        self.assertEqual(self.series.asof(date(2015, 2, 2)), 110.0)
+        self.assertEqual(self.series.asof(date(2016, 1, 1)), 120.0)
+        self.assertEqual(self.series.asof(date(2015, 1, 29)), None)
+        values = self.series.asof_values(np.array(['2015-01-01', '2015-02-28'], dtype='datetime64[D]'))
+        self.assertTrue(np.isnan(values[0]))
+        self.assertEqual(values[1], 99.0)
+
+    def test_return_between(self):
+        self.assertAlmostEqual(self.series.return_between(date(2015, 1, 31), date(2015, 2, 27)), -1.0)
+        self.assertAlmostEqual(self.series.return_between(date(2015, 2, 27), date(2015, 3, 31)), 100.0 * 21 / 99)
+        # Outside the series, or from a zero price
+        self.assertEqual(self.series.return_between(date(2015, 1, 1), date(2015, 2, 27)), None)
+        self.assertEqual(self.series.return_between(date(2015, 2, 27), date(2015, 4, 1)), None)
+        self.assertEqual(self.series.return_between(date(2015, 3, 2), date(2015, 3, 31)), None)
+        self.assertEqual(BenchmarkSeries([], []).return_between(date(2015, 1, 1), date(2015, 2, 1)), None)
+
+    def test_month_end(self):
+        self.assertEqual([point_date for point_date, value in self.series.month_end()],
+                         [date(2015, 1, 30), date(2015, 2, 27), date(2015, 3, 31)])
+        self.assertEqual([point_date for point_date, value in self.series.period_end('W')],
+                         [date(2015, 1, 30), date(2015, 2, 2), date(2015, 2, 27), date(2015, 3, 2), date(2015, 3, 31)])
+        self.assertEqual([point_date for point_date, value in self.series.period_end('Q')], [date(2015, 3, 31)])
+        self.assertEqual(len(BenchmarkSeries([], []).month_end()), 0)
+        self.assertRaises(ValueError, self.series.period_end, 'D')
+
+    def test_to_dataframe(self):
+        df = self.series.to_dataframe(with_change=True)
+        self.assertEqual(list(df.columns), ['PRICE:SER', 'CHANGE'])
+        self.assertEqual(df.index.name, 'DATE')
+        self.assertEqual(df.index[1], Timestamp('2015-02-02'))
+        self.assertEqual(df['PRICE:SER'].tolist(), self.series.values.tolist())
+        self.assertAlmostEqual(df['CHANGE'][1], 0.1)
+        self.assertEqual(list(BenchmarkSeries([], []).to_dataframe().columns), ['PRICE:'])
+
+
+class CalculateReturnTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=7)
+        cls.benchmark = generate_synthetic_benchmarks(1, years=2, seed=18, prefix='RET', gap_probability=1.0,
+                                                      end_date=cls.end_date)[0][0]
+
+    def setUp(self):
+        self.benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+
+    def test_matches_filled_dataframe(self):
+        # The forward-filled daily dataframe calculate_return used to read
+        df = self.benchmark.generate_dataframe()
+        column = 'PRICE:' + self.benchmark.symbol
+        last_date = self.benchmark.series().last_date
+        start_date = last_date - timedelta(days=400)
+        # End dates on weekdays, weekends and in gaps
+        for days in range(0, 365, 11):
+            end_date = last_date - timedelta(days=days)
+            for start in (start_date, end_date - timedelta(days=30)):
+                expected = (df[column][Timestamp(end_date)] / df[column][Timestamp(start)] - 1.0) * 100.0
+                self.assertAlmostEqual(self.benchmark.calculate_return(start, end_date), expected)
+
+    def test_outside_the_data(self):
+        series = self.benchmark.series()
+        self.assertEqual(self.benchmark.calculate_return(series.first_date, series.last_date + timedelta(days=1)), None)
+        self.assertEqual(self.benchmark.calculate_return(series.first_date - timedelta(days=1), series.last_date), None)
+
+    def test_date_arguments(self):
+        series = self.benchmark.series()
+        start_date = series.last_date - timedelta(days=100)
+        value = self.benchmark.calculate_return(start_date, series.last_date)
+        self.assertEqual(self.benchmark.calculate_return(start_date.isoformat(), series.last_date.isoformat()), value)
+        self.assertEqual(self.benchmark.calculate_return(datetime.combine(start_date, datetime.min.time()),
+                                                         Timestamp(series.last_date)), value)
+        for bad in (None, 'yesterday', '2015-02-30', 20150102):
+            self.assertEqual(self.benchmark.calculate_return(bad, series.last_date), None)
+            self.assertEqual(self.benchmark.calculate_return(start_date, bad), None)
+
+    def test_loaded_series(self):
+        series = self.benchmark.series()
+        start_date = series.last_date - timedelta(days=300)
+        with self.assertNumQueries(0):
+            value = self.benchmark.calculate_return(start_date, series.last_date, series=series)
+        self.assertEqual(value, self.benchmark.calculate_return(start_date, series.last_date))
@@ -0,0 +1,59 @@
+"""
+Snapshot documents of the benchmark summary cards.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.snapshots import delete_snapshots, get_snapshots, snapshot_batch, snapshot_cache, snapshot_key
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class SnapshotBatchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.benchmarks = generate_synthetic_benchmarks(2, years=1, seed=13, prefix='SNAP', end_date=end_date)[0]
+
+    def setUp(self):
+        delete_snapshots([benchmark.pk for benchmark in self.benchmarks])
+
+    def cached(self, benchmark):
+        return snapshot_cache().get(snapshot_key(benchmark.pk))
+
+    def test_batch(self):
+        with snapshot_batch():
+            for benchmark in self.benchmarks:
+                Benchmark.objects.get(pk=benchmark.pk).save()
+                with snapshot_batch():
+                    pass
+                self.assertEqual(self.cached(benchmark), None)
+        for benchmark in self.benchmarks:
+            self.assertNotEqual(self.cached(benchmark), None)
+
+    def test_batch_stored_after_error(self):
+        with self.assertRaises(ValueError):
+            with snapshot_batch():
+                Benchmark.objects.get(pk=self.benchmarks[0].pk).save()
+                raise ValueError
+        self.assertNotEqual(self.cached(self.benchmarks[0]), None)
+        self.assertEqual(self.cached(self.benchmarks[1]), None)
+
+    def test_price_write_drops_document(self):
+        benchmark = self.benchmarks[0]
+        version = get_snapshots([benchmark.pk])[0]['data_version']
+        point = BenchmarkData.objects.filter(benchmark=benchmark).latest()
+        point.price += Decimal('1.00')
+        point.save()
+        self.assertEqual(self.cached(benchmark), None)
+        self.assertEqual(get_snapshots([benchmark.pk])[0]['data_version'], version + 1)
+        # Also when the benchmark was saved earlier in the open batch
+        with snapshot_batch():
+            Benchmark.objects.get(pk=benchmark.pk).save()
+            point.price += Decimal('1.00')
+            point.save()
+        self.assertEqual(self.cached(benchmark), None)
+        self.assertEqual(get_snapshots([benchmark.pk])[0]['data_version'], version + 2)
@@ -0,0 +1,82 @@
+"""
+The synthetic benchmark generator.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from countries.models import Country
+from django.test import TestCase
+from holidays.models import Holiday
+
+from benchmarks.calendars import business_days
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.synthetic import add_gaps, daily_changes, generate_synthetic_benchmarks
+
+
+def stored_rows(benchmark):
+    return list(BenchmarkData.objects.filter(benchmark=benchmark).order_by('date').values_list(
+        'date', 'price', 'rate', 'change', 'is_monthly'))
+
+
+class GenerateSyntheticBenchmarksTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.end_date = date.today() - timedelta(days=7)
+        cls.country = Country.objects.create(name='Synthetic Country', symbol_alpha2_code='SX',
+                                             symbol_alpha3_code='SXX', is_independent=True, numeric_code=998)
+        cls.holidays = [day for day in (cls.end_date - timedelta(days=offset) for offset in range(20, 360, 30))
+                        if day.weekday() < 5]
+        for day in cls.holidays:
+            Holiday.objects.create(country=cls.country, date=day)
+
+    def generate(self, count=3, **options):
+        options.setdefault('years', 1)
+        options.setdefault('end_date', self.end_date)
+        return generate_synthetic_benchmarks(count, **options)
+
+    def test_same_seed_same_rows(self):
+        first, first_rows = self.generate(seed=21, prefix='SYNA', gap_probability=0.5, outlier_probability=0.5,
+                                          rate_fraction=0.3)
+        second, second_rows = self.generate(seed=21, prefix='SYNB', gap_probability=0.5, outlier_probability=0.5,
+                                            rate_fraction=0.3)
+        self.assertEqual(first_rows, second_rows)
+        for one, other in zip(first, second):
+            self.assertEqual(one.benchmark_type, other.benchmark_type)
+            self.assertEqual(stored_rows(one), stored_rows(other))
+        third = self.generate(seed=22, prefix='SYNC')[0]
+        self.assertNotEqual(stored_rows(first[0]), stored_rows(third[0]))
+
+    def test_business_days_only(self):
+        benchmarks, rows = self.generate(seed=23, prefix='SYND', country=self.country)
+        self.assertEqual(rows, BenchmarkData.objects.filter(benchmark__in=benchmarks).count())
+        expected = business_days(self.end_date - timedelta(days=365), self.end_date, self.country).tolist()
+        for benchmark in benchmarks:
+            dates = [row[0] for row in stored_rows(benchmark)]
+            self.assertEqual(dates, expected)
+            self.assertFalse(set(dates) & set(self.holidays))
+            self.assertEqual(Benchmark.objects.get(pk=benchmark.pk).latest_date, dates[-1])
+        self.assertEqual(rows, 3 * len(expected))
+
+    def test_gaps(self):
+        benchmarks, rows = self.generate(seed=24, prefix='SYNE', gap_probability=1.0)
+        expected = business_days(self.end_date - timedelta(days=365), self.end_date).tolist()
+        for benchmark in benchmarks:
+            dates = [row[0] for row in stored_rows(benchmark)]
+            self.assertLess(len(dates), len(expected))
+            self.assertTrue(set(dates) < set(expected))
+            self.assertEqual(dates[0], expected[0])
+        self.assertEqual(rows, BenchmarkData.objects.filter(benchmark__in=benchmarks).count())
+
+    def test_rate_benchmarks(self):
+        benchmark = self.generate(1, seed=25, prefix='SYNF', rate_fraction=1.0)[0][0]
+        self.assertEqual(benchmark.benchmark_type, 'R')
+        rows = stored_rows(benchmark)
+        self.assertTrue(all(row[1] == 0 and row[2] != None and row[2] >= 0 for row in rows))
+
+    def test_helpers(self):
+        self.assertEqual(daily_changes([100.0, 110.0, 0.0, 5.0]), [None, 10.0, -100.0, None])
+        keep = add_gaps(np.random.RandomState(1), 50, 1.0)
+        self.assertTrue(keep[0])
+        self.assertLess(keep.sum(), 50)
+        self.assertTrue(add_gaps(np.random.RandomState(1), 50, 0.0).all())
@@ -0,0 +1,83 @@
+"""
+Refresh telemetry: recording, pruning and the slowest benchmark report.
+"""
+from datetime import date, timedelta
+
+import mock
+from django.test import TestCase
+from django.utils import timezone
+
+from benchmarks.models import BenchmarkRefreshRun, BenchmarkRefreshTiming
+from benchmarks.synthetic import generate_synthetic_benchmarks
+from benchmarks.telemetry import prune_telemetry, recent_runs, refresh_run, run_summaries, slowest_benchmarks
+
+
+class RefreshTelemetryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        end_date = date.today() - timedelta(days=7)
+        cls.benchmarks = generate_synthetic_benchmarks(2, years=1, seed=1, prefix='TELE', end_date=end_date)[0]
+
+    def test_record_run(self):
+        with refresh_run('rebuild') as run:
+            for benchmark in self.benchmarks:
+                with run.record(benchmark) as timing:
+                    timing.points = benchmark.rebuild_statistics()
+                    benchmark.save()
+        run = BenchmarkRefreshRun.objects.get()
+        self.assertEqual((run.kind, run.benchmarks, run.failures), ('rebuild', 2, 0))
+        for timing in run.timings.all():
+            self.assertEqual(timing.outcome, 'OK')
+            self.assertGreater(timing.queries, 0)
+            self.assertGreater(timing.rows, 200)
+            self.assertGreater(timing.points, 0)
+
+    def test_record_failure(self):
+        with self.assertRaises(ValueError):
+            with refresh_run('refresh') as run:
+                with run.record(self.benchmarks[0]):
+                    raise ValueError("No prices")
+        timing = BenchmarkRefreshTiming.objects.get()
+        self.assertEqual((timing.outcome, timing.error), ('ER', 'ValueError: No prices'))
+        self.assertEqual(timing.run.failures, 1)
+
+    def test_written_as_the_run_goes(self):
+        with mock.patch('benchmarks.telemetry.TIMING_BATCH_SIZE', 2):
+            with refresh_run('refresh') as run:
+                self.assertEqual(BenchmarkRefreshRun.objects.get().seconds, None)
+                for benchmark in self.benchmarks + self.benchmarks[:1]:
+                    with run.record(benchmark):
+                        pass
+                # A run killed now keeps its first batch
+                self.assertEqual(BenchmarkRefreshTiming.objects.count(), 2)
+                self.assertEqual(BenchmarkRefreshRun.objects.get().benchmarks, 2)
+        run = BenchmarkRefreshRun.objects.get()
+        self.assertEqual((run.benchmarks, run.timings.count()), (3, 3))
+        self.assertNotEqual(run.seconds, None)
+
+    def test_prune(self):
+        for days in (0, 200):
+            with refresh_run('refresh') as run:
+                with run.record(self.benchmarks[0]):
+                    pass
+            BenchmarkRefreshRun.objects.filter(pk=run.run.pk).update(started_at=timezone.now() - timedelta(days=days))
+        self.assertEqual(prune_telemetry(90), 1)
+        self.assertEqual(BenchmarkRefreshTiming.objects.count(), 1)
+
+    def test_report(self):
+        for slow_seconds in (1.0, 2.0, 4.0):
+            with refresh_run('refresh') as run:
+                with run.record(self.benchmarks[0]):
+                    pass
+                with run.record(self.benchmarks[1]):
+                    pass
+            run.run.timings.filter(benchmark=self.benchmarks[1]).update(seconds=slow_seconds)
+        runs = recent_runs('refresh')
+        self.assertEqual(len(runs), 3)
+        self.assertEqual(run_summaries(runs)[-1]['max'], 4.0)
+        slowest = slowest_benchmarks(runs, top=1)
+        self.assertEqual(len(slowest), 1)
+        self.assertEqual(slowest[0]['benchmark_id'], self.benchmarks[1].pk)
+        self.assertEqual((slowest[0]['median'], slowest[0]['latest']), (2.0, 4.0))
+        self.assertEqual(slowest[0]['trend'], 200.0)
@@ -0,0 +1,7 @@
+"""URLs to run the tests."""
+from django.conf.urls import include, url
+
+
+urlpatterns = [
+    url(r'^benchmarks/', include('benchmarks.urls')),
+]
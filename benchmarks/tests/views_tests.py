@@ -0,0 +1,81 @@
+"""Tests for the streaming series views."""
+import json
+from calendar import timegm
+from datetime import date, timedelta
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from django.db import connection
+
+from benchmarks.models import Benchmark, BenchmarkData
+from benchmarks.revisions import correct_prices
+from benchmarks.synthetic import generate_synthetic_benchmarks
+
+
+class BenchmarkSeriesViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.benchmark, = generate_synthetic_benchmarks(1, years=2, seed=3, prefix='VIEW')[0]
+        cls.benchmark.rebuild_statistics()
+        cls.benchmark.save()
+
+    def url(self, format='csv'):
+        return reverse('benchmark_series', kwargs={'benchmarkslug': self.benchmark.slug, 'format': format})
+
+    def test_csv(self):
+        response = self.client.get(self.url(), {'start': '2015-01-01'})
+        self.assertEqual(response.status_code, 200)
+        lines = ''.join(response.streaming_content).splitlines()
+        points = BenchmarkData.objects.filter(benchmark=self.benchmark, date__gte=date(2015, 1, 1)).price_points()
+        self.assertEqual(lines[0], 'date,price')
+        self.assertEqual(lines[1:], ['%s,%s' % (point_date.isoformat(), price) for point_date, price in points])
+
+    def test_json_period_ends(self):
+        response = self.client.get(self.url('json'), {'freq': 'M'})
+        document = json.loads(''.join(response.streaming_content))
+        series = self.benchmark.period_series('M')
+        self.assertEqual(document['symbol'], self.benchmark.symbol)
+        self.assertEqual([point[0] for point in document['points']], [point_date.isoformat() for point_date, price in series])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url(), {'start': '2015-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url(), {'freq': 'X'}).status_code, 400)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url())
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        response = self.client.get(self.url(), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_refresh(self):
+        etag = self.client.get(self.url())['ETag']
+        self.assertNotEqual(self.client.get(self.url('json'))['ETag'], etag)
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        benchmark.refreshed_at -= timedelta(days=1)
+        Benchmark.objects.filter(pk=benchmark.pk).update(refreshed_at=benchmark.refreshed_at)
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_correction(self):
+        etag = self.client.get(self.url())['ETag']
+        point = BenchmarkData.objects.filter(benchmark=self.benchmark).latest()
+        point.price += 1
+        point.save()
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('%s,%s' % (point.date.isoformat(), point.price), ''.join(response.streaming_content))
+
+        etag = response['ETag']
+        correct_prices(self.benchmark, {point.date: point.price + 1})
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        benchmark = Benchmark.objects.get(pk=self.benchmark.pk)
+        self.assertGreaterEqual(benchmark.data_modified_at, benchmark.refreshed_at)
+        self.assertEqual(response['Last-Modified'], http_date(timegm(benchmark.data_modified_at.utctimetuple())))
@@ -0,0 +1,8 @@
+from django.conf.urls import url
+
+from benchmarks import views
+
+
+urlpatterns = [
+    url(r'^(?P<benchmarkslug>[-\w]+)/series\.(?P<format>csv|json)$', views.benchmark_series, name='benchmark_series'),
+]
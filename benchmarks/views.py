@@ -0,0 +1,159 @@
+"""
+Streaming series views.
+
+benchmark_series returns the prices of a benchmark as CSV or JSON, written
+out while the data points are read in chunks, so that the full history is
+never held in memory. The optional query parameters are start and end
+(YYYY-MM-DD) and freq (D, W, M, Q or A).
+
+The ETag and Last-Modified headers come from the Benchmark row alone: its
+data version, which every write of the price data increments (see
+Benchmark.data_changed), and its refresh time. A conditional GET of an
+unchanged series is answered with 304 without reading BenchmarkData.
+
+Usage:
+    url(r'^benchmarks/', include('benchmarks.urls')),
+    GET /benchmarks/sp500/series.csv?start=2015-01-01&freq=M
+"""
+import hashlib
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import condition, require_GET
+
+from benchmarks.models import Benchmark
+
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+FREQUENCIES = ('D', 'W', 'M', 'Q', 'A')
+
+# Points written per chunk of the response
+CHUNK_SIZE = 500
+
+
+def get_benchmark(request, benchmarkslug):
+    """
+    The benchmark of a request, fetched once for the conditional checks and the view
+    """
+    benchmarks = request.__dict__.setdefault('_benchmarks', {})
+    if benchmarkslug not in benchmarks:
+        try:
+            benchmarks[benchmarkslug] = Benchmark.objects.listing().get(slug=benchmarkslug)
+        except Benchmark.DoesNotExist:
+            raise Http404("No benchmark %s" % benchmarkslug)
+    return benchmarks[benchmarkslug]
+
+
+def series_etag(request, benchmarkslug, format):
+    benchmark = get_benchmark(request, benchmarkslug)
+    key = '|'.join([str(benchmark.pk), str(benchmark.data_version), str(benchmark.refreshed_at), format,
+                    request.GET.get('start', ''), request.GET.get('end', ''), request.GET.get('freq', '')])
+    return hashlib.md5(key).hexdigest()
+
+
+def series_last_modified(request, benchmarkslug, format):
+    benchmark = get_benchmark(request, benchmarkslug)
+    times = [time for time in (benchmark.refreshed_at, benchmark.data_modified_at) if time != None]
+    return max(times) if times else None
+
+
+def series_points(benchmark, start_date=None, end_date=None, freq=None):
+    """
+    Yield the (date, price) points of a benchmark between two dates
+    (inclusive) in date order, reading the data points in chunks
+    """
+    from benchmarks.routers import read_database
+
+    if freq not in (None, 'D'):
+        for point in benchmark.period_series(freq, start_date, end_date):
+            yield point
+        return
+
+    live_start_date = start_date
+    if benchmark.reads_archive(start_date):
+        from benchmarks.archive import archived_price_points
+
+        # Archived years are small, and live points of the same date win
+        archived_end_date = min(end_date, benchmark.archived_until) if end_date != None else benchmark.archived_until
+        points = dict(archived_price_points(benchmark, start_date, archived_end_date, using=read_database()))
+        for queryset in benchmark.read_querysets(start_date, archived_end_date):
+            points.update(queryset.price_points())
+        for point in sorted(points.items()):
+            yield point
+        live_start_date = benchmark.archived_until + timedelta(days=1)
+        if end_date != None and end_date < live_start_date:
+            return
+
+    for queryset in benchmark.read_querysets(live_start_date, end_date):
+        for point in queryset.price_points().iterator():
+            yield point
+
+
+def format_price(value):
+    return str(value) if isinstance(value, Decimal) else '%.2f' % value
+
+
+def chunks(points):
+    chunk = []
+    for point in points:
+        chunk.append(point)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_stream(benchmark, points):
+    yield 'date,price\n'
+    for chunk in chunks(points):
+        yield ''.join('%s,%s\n' % (point_date.isoformat(), format_price(price)) for point_date, price in chunk)
+
+
+def json_stream(benchmark, points, freq):
+    yield '{"symbol": %s, "freq": %s, "points": [' % (json.dumps(benchmark.symbol), json.dumps(freq))
+    separator = ''
+    for chunk in chunks(points):
+        yield separator + ', '.join('["%s", %s]' % (point_date.isoformat(), format_price(price))
+                                    for point_date, price in chunk)
+        separator = ', '
+    yield ']}'
+
+
+@require_GET
+@condition(etag_func=series_etag, last_modified_func=series_last_modified)
+def benchmark_series(request, benchmarkslug, format):
+    """
+    Stream the price series of a benchmark as CSV or JSON
+    """
+    benchmark = get_benchmark(request, benchmarkslug)
+
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] == None:
+            return HttpResponseBadRequest("Invalid %s date %s, use YYYY-MM-DD" % (name, value))
+    freq = request.GET.get('freq', 'D')
+    if freq not in FREQUENCIES:
+        return HttpResponseBadRequest("Invalid frequency %s, use %s" % (freq, ', '.join(FREQUENCIES)))
+
+    points = series_points(benchmark, dates['start'], dates['end'], freq)
+    if format == 'csv':
+        content = csv_stream(benchmark, points)
+    else:
+        content = json_stream(benchmark, points, freq)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[format])
+    if format == 'csv':
+        response['Content-Disposition'] = 'attachment; filename="%s.csv"' % benchmark.slug
+    return response